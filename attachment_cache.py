@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import shutil
+import threading
+
+import requests
+
+from request_cache import LIMITER, retry_after
+
+TEXT_EXTENSIONS = {'.txt', '.log', '.out', '.err', '.csv', '.tsv', '.json', '.xml', '.yml', '.yaml', '.ini', '.cfg',
+                   '.conf', '.properties', '.sql', '.trace', '.md', '.diff', '.patch'}
+
+# Downloads in progress in this process, path -> DownloadProgress, so two dialogs never fetch the same file twice
+_downloads = {}
+_downloads_lock = threading.Lock()
+
+
+def is_text(attachment):
+    content_type = attachment.get('content_type') or ''
+    return (content_type.startswith('text/') or content_type in ('application/json', 'application/xml')
+            or os.path.splitext(attachment.get('filename', ''))[1].lower() in TEXT_EXTENSIONS)
+
+
+def format_size(size_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+class DownloadProgress:
+    """Shared between the downloading worker and the views reading the file while it grows"""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.received = 0
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.readers = 0
+
+
+def download_attachment(url, api_key, path, progress):
+    """Stream an attachment to path, run on a worker.
+
+    Every chunk is flushed, so a viewer can show the head of the file while
+    the rest is still coming. An unfinished file is removed.
+    """
+    headers = {'X-Redmine-API-Key': api_key} if api_key else {}
+    try:
+        # A token but no slot: a long download shouldn't hold up the API calls behind it
+        LIMITER.acquire(slot=False)
+        with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code in (429, 503):
+                LIMITER.pause(min(retry_after(response, 5), 300))
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}")
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    if progress.cancelled:
+                        break
+                    f.write(chunk)
+                    f.flush()
+                    progress.received += len(chunk)
+        if progress.cancelled:
+            os.unlink(path)
+        else:
+            progress.total = progress.received
+    except Exception as e:
+        progress.error = str(e)
+        if os.path.exists(path):
+            os.unlink(path)
+    finally:
+        progress.done = True
+        with _downloads_lock:
+            _downloads.pop(path, None)
+
+
+class AttachmentCache:
+    """Attachments downloaded once into a directory and reused by every viewer.
+
+    Redmine never changes the content of an attachment id, so a file whose
+    size matches the attachment's filesize is complete. The least recently
+    used files are removed once the directory grows past MAX_BYTES.
+    """
+    MAX_BYTES = 2 * 1024 ** 3
+
+    def __init__(self, redmine_url, api_key, directory='attachments'):
+        self.redmine_url = redmine_url
+        self.api_key = api_key
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, attachment):
+        filename = re.sub(r'[^\w.\-]', '_', attachment.get('filename', ''))[-100:]
+        return os.path.join(self.directory, f"{attachment['id']}-{filename}")
+
+    def cached_path(self, attachment):
+        path = self.path(attachment)
+        with _downloads_lock:
+            downloading = path in _downloads
+        if not downloading and os.path.exists(path) and os.path.getsize(path) == attachment.get('filesize'):
+            os.utime(path)  # keep it out of the next prune
+            return path
+        return None
+
+    def fetch(self, attachment, inline=False):
+        """(path, progress) of the attachment, starting a download unless it is cached or on its way.
+
+        Workers pass inline to download in their own thread, they return once
+        the file is complete. Otherwise the download gets a thread of its own:
+        a pool worker following it (a line index, a preview) must never wait
+        on a download queued behind it in the same pool.
+        """
+        path = self.cached_path(attachment)
+        if path:
+            progress = DownloadProgress(attachment.get('filesize', 0))
+            progress.received = progress.total
+            progress.done = True
+            return path, progress
+        path = self.path(attachment)
+        url = f"{self.redmine_url}/attachments/download/{attachment['id']}/{attachment['filename']}"
+        with _downloads_lock:
+            progress = _downloads.get(path)
+            started = progress is None
+            if started:
+                self.prune(attachment.get('filesize', 0))
+                progress = _downloads[path] = DownloadProgress(attachment.get('filesize', 0))
+            progress.readers += 1
+        if started and inline:
+            download_attachment(url, self.api_key, path, progress)
+        elif started:
+            threading.Thread(target=download_attachment, args=(url, self.api_key, path, progress),
+                             name=f'download {attachment["id"]}', daemon=True).start()
+        return path, progress
+
+    def fetch_file(self, attachment):
+        """Path of the complete attachment, downloaded here unless it is cached or on its way; run on a worker"""
+        path, progress = self.fetch(attachment, inline=True)
+        try:
+            while not progress.done:
+                time.sleep(0.05)
+        finally:
+            self.release(progress)
+        if progress.error:
+            raise Exception(progress.error)
+        if progress.cancelled:
+            raise Exception("download cancelled")
+        return path
+
+    def copy_to(self, attachment, target):
+        """Copy the attachment to target, fetching it first if needed; run on a worker"""
+        shutil.copyfile(self.fetch_file(attachment), target)
+        return target
+
+    def release(self, progress):
+        # The last viewer to close stops a download it no longer needs
+        with _downloads_lock:
+            progress.readers -= 1
+            if progress.readers <= 0 and not progress.done:
+                progress.cancelled = True
+
+    def prune(self, room=0):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file() and e.path not in _downloads]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries) + room
+        for entry in entries:
+            if total <= self.MAX_BYTES:
+                break
+            try:
+                os.unlink(entry.path)
+                total -= entry.stat().st_size  # cached by scandir when sorting
+            except OSError:
+                pass  # still open in a viewer on Windows
@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+
+try:
+    import fitz  # optional, PyMuPDF renders the first page of PDF attachments
+except ImportError:
+    fitz = None
+
+PREVIEW_SIZE = QtCore.QSize(1024, 768)  # previews are decoded to fit this box
+CACHE_BYTES = 128 * 1024 ** 2  # about 40 full screenshots
+
+# Decoded previews, attachment id -> QImage, least recently used first; shared by every issue dialog
+_previews = OrderedDict()
+_previews_lock = threading.Lock()
+
+
+def preview_kind(attachment):
+    """'image', 'pdf' or None when the attachment can't be previewed here"""
+    extension = os.path.splitext(attachment.get('filename', ''))[1].lower().lstrip('.')
+    if extension == 'pdf' or attachment.get('content_type') == 'application/pdf':
+        return 'pdf' if fitz else None
+    formats = {bytes(f).decode() for f in QtGui.QImageReader.supportedImageFormats()}
+    return 'image' if extension in formats else None
+
+
+def cached_preview(attachment_id):
+    with _previews_lock:
+        image = _previews.get(attachment_id)
+        if image is not None:
+            _previews.move_to_end(attachment_id)
+        return image
+
+
+def remember_preview(attachment_id, image):
+    with _previews_lock:
+        _previews[attachment_id] = image
+        total = sum(i.sizeInBytes() for i in _previews.values())
+        while total > CACHE_BYTES and len(_previews) > 1:
+            total -= _previews.popitem(last=False)[1].sizeInBytes()
+
+
+def decode_image(path, size=PREVIEW_SIZE):
+    """Decode an image file straight to preview size; QImage is safe to use off the GUI thread"""
+    reader = QtGui.QImageReader(path)
+    reader.setAutoTransform(True)
+    original = reader.size()
+    if original.isValid() and (original.width() > size.width() or original.height() > size.height()):
+        # JPEG decoders skip most of the work when asked for a smaller image
+        reader.setScaledSize(original.scaled(size, QtCore.Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise Exception(reader.errorString())
+    return image
+
+
+def render_pdf(path, size=PREVIEW_SIZE):
+    with fitz.open(path) as document:
+        page = document[0]
+        zoom = min(size.width() / page.rect.width, size.height() / page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return QtGui.QImage(pixmap.samples, pixmap.width, pixmap.height, pixmap.stride,
+                            QtGui.QImage.Format_RGB888).copy()
+
+
+def load_preview(cache, attachment, kind):
+    """Download (or reuse) the attachment and decode its preview, run on a worker"""
+    image = cached_preview(attachment['id'])
+    if image is not None:
+        return attachment['id'], image
+    # Downloaded right here, or by the viewer that already started it on its own thread
+    path = cache.fetch_file(attachment)
+    image = render_pdf(path) if kind == 'pdf' else decode_image(path)
+    remember_preview(attachment['id'], image)
+    return attachment['id'], image
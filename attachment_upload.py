@@ -0,0 +1,62 @@
+import os
+import mimetypes
+
+
+class UploadCancelled(Exception):
+    pass
+
+
+class UploadProgress:
+    """Shared between the uploading worker and the widget that polls it"""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.sent = 0
+        self.cancelled = False
+
+
+class ProgressFile:
+    """Read-only file wrapper that reports how much was sent and stops when cancelled.
+
+    requests takes the length from __len__ and http.client reads the body in
+    small blocks, so the file is streamed from disk rather than loaded.
+    """
+
+    def __init__(self, path, progress):
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.progress = progress
+        progress.total = self.size
+
+    def __len__(self):
+        return self.size - self.progress.sent
+
+    def read(self, size=-1):
+        if self.progress.cancelled:
+            raise UploadCancelled()
+        chunk = self.file.read(size)
+        self.progress.sent += len(chunk)
+        return chunk
+
+    def close(self):
+        self.file.close()
+
+
+def upload_file(api, path, progress, filename=None, remove=False):
+    """Stream a file to /uploads, run on a worker; returns the dict to put in an issue's "uploads" list.
+
+    With remove, the file is deleted afterwards whatever happened, e.g. a
+    pasted image saved to a temporary file.
+    """
+    filename = filename or os.path.basename(path)
+    try:
+        body = ProgressFile(path, progress)
+        try:
+            token = api.upload(body, filename)
+        finally:
+            body.close()
+    finally:
+        if remove and os.path.exists(path):
+            os.unlink(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return {'token': token, 'filename': filename, 'content_type': content_type}
@@ -1,56 +1,107 @@
 from PyQt5 import QtWidgets, QtGui
+from redmine_api import RedmineApi
+from dialogs.note_editor import NoteEditor
+from workers import run_in_background
 
 class ChangeStatusDialog(QtWidgets.QDialog):
     def __init__(self, parent, redmine, issue, font_size):
         super().__init__(parent)
         self.redmine = redmine
-        self.issue = redmine.issue.get(issue.id)
+        self.api = RedmineApi(redmine)
+        self.issue_id = issue.id
         self.updated_issue = None
+        self.saving = False
 
         self.setWindowTitle('Change Issue Status')
 
         layout = QtWidgets.QVBoxLayout()
-        layout.addWidget(QtWidgets.QLabel(f'Current status: {self.issue.status.name}'))
+        # The issue and the statuses load on a worker, the record we have fills in meanwhile
+        self.current_label = QtWidgets.QLabel(f"Current status: {issue.status_name}")
+        layout.addWidget(self.current_label)
         layout.addWidget(QtWidgets.QLabel('Select new status (Alt+S to focus):'))
 
         self.status_combo = QtWidgets.QComboBox()
+        self.status_combo.addItem('Loading...', None)
+        self.status_combo.setEnabled(False)
         self.status_map = {}
 
-        current_index = 0
-        for i, status in enumerate(redmine.issue_status.all()):
-            self.status_combo.addItem(status.name, status.id)
-            self.status_map[status.name] = status.id
-            if status.id == self.issue.status.id:
-                current_index = i  # save index to set as current later
-
-        self.status_combo.setCurrentIndex(current_index)
-
         layout.addWidget(self.status_combo)
 
         layout.addWidget(QtWidgets.QLabel('Add a note (optional):'))
-        self.note_edit = QtWidgets.QTextEdit()
-        self.note_edit.setPlaceholderText("Enter note here...")
+        self.note_edit = NoteEditor(self.api)
         layout.addWidget(self.note_edit)
 
-        button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
-        button_box.accepted.connect(self.save_status)
-        button_box.rejected.connect(self.reject)
-        layout.addWidget(button_box)
+        self.button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        self.button_box.accepted.connect(self.save_status)
+        self.button_box.rejected.connect(self.reject)
+        self.button_box.button(QtWidgets.QDialogButtonBox.Ok).setEnabled(False)
+        layout.addWidget(self.button_box)
 
         QtWidgets.QShortcut(QtGui.QKeySequence("Alt+S"), self, self.status_combo.setFocus)
-        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+S"), self, self.accept)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+S"), self, self.save_status)
 
         self.setLayout(layout)
+        run_in_background(self.load, on_done=self.loaded, on_error=self.load_failed, owner=self)
+
+    def load(self):
+        return self.api.get_issue(self.issue_id), self.api.statuses()
+
+    def loaded(self, result):
+        issue, statuses = result
+        self.current_label.setText(f"Current status: {issue['status']['name']}")
+        self.status_combo.clear()
+        current_index = 0
+        for i, status in enumerate(statuses):
+            self.status_combo.addItem(status['name'], status['id'])
+            self.status_map[status['name']] = status['id']
+            if status['id'] == issue['status']['id']:
+                current_index = i  # save index to set as current later
+
+        self.status_combo.setCurrentIndex(current_index)
+        self.status_combo.setEnabled(True)
+        self.button_box.button(QtWidgets.QDialogButtonBox.Ok).setEnabled(True)
+
+    def load_failed(self, error):
+        self.status_combo.setItemText(0, 'Failed to load the statuses')
+        QtWidgets.QMessageBox.critical(self, 'Error', f"Failed to load issue #{self.issue_id}: {error}")
 
     def save_status(self):
         selected_id = self.status_combo.currentData()
         note = self.note_edit.toPlainText().strip()
+        if self.saving or not self.status_combo.isEnabled():
+            return
+        if self.note_edit.busy():
+            QtWidgets.QMessageBox.warning(self, 'Uploads Running', "Wait for the attachments to finish uploading.")
+            return
         if selected_id:
             update_data = {'status_id': selected_id}
             if note:
                 update_data['notes'] = note
-            self.redmine.issue.update(self.issue.id, **update_data)
-            self.updated_issue = self.redmine.issue.get(self.issue.id)
-            QtWidgets.QMessageBox.information(self, 'Status Updated',
-                                              f"Status updated to {self.updated_issue.status.name}")
-            self.accept()
\ No newline at end of file
+            if self.note_edit.uploads():
+                update_data['uploads'] = self.note_edit.uploads()
+            self.saving = True
+            self.button_box.setEnabled(False)
+            run_in_background(self.send_update, update_data, on_done=self.saved, on_error=self.save_failed,
+                              owner=self)
+
+    def send_update(self, update_data):
+        self.api.update_issue(self.issue_id, **update_data)
+        return self.api.get_issue_record(self.issue_id)
+
+    def saved(self, record):
+        self.saving = False
+        self.updated_issue = record
+        QtWidgets.QMessageBox.information(self, 'Status Updated',
+                                          f"Status updated to {self.updated_issue.status_name}")
+        self.accept()
+
+    def save_failed(self, error):
+        self.saving = False
+        self.button_box.setEnabled(True)
+        QtWidgets.QMessageBox.critical(self, 'Error', f"Failed to update issue #{self.issue_id}: {error}")
+
+    def reject(self):
+        if self.saving:
+            return  # the update is on its way, its answer closes the dialog
+        self.note_edit.cancel_uploads()
+        super().reject()
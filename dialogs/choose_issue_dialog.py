@@ -1,39 +1,135 @@
-from PyQt5 import QtWidgets, QtGui
+from PyQt5 import QtWidgets, QtGui, QtCore
 import webbrowser
-from dialogs.issue_details_dialog import IssueDetailsDialog
+import os
+from dialogs.issue_details_dialog import IssueDetailsDialog, show_issue_window
+from dialogs.project_browser_dialog import ProjectBrowserDialog
+from redminelib.exceptions import ResourceNotFoundError
+from redmine_api import RedmineApi
+from local_store import sync_issue_index
+from query_cache import QueryCache, MY_ISSUES
+from pinned_issues import PINNED
+from issue_export import ExportProgress, export_issues, FORMATS
+from workers import run_in_background
+
+
+def fetch_issue_by_id(redmine, issue_id):
+    try:
+        return [RedmineApi(redmine).get_issue_record(issue_id)]
+    except ResourceNotFoundError:
+        return []
+
+
+def search_server(redmine, text, limit=25):
+    # Search results only carry id and title, so fetch the rows we display in one batched call
+    hits = redmine.issue.search(text, limit=limit)
+    ids = [hit.id for hit in hits] if hits else []
+    if not ids:
+        return []
+    records = RedmineApi(redmine).list_issues(issue_id=','.join(map(str, ids)), status_id='*')
+    by_id = {r.id: r for r in records}
+    return [by_id[i] for i in ids if i in by_id]
+
 
 class ChooseIssueDialog(QtWidgets.QDialog):
-    def __init__(self, parent, redmine, font_size, redmine_url, api_key):
+    # Below this length the full-text index would match almost everything
+    MIN_FULL_TEXT_QUERY = 3
+    # Wait for the user to stop typing before asking the server
+    REMOTE_SEARCH_DELAY = 400
+    SORT_KEYS = {
+        0: lambda i: i.id,
+        1: lambda i: i.subject.lower(),
+        2: lambda i: i.status_name,
+        3: lambda i: i.priority_id or 0,
+        4: lambda i: i.assignee_name.lower(),
+        5: lambda i: i.author_name.lower(),
+    }
+
+    def __init__(self, parent, redmine, font_size, redmine_url, api_key, text_formatting='textile', store=None,
+                 query_cache=None, session=None, names=None, users=None, pins=None):
         super().__init__(parent)
         self.selected_issue = None
+        self.text_formatting = text_formatting
+        self.store = store
+        self.search_results = {}  # issue id -> record found only through the full-text index
+        self.remote_results = {}  # issue id -> record found only on the server
+        self.remote_workers = []
+        self.shown_issues = []
+        self.shown_snippets = {}
+        self.redmine = redmine
         self.redmine_url = redmine_url
         self.api_key = api_key
+        self.query_cache = query_cache or QueryCache(redmine, store, parent=self)
+        self.session = session
+        self.names = names
+        self.users = users
+        self.pins = pins
+        picker_state = session.picker if session else {}
+        self.query_key = picker_state.get('query', MY_ISSUES)
+        self.sort_column = picker_state.get('sort_column')
+        self.sort_order = QtCore.Qt.SortOrder(picker_state.get('sort_order', 0))
+        self.issues = []
 
         self.setWindowTitle('Choose Issue')
         self.resize(1080, 600)
         layout = QtWidgets.QVBoxLayout()
 
-        issues = redmine.issue.filter(assigned_to_id='me', status_id='open')
-        self.issues = issues
+        query_layout = QtWidgets.QHBoxLayout()
+        query_layout.addWidget(QtWidgets.QLabel("Query (Alt+Q):"))
+        self.query_combo = QtWidgets.QComboBox()
+        self.query_combo.setMinimumWidth(300)
+        query_layout.addWidget(self.query_combo)
+        self.query_status_label = QtWidgets.QLabel()
+        query_layout.addWidget(self.query_status_label)
+        query_layout.addStretch()
+        layout.addLayout(query_layout)
+        self.populate_queries()
 
         search_layout = QtWidgets.QHBoxLayout()
         search_layout.addWidget(QtWidgets.QLabel("Search (Alt+F):"))
         self.search_edit = QtWidgets.QLineEdit()
-        self.search_edit.setPlaceholderText("Filter issues by ID or subject...")
+        self.search_edit.setPlaceholderText("Filter issues by ID or subject, or search descriptions and notes...")
         search_layout.addWidget(self.search_edit)
         layout.addLayout(search_layout)
 
         self.issues_table = QtWidgets.QTableWidget()
-        self.issues_table.setColumnCount(4)
-        self.issues_table.setHorizontalHeaderLabels(['ID', 'Subject', 'Status', 'Priority'])
+        self.issues_table.setColumnCount(7)
+        self.issues_table.setHorizontalHeaderLabels(['ID', 'Subject', 'Status', 'Priority', 'Assignee', 'Author',
+                                                     'Match'])
         self.issues_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.issues_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.issues_table.setFont(QtGui.QFont('', font_size))
+        self.issues_table.horizontalHeader().sectionClicked.connect(self.sort_by)
+        if self.sort_column is not None:
+            self.issues_table.horizontalHeader().setSortIndicatorShown(True)
+            self.issues_table.horizontalHeader().setSortIndicator(self.sort_column, self.sort_order)
         layout.addWidget(self.issues_table)
 
-        self.populate_table(issues)
         self.search_edit.textChanged.connect(self.filter_issues)
 
+        self.export_progress = None  # ExportProgress of a running export
+        self.remote_search_timer = QtCore.QTimer(self)
+        self.remote_search_timer.setSingleShot(True)
+        self.remote_search_timer.setInterval(self.REMOTE_SEARCH_DELAY)
+        self.remote_search_timer.timeout.connect(self.search_remote)
+
+        # My open issues come from the cache when possible, otherwise fetched right away as before
+        if self.query_key == MY_ISSUES:
+            self.set_issues(self.query_cache.get_or_fetch(self.query_key))
+        else:
+            self.load_query(self.query_key)
+        self.query_cache.updated.connect(self.query_updated)
+        self.query_cache.queries_loaded.connect(self.populate_queries)
+        if self.users:
+            self.users.updated.connect(self.update_people)
+        if self.pins:
+            self.pins.changed.connect(self.pins_changed)
+        self.query_combo.currentIndexChanged.connect(self.switch_query)
+        self.query_cache.load_queries()
+
+        if picker_state.get('filter'):
+            self.search_edit.setText(picker_state['filter'])
+            self.search_edit.selectAll()
+
         button_layout = QtWidgets.QHBoxLayout()
         select_button = QtWidgets.QPushButton('Select as current (Ctrl+S)')
         select_button.setShortcut('Ctrl+S')
@@ -45,6 +141,16 @@ class ChooseIssueDialog(QtWidgets.QDialog):
         preview_button.clicked.connect(self.preview_issue)
         button_layout.addWidget(preview_button)
 
+        browse_button = QtWidgets.QPushButton('Browse project (Ctrl+P)')
+        browse_button.setShortcut('Ctrl+P')
+        browse_button.clicked.connect(self.browse_project)
+        button_layout.addWidget(browse_button)
+
+        export_button = QtWidgets.QPushButton('Export (Ctrl+E)')
+        export_button.setShortcut('Ctrl+E')
+        export_button.clicked.connect(self.export_query)
+        button_layout.addWidget(export_button)
+
         open_button = QtWidgets.QPushButton('Open in browser (Ctrl+B)')
         open_button.setShortcut('Ctrl+B')
         open_button.clicked.connect(self.open_in_browser)
@@ -57,46 +163,300 @@ class ChooseIssueDialog(QtWidgets.QDialog):
 
         layout.addLayout(button_layout)
 
+        QtWidgets.QShortcut(QtGui.QKeySequence("Alt+Q"), self, self.query_combo.setFocus)
         QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+F"), self, self.search_edit.setFocus)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+D"), self, self.toggle_pin)
         QtWidgets.QShortcut(QtGui.QKeySequence("Return"), self.issues_table, self.select_issue)
         QtWidgets.QShortcut(QtGui.QKeySequence("Escape"), self, self.reject)
         self.issues_table.cellDoubleClicked.connect(lambda row, col: self.select_issue())
 
         self.setLayout(layout)
 
-    def populate_table(self, issues):
+    def populate_queries(self):
+        self.query_combo.blockSignals(True)
+        self.query_combo.clear()
+        self.query_combo.addItem('My open issues', MY_ISSUES)
+        if self.pins:
+            self.query_combo.addItem('Pinned issues', PINNED)
+        for query_id, name, project_id in self.query_cache.queries:
+            self.query_combo.addItem(name, query_id)
+        if self.query_combo.findData(self.query_key) < 0:
+            # Restored from the last session before the list of saved queries arrived
+            self.query_combo.addItem(f'Saved query #{self.query_key}', self.query_key)
+        index = self.query_combo.findData(self.query_key)
+        self.query_combo.setCurrentIndex(max(index, 0))
+        self.query_combo.blockSignals(False)
+
+    def switch_query(self):
+        self.load_query(self.query_combo.currentData())
+
+    def load_query(self, key):
+        self.query_key = key
+        if key == PINNED and self.pins:
+            self.set_issues(self.pins.records())
+            return
+        records = self.query_cache.get(self.query_key)
+        if records is None:
+            # Never run before, show an empty list until the background fetch lands
+            self.set_issues([])
+            self.query_status_label.setText('Loading...')
+            self.query_cache.refresh(self.query_key)
+        else:
+            self.set_issues(records)
+
+    def pins_changed(self):
+        if self.query_key == PINNED:
+            self.set_issues(self.pins.records())
+
+    def toggle_pin(self):
+        selected = self.issues_table.selectionModel().selectedRows()
+        if self.pins and selected:
+            issue = self.find_issue(int(self.issues_table.item(selected[0].row(), 0).text()))
+            if issue:
+                pinned = self.pins.toggle(issue)
+                self.query_status_label.setText(f"#{issue.id} {'pinned' if pinned else 'unpinned'}")
+
+    def query_updated(self, key):
+        if key == self.query_key:
+            self.set_issues(self.query_cache.get(key))
+
+    def set_issues(self, issues):
+        selected = self.issues_table.selectionModel().selectedRows()
+        selected_id = int(self.issues_table.item(selected[0].row(), 0).text()) if selected else None
+        self.issues = issues
+        self.query_status_label.setText(f'{len(issues)} issues')
+        if self.store:
+            # Issues indexed at their current updated_on are skipped, the most recently changed go first
+            stale_ids = self.store.stale_issue_ids(sorted(issues, key=lambda r: r.updated_on or '', reverse=True))
+            if stale_ids:
+                run_in_background(sync_issue_index, self.redmine, self.store, stale_ids,
+                                  on_error=lambda e: print(f"Failed to index issues: {e}"))
+        self.filter_issues()
+        for row, issue in enumerate(self.shown_issues):
+            if issue.id == selected_id:
+                self.issues_table.selectRow(row)
+                break
+
+    def populate_table(self, issues, snippets=None):
+        snippets = snippets or {}
+        self.shown_issues = issues
+        self.shown_snippets = snippets
         self.issues_table.setRowCount(len(issues))
         self.issues_table.setColumnWidth(0, 50)  # ID
-        self.issues_table.setColumnWidth(1, 700)  # Subject
+        self.issues_table.setColumnWidth(1, 500)  # Subject
         self.issues_table.setColumnWidth(2, 100)  # Status
         self.issues_table.setColumnWidth(3, 100)  # Priority
+        self.issues_table.setColumnWidth(4, 140)  # Assignee
+        self.issues_table.setColumnWidth(5, 140)  # Author
+        self.issues_table.setColumnWidth(6, 300)  # Full-text match
+        if self.users:
+            self.users.remember_records(issues)
         for row, issue in enumerate(issues):
             self.issues_table.setItem(row, 0, QtWidgets.QTableWidgetItem(str(issue.id)))
             self.issues_table.setItem(row, 1, QtWidgets.QTableWidgetItem(issue.subject))
-            self.issues_table.setItem(row, 2, QtWidgets.QTableWidgetItem(issue.status.name))
-            self.issues_table.setItem(row, 3, QtWidgets.QTableWidgetItem(issue.priority.name))
+            self.issues_table.setItem(row, 2, QtWidgets.QTableWidgetItem(issue.status_name))
+            self.issues_table.setItem(row, 3, QtWidgets.QTableWidgetItem(issue.priority_name))
+            self.issues_table.setItem(row, 4, self.person_item(issue.assignee_id, issue.assignee_name))
+            self.issues_table.setItem(row, 5, self.person_item(issue.author_id, issue.author_name))
+            if issue.id in snippets:
+                snippet_label = QtWidgets.QLabel(snippets[issue.id])
+                snippet_label.setTextFormat(QtCore.Qt.RichText)
+                snippet_label.setToolTip(snippets[issue.id])
+                self.issues_table.setCellWidget(row, 6, snippet_label)
+            else:
+                self.issues_table.removeCellWidget(row, 6)
+
+    def person_item(self, user_id, name):
+        item = QtWidgets.QTableWidgetItem(name)
+        if user_id and self.users:
+            item.setIcon(self.users.icon(user_id))
+            item.setToolTip(self.users.tooltip(user_id))
+        return item
+
+    def update_people(self):
+        # Logins and avatars arrived in the background, refresh the person cells only
+        for row, issue in enumerate(self.shown_issues):
+            for column, user_id in ((4, issue.assignee_id), (5, issue.author_id)):
+                item = self.issues_table.item(row, column)
+                if item is not None and user_id:
+                    item.setIcon(self.users.icon(user_id))
+                    item.setToolTip(self.users.tooltip(user_id))
 
     def filter_issues(self):
         text = self.search_edit.text().lower()
         filtered = [i for i in self.issues if text in str(
-            i.id).lower() or text in i.subject.lower() or text in i.status.name.lower() or text in i.priority.name.lower()]
-        self.populate_table(filtered)
+            i.id).lower() or text in i.subject.lower() or text in i.status_name.lower() or text in i.priority_name.lower()
+            or text in i.assignee_name.lower() or text in i.author_name.lower()]
+        if self.sort_column in self.SORT_KEYS:
+            filtered.sort(key=self.SORT_KEYS[self.sort_column],
+                          reverse=self.sort_order == QtCore.Qt.DescendingOrder)
+
+        # Ranked full-text matches from the local index follow the plain filter matches
+        snippets = {}
+        self.search_results = {}
+        if self.store and len(text) >= self.MIN_FULL_TEXT_QUERY:
+            shown = {i.id for i in filtered}
+            for record, snippet in self.store.search(text):
+                snippets[record.id] = snippet
+                if record.id not in shown:
+                    filtered.append(record)
+                    self.search_results[record.id] = record
+        self.populate_table(filtered, snippets)
 
         # Auto-select the only row if there's just one
         if len(filtered) == 1:
             self.issues_table.selectRow(0)
 
+        # Anything still running was for an older query
+        self.cancel_remote_search()
+        self.remote_results = {}
+        self.remote_search_timer.start()
+
+    def sort_by(self, column):
+        if column not in self.SORT_KEYS:
+            return
+        if column == self.sort_column:
+            self.sort_order = QtCore.Qt.DescendingOrder if self.sort_order == QtCore.Qt.AscendingOrder \
+                else QtCore.Qt.AscendingOrder
+        else:
+            self.sort_column = column
+            self.sort_order = QtCore.Qt.AscendingOrder
+        header = self.issues_table.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(self.sort_column, self.sort_order)
+        self.filter_issues()
+
+    def cancel_remote_search(self):
+        for worker in self.remote_workers:
+            worker.cancel()
+        self.remote_workers = []
+
+    def search_remote(self):
+        text = self.search_edit.text().strip()
+        shown = {i.id for i in self.shown_issues}
+        if text.isdigit():
+            # Numeric query goes straight to the issue, unless we already have it
+            if int(text) not in shown:
+                self.remote_workers.append(run_in_background(
+                    fetch_issue_by_id, self.redmine, int(text),
+                    on_done=lambda records, t=text: self.add_remote_results(records, t),
+                    on_error=lambda e: print(f"Failed to fetch issue #{text}: {e}"), owner=self))
+        elif len(text) >= self.MIN_FULL_TEXT_QUERY:
+            self.remote_workers.append(run_in_background(
+                search_server, self.redmine, text,
+                on_done=lambda records, t=text: self.add_remote_results(records, t),
+                on_error=lambda e: print(f"Server search failed: {e}"), owner=self))
+
+    def add_remote_results(self, records, text):
+        # A search that finished after the query changed, cancel() can't stop one already running
+        if text != self.search_edit.text().strip():
+            return
+        # Stream server results in below the local matches, keeping the current selection
+        shown = {i.id for i in self.shown_issues}
+        new_records = [r for r in records if r.id not in shown]
+        if not new_records:
+            return
+        for record in new_records:
+            self.remote_results[record.id] = record
+        if self.store:
+            self.store.upsert_issues(new_records)
+        snippets = dict(self.shown_snippets)
+        snippets.update({r.id: '<i>from server</i>' for r in new_records})
+        selected = self.issues_table.selectionModel().selectedRows()
+        selected_row = selected[0].row() if selected else None
+        self.populate_table(self.shown_issues + new_records, snippets)
+        if selected_row is not None:
+            self.issues_table.selectRow(selected_row)
+        elif len(self.shown_issues) == 1:
+            self.issues_table.selectRow(0)
+
     def select_issue(self):
         selected = self.issues_table.selectionModel().selectedRows()
         if selected:
-            issue_id = int(self.issues_table.item(selected[0].row(), 0).text())
-            for issue in self.issues:
-                if issue.id == issue_id:
-                    self.selected_issue = issue
-                    self.accept()
-                    return
+            issue = self.find_issue(int(self.issues_table.item(selected[0].row(), 0).text()))
+            if issue:
+                self.selected_issue = issue
+                self.accept()
+                return
         QtWidgets.QMessageBox.warning(self, 'No selection', 'Please select an issue.')
 
+    def done(self, result):
+        if self.export_progress:
+            self.export_progress.cancelled = True  # nobody is left to tell when it is done
+        self.remote_search_timer.stop()
+        self.cancel_remote_search()
+        self.query_cache.updated.disconnect(self.query_updated)
+        self.query_cache.queries_loaded.disconnect(self.populate_queries)
+        if self.users:
+            self.users.updated.disconnect(self.update_people)
+        if self.pins:
+            self.pins.changed.disconnect(self.pins_changed)
+        if self.session:
+            self.session.save_picker(query=self.query_key, filter=self.search_edit.text(),
+                                     sort_column=self.sort_column, sort_order=int(self.sort_order))
+        # Previewed issues stay open after the picker closes, handed over to our parent
+        for window in self.findChildren(IssueDetailsDialog, options=QtCore.Qt.FindDirectChildrenOnly):
+            if window.isVisible():
+                window.setParent(self.parentWidget(), window.windowFlags())
+                window.show()
+        super().done(result)
+
+    def find_issue(self, issue_id):
+        for issue in self.issues:
+            if issue.id == issue_id:
+                return issue
+        return self.search_results.get(issue_id) or self.remote_results.get(issue_id)
+
+    def browse_project(self):
+        dialog = ProjectBrowserDialog(self, self.redmine, self.issues_table.font().pointSize(), self.store)
+        accepted = dialog.exec_()
+        dialog.deleteLater()
+        if accepted:
+            self.selected_issue = dialog.selected_issue
+            self.accept()
+
+    def export_query(self):
+        # The whole query, not only the rows matching the filter box
+        path, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Export issues', f'issues-{self.query_key}.csv', 'CSV (*.csv);;JSON (*.json);;NDJSON (*.ndjson)')
+        if not path:
+            return
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            fmt = selected_filter.split()[0].lower()
+            path += '.' + fmt
+        journals = QtWidgets.QMessageBox.question(
+            self, 'Export issues', 'Include notes? This needs one extra request per issue.',
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
+            QtWidgets.QMessageBox.No) == QtWidgets.QMessageBox.Yes
+        if self.query_key == PINNED and self.pins:
+            filters = {'issue_id': ','.join(str(r.id) for r in self.pins.records()), 'status_id': '*'}
+        else:
+            filters = self.query_cache.filters(self.query_key)
+
+        progress = self.export_progress = ExportProgress()
+        progress_dialog = QtWidgets.QProgressDialog('Exporting issues...', 'Cancel', 0, 0, self)
+        progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        progress_dialog.canceled.connect(lambda: setattr(progress, 'cancelled', True))
+        progress_timer = QtCore.QTimer(progress_dialog)
+        progress_timer.timeout.connect(lambda: progress_dialog.setLabelText(f'Exported {progress.written} issues...'))
+        progress_timer.start(200)
+        progress_dialog.show()
+
+        def finished(count):
+            cancelled = progress.cancelled  # closing the progress dialog counts as cancel
+            progress_dialog.close()
+            if not cancelled:
+                QtWidgets.QMessageBox.information(self, 'Export issues', f'Exported {count} issues to {path}')
+
+        def failed(error):
+            progress_dialog.close()
+            QtWidgets.QMessageBox.warning(self, 'Export issues', f'Export failed: {error}')
+
+        # The callbacks use this dialog, they are dropped if it closes first
+        run_in_background(export_issues, RedmineApi(self.redmine), filters, path, fmt, journals, self.store, progress,
+                          on_done=finished, on_error=failed, owner=self)
+
     def open_in_browser(self):
         selected = self.issues_table.selectionModel().selectedRows()
         if selected:
@@ -108,18 +468,21 @@ class ChooseIssueDialog(QtWidgets.QDialog):
     def preview_issue(self):
         selected = self.issues_table.selectionModel().selectedRows()
         if selected:
-            issue_id = int(self.issues_table.item(selected[0].row(), 0).text())
-            for issue in self.issues:
-                if issue.id == issue_id:
-                    dialog = IssueDetailsDialog(
-                        self,  # parent
-                        redmine=self.issues[0].manager.redmine,  # get redmine instance from issue object
-                        issue=issue,
-                        font_size=self.issues_table.font().pointSize(),
-                        redmine_url=self.redmine_url,
-                        api_key=self.api_key
-                    )
-                    dialog.exec_()
-                    return
+            issue = self.find_issue(int(self.issues_table.item(selected[0].row(), 0).text()))
+            if issue:
+                show_issue_window(
+                    self,  # parent
+                    redmine=self.redmine,
+                    issue=issue,
+                    font_size=self.issues_table.font().pointSize(),
+                    redmine_url=self.redmine_url,
+                    api_key=self.api_key,
+                    text_formatting=self.text_formatting,
+                    store=self.store,
+                    names=self.names,
+                    users=self.users,
+                    pins=self.pins
+                )
+                return
         else:
             QtWidgets.QMessageBox.warning(self, 'No selection', 'Please select an issue to preview.')
@@ -1,13 +1,52 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
 import webbrowser
 import os
-import requests
 import tempfile
 import subprocess
 
+from text_render import render_in_background
+from redmine_api import RedmineApi
+from pinned_issues import fetch_details
+from workers import run_in_background
+from name_lookup import NameLookup
+from attachment_cache import AttachmentCache, is_text
+from dialogs.note_editor import NoteEditor
+from dialogs.log_viewer_dialog import LogViewerDialog
+from dialogs.preview_pane import PreviewPane
+from dialogs.relations_view import RelationsView
+from attachment_preview import preview_kind
+
+# Issue id -> its open window, one window per issue
+_open_windows = {}
+
+
+def show_issue_window(parent, redmine, issue, *args, **kwargs):
+    """Show an issue in its own non-modal window, or raise the window already showing it"""
+    window = _open_windows.get(issue.id)
+    if window is None:
+        window = IssueDetailsDialog(parent, redmine, issue, *args, **kwargs)
+        window.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        window.show()
+        # Side by side rather than stacked exactly on top of each other
+        offset = 30 * (len(_open_windows) % 8)
+        window.move(window.pos() + QtCore.QPoint(offset, offset))
+        _open_windows[issue.id] = window
+    window.show()
+    window.raise_()
+    window.activateWindow()
+    return window
+
 
 class IssueDetailsDialog(QtWidgets.QDialog):
-    def __init__(self, parent, redmine, issue, font_size, redmine_url, api_key):
+    """Details, notes, attachments and relations of one issue.
+
+    Opens at once: stored details show right away, otherwise a placeholder
+    until the issue arrives from the worker. Everything shown is this
+    window's own copy, so several windows load and refresh independently.
+    """
+
+    def __init__(self, parent, redmine, issue, font_size, redmine_url, api_key, text_formatting='textile', store=None,
+                 names=None, users=None, pins=None):
         super().__init__(parent, QtCore.Qt.FramelessWindowHint)
         self.setWindowFlags(QtCore.Qt.FramelessWindowHint | QtCore.Qt.Window)
         self.setWindowTitle(f'Issue #{issue.id}')
@@ -17,28 +56,71 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         self.redmine_url = redmine_url
         self.api_key = api_key
         self.font_size = font_size
+        self.text_formatting = text_formatting
+        self.users = users
+        self.store = store
+        self.pins = pins
+        self.record = issue
+        self.rendered_widgets = {}  # render key -> widget showing that text
         self.temp_files = []  # Track temporary files for cleanup
+        self.attachment_cache = AttachmentCache(redmine_url, api_key)
+
+        # Names for every id in the history, fetched in bulk for the whole journal list
+        self.names = names or NameLookup(redmine)
+        self.api = RedmineApi(redmine)
+
+        # Pinned and recently opened issues render from the store, the fresh copy patches them
+        self.issue = store.get_details(issue.id) if store else None
+        self.names_complete = self.issue is not None and self.names.has_names(self.issue)
+        run_in_background(self.fetch_issue, on_done=self.issue_fetched, on_error=self.fetch_failed, owner=self)
+        if users and self.issue:
+            users.remember_issue(self.issue)
+
+        self.avatar_labels = []  # (label, user id) of journal headers
+        # Kept across rebuilt tabs, so a refreshed issue doesn't walk its relations again
+        self.relations_view = RelationsView(self.api, store, issue.id, redmine_url)
+        self.setup_ui()
+        self.render_texts()
+        if users:
+            users.updated.connect(self.update_avatars)
 
-        # Get the full issue details
-        self.issue = redmine.issue.get(issue.id, include=['attachments', 'journals', 'status'])
-
-        # Try to get all statuses to show names instead of IDs
-        self.statuses = {}
+    def fetch_issue(self):
+        # The full text also keeps the local search index current for free
+        issue = fetch_details(self.api, self.store, self.issue_id)
         try:
-            # Try the issue_status endpoint instead of status
-            for status in redmine.issue_status.all():
-                self.statuses[status.id] = status.name
+            self.names.resolve(issue)
         except Exception as e:
-            print(f"Failed to retrieve statuses: {e}")
-            # If we can't get statuses, try to at least get the current issue's status
-            if hasattr(self.issue, 'status'):
-                self.statuses[self.issue.status.id] = self.issue.status.name
-
-        self.setup_ui()
-
-    def setup_ui(self):
-        main_layout = QtWidgets.QVBoxLayout()
-
+            print(f"Failed to resolve names in the issue history: {e}")
+        return issue
+
+    def issue_fetched(self, issue):
+        if self.users:
+            self.users.remember_issue(issue)
+        changed = (self.issue is None or issue.get('updated_on') != self.issue.get('updated_on')
+                   or len(issue.get('journals', [])) != len(self.issue.get('journals', [])))
+        if changed or not self.names_complete:
+            self.issue = issue
+            self.names_complete = True
+            self.rebuild_tabs()
+
+    def fetch_failed(self, error):
+        print(f"Failed to fetch issue #{self.issue_id}: {error}")
+        if self.issue is None:
+            self.tab_widget.setText(f"Couldn't load issue #{self.issue_id}: {error}")
+
+    def rebuild_tabs(self):
+        # Swap in tabs built from the current issue, staying on the tab the user is reading
+        old = self.tab_widget
+        index = old.currentIndex() if isinstance(old, QtWidgets.QTabWidget) else 0
+        self.rendered_widgets = {}
+        self.avatar_labels = []
+        self.tab_widget = self.build_tabs()
+        self.tab_widget.setCurrentIndex(index)
+        self.layout().replaceWidget(old, self.tab_widget)
+        old.deleteLater()
+        self.render_texts()
+
+    def build_tabs(self):
         # Create tab widget for organization
         tab_widget = QtWidgets.QTabWidget()
 
@@ -67,7 +149,7 @@ class IssueDetailsDialog(QtWidgets.QDialog):
                     self.clicked.emit()
 
         # Row 0: Issue title (clickable)
-        title_label = ClickableLabel(f"<b>Issue #{self.issue.id}:</b> {self.issue.subject}")
+        title_label = ClickableLabel(f"<b>Issue #{self.issue['id']}:</b> {self.issue['subject']}")
         title_label.setTextFormat(QtCore.Qt.RichText)
         font = title_label.font()
         font.setPointSize(self.font_size)
@@ -82,16 +164,21 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         self.row1_widget = QtWidgets.QWidget()
         row1_layout = QtWidgets.QHBoxLayout(self.row1_widget)
         row1_layout.setContentsMargins(0, 0, 0, 0)
-        row1_layout.addWidget(make_labeled_value("Status:", self.issue.status.name, font_size_offset=-1))
-        row1_layout.addWidget(make_labeled_value("Priority:", self.issue.priority.name, font_size_offset=-1))
+        row1_layout.addWidget(make_labeled_value("Status:", self.issue['status']['name'], font_size_offset=-1))
+        row1_layout.addWidget(make_labeled_value("Priority:", self.issue['priority']['name'], font_size_offset=-1))
+        assignee = self.issue.get('assigned_to')
+        assignee_label = make_labeled_value("Assignee:", assignee['name'] if assignee else '-', font_size_offset=-1)
+        if assignee and self.users:
+            assignee_label.setToolTip(self.users.tooltip(assignee['id']))
+        row1_layout.addWidget(assignee_label)
         self.row1_widget.setVisible(False)
 
         # Row 2: Created + Updated
         self.row2_widget = QtWidgets.QWidget()
         row2_layout = QtWidgets.QHBoxLayout(self.row2_widget)
         row2_layout.setContentsMargins(0, 0, 0, 0)
-        row2_layout.addWidget(make_labeled_value("Created:", self.issue.created_on, font_size_offset=-1))
-        row2_layout.addWidget(make_labeled_value("Updated:", self.issue.updated_on, font_size_offset=-1))
+        row2_layout.addWidget(make_labeled_value("Created:", self.issue['created_on'], font_size_offset=-1))
+        row2_layout.addWidget(make_labeled_value("Updated:", self.issue['updated_on'], font_size_offset=-1))
         self.row2_widget.setVisible(False)
 
         # Toggle rows on click
@@ -107,9 +194,10 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         info_layout.addWidget(self.row2_widget, 2, 0, 1, 2)
 
         # Row 3: Description
-        desc_text = QtWidgets.QTextEdit()
-        desc_text.setReadOnly(True)
-        desc_text.setPlainText(self.issue.description)
+        desc_text = QtWidgets.QTextBrowser()
+        desc_text.setOpenExternalLinks(True)
+        desc_text.setPlainText(self.issue.get('description') or '')
+        self.rendered_widgets[('issue', self.issue['id'], self.issue['updated_on'])] = desc_text
         font = desc_text.font()
         font.setPointSize(self.font_size)
         desc_text.setFont(font)
@@ -129,44 +217,50 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         notes_widget.setLayout(notes_content_layout)
 
         # Add each journal/note
-        if hasattr(self.issue, 'journals'):
-            for journal in reversed(self.issue.journals):
+        if self.issue.get('journals'):
+            for journal in reversed(self.issue['journals']):
                 note_frame = QtWidgets.QFrame()
                 note_frame.setFrameShape(QtWidgets.QFrame.StyledPanel)
                 note_frame.setFrameShadow(QtWidgets.QFrame.Raised)
                 note_layout = QtWidgets.QVBoxLayout()
 
                 # Header with author, date, and status change if present
-                author = getattr(journal, 'user', 'Unknown')
-                header_text = f"<b>{author}</b> - {journal.created_on}"
+                author = journal.get('user', {}).get('name', 'Unknown')
+                header_text = f"<b>{author}</b> - {journal['created_on']}"
 
                 # Add status change info directly in the header if present
-                if hasattr(journal, 'details') and journal.details:
-                    for detail in journal.details:
-                        if detail.get('name') == 'status_id':
-                            try:
-                                old_status = self.statuses.get(int(detail.get('old_value', '0')),
-                                                               f"Status #{detail.get('old_value')}")
-                                new_status = self.statuses.get(int(detail.get('new_value', '0')),
-                                                               f"Status #{detail.get('new_value')}")
-                                header_text += f" - Status: {old_status} → {new_status}"
-                            except (ValueError, TypeError):
-                                # Fallback if conversion fails
-                                header_text += f" - Status: {detail.get('old_value', 'Unknown')} → {detail.get('new_value', 'Unknown')}"
+                if journal.get('details'):
+                    for detail in journal['details']:
+                        if detail.get('property') == 'attr' and detail.get('name') == 'status_id':
+                            _, old_status, new_status = self.names.describe(detail, self.issue)
+                            header_text += f" - Status: {old_status} → {new_status}"
                             break
 
                 header = QtWidgets.QLabel(header_text)
-                note_layout.addWidget(header)
+                user = journal.get('user')
+                if user and self.users:
+                    header.setToolTip(self.users.tooltip(user['id']))
+                    avatar = QtWidgets.QLabel()
+                    avatar.setPixmap(self.users.avatar(user['id'], 24))
+                    avatar.setToolTip(header.toolTip())
+                    self.avatar_labels.append((avatar, user['id']))
+                    header_layout = QtWidgets.QHBoxLayout()
+                    header_layout.addWidget(avatar)
+                    header_layout.addWidget(header, 1)
+                    note_layout.addLayout(header_layout)
+                else:
+                    note_layout.addWidget(header)
 
                 # Note content as italic text without scrollbars
-                if hasattr(journal, 'notes') and journal.notes:
-                    notes_label = QtWidgets.QLabel()
-
-                    # Format the text with italics and preserve line breaks
-                    formatted_notes = journal.notes.replace('\n', '<br>')
-                    notes_label.setText(f"<i>{formatted_notes}</i>")
+                if journal.get('notes'):
+                    # Plain text until the rendered HTML arrives from the worker
+                    notes_label = QtWidgets.QLabel(journal['notes'])
                     notes_label.setWordWrap(True)
-                    notes_label.setTextFormat(QtCore.Qt.RichText)
+                    notes_label.setTextFormat(QtCore.Qt.PlainText)
+                    notes_label.setOpenExternalLinks(True)
+                    notes_label.setTextInteractionFlags(QtCore.Qt.TextBrowserInteraction)
+                    updated_on = journal.get('updated_on') or journal['created_on']
+                    self.rendered_widgets[('journal', journal['id'], updated_on)] = notes_label
 
                     # Set the font size
                     font = notes_label.font()
@@ -176,18 +270,19 @@ class IssueDetailsDialog(QtWidgets.QDialog):
                     note_layout.addWidget(notes_label)
 
                 # Display other changes (not status which is already in the header)
-                if hasattr(journal, 'details') and journal.details:
+                if journal.get('details'):
                     changes_added = False
                     changes_layout = QtWidgets.QVBoxLayout()
 
-                    for detail in journal.details:
-                        if detail.get('name') != 'status_id':
+                    for detail in journal['details']:
+                        if detail.get('property') != 'attr' or detail.get('name') != 'status_id':
                             if not changes_added:
                                 changes = QtWidgets.QLabel("<b>Changes:</b>")
                                 changes_layout.addWidget(changes)
                                 changes_added = True
 
-                            change_text = f"• {detail.get('name', 'Unknown')}: {detail.get('old_value', '')} → {detail.get('new_value', '')}"
+                            label, old_value, new_value = self.names.describe(detail, self.issue)
+                            change_text = f"• {label}: {old_value} → {new_value}"
                             change = QtWidgets.QLabel(change_text)
                             changes_layout.addWidget(change)
 
@@ -210,28 +305,32 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         attachments_layout = QtWidgets.QVBoxLayout()
         attachments_tab.setLayout(attachments_layout)
 
-        if hasattr(self.issue, 'attachments') and self.issue.attachments:
+        if self.issue.get('attachments'):
             attachments_table = QtWidgets.QTableWidget()
             attachments_table.setColumnCount(5)
             attachments_table.setHorizontalHeaderLabels(["Filename", "Size", "Author", "Created", "Actions"])
             attachments_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
-            attachments_table.setRowCount(len(self.issue.attachments))
+            attachments_table.setRowCount(len(self.issue['attachments']))
 
             row = 0
-            for attachment in self.issue.attachments:
+            for attachment in self.issue['attachments']:
                 # Filename
-                attachments_table.setItem(row, 0, QtWidgets.QTableWidgetItem(attachment.filename))
+                attachments_table.setItem(row, 0, QtWidgets.QTableWidgetItem(attachment['filename']))
 
                 # Size (format nicely)
-                size = self.format_size(attachment.filesize)
+                size = self.format_size(attachment['filesize'])
                 attachments_table.setItem(row, 1, QtWidgets.QTableWidgetItem(size))
 
                 # Author
-                author = getattr(attachment, 'author', 'Unknown')
-                attachments_table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(author)))
+                author = attachment.get('author', {})
+                author_item = QtWidgets.QTableWidgetItem(author.get('name', 'Unknown'))
+                if author and self.users:
+                    author_item.setIcon(self.users.icon(author['id']))
+                    author_item.setToolTip(self.users.tooltip(author['id']))
+                attachments_table.setItem(row, 2, author_item)
 
                 # Created date
-                attachments_table.setItem(row, 3, QtWidgets.QTableWidgetItem(str(attachment.created_on)))
+                attachments_table.setItem(row, 3, QtWidgets.QTableWidgetItem(attachment['created_on']))
 
                 # Actions button
                 actions_widget = QtWidgets.QWidget()
@@ -250,7 +349,16 @@ class IssueDetailsDialog(QtWidgets.QDialog):
                 attachments_table.setCellWidget(row, 4, actions_widget)
                 row += 1
 
-            attachments_layout.addWidget(attachments_table)
+            # Images and PDFs show next to the table, decoded on workers
+            self.preview_pane = PreviewPane(self.attachment_cache)
+            attachments_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+            attachments_table.currentCellChanged.connect(lambda row, *_: self.preview_attachment(row))
+            self.attachments_table = attachments_table
+            splitter = QtWidgets.QSplitter()
+            splitter.addWidget(attachments_table)
+            splitter.addWidget(self.preview_pane)
+            splitter.setSizes([600, 400])
+            attachments_layout.addWidget(splitter)
         else:
             no_attachments = QtWidgets.QLabel("No attachments available for this issue.")
             attachments_layout.addWidget(no_attachments)
@@ -259,8 +367,24 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         tab_widget.addTab(details_tab, "Details")
         tab_widget.addTab(notes_tab, "Notes")
         tab_widget.addTab(attachments_tab, "Attachments")
+        tab_widget.addTab(self.relations_view, "Relations")
+        return tab_widget
 
-        main_layout.addWidget(tab_widget)
+    def setup_ui(self):
+        main_layout = QtWidgets.QVBoxLayout()
+        if self.issue is not None:
+            self.tab_widget = self.build_tabs()
+        else:
+            # Replaced by the tabs once the issue arrives
+            self.tab_widget = QtWidgets.QLabel(f"Loading issue #{self.issue_id}: {self.record.subject}...")
+            self.tab_widget.setAlignment(QtCore.Qt.AlignCenter)
+            self.tab_widget.setWordWrap(True)
+        main_layout.addWidget(self.tab_widget)
+
+        # Notes and attachments go straight to the issue, the tabs refresh once saved
+        self.note_editor = NoteEditor(self.api, "Add a note...")
+        self.note_editor.text_edit.setMaximumHeight(80)
+        main_layout.addWidget(self.note_editor)
 
         # Bottom buttons
         button_layout = QtWidgets.QHBoxLayout()
@@ -273,6 +397,16 @@ class IssueDetailsDialog(QtWidgets.QDialog):
         close_button.clicked.connect(self.accept)
 
         button_layout.addWidget(web_button)
+        self.add_note_button = QtWidgets.QPushButton('Add note (Ctrl+Enter)')
+        self.add_note_button.clicked.connect(self.add_note)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Return"), self, self.add_note)
+        button_layout.addWidget(self.add_note_button)
+        if self.pins:
+            self.pin_button = QtWidgets.QPushButton()
+            self.pin_button.clicked.connect(self.toggle_pin)
+            QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+D"), self, self.toggle_pin)
+            self.update_pin_button()
+            button_layout.addWidget(self.pin_button)
         button_layout.addWidget(close_button)
 
         main_layout.addLayout(button_layout)
@@ -281,6 +415,83 @@ class IssueDetailsDialog(QtWidgets.QDialog):
 
         self.setLayout(main_layout)
 
+    def render_texts(self):
+        if self.issue is None:
+            return
+        texts = {('issue', self.issue['id'], self.issue['updated_on']): self.issue.get('description') or ''}
+        for journal in self.issue.get('journals', []):
+            if journal.get('notes'):
+                updated_on = journal.get('updated_on') or journal['created_on']
+                texts[('journal', journal['id'], updated_on)] = journal['notes']
+        items = [(key, text) for key, text in texts.items() if key in self.rendered_widgets]
+        render_in_background(items, self.text_formatting, self.redmine_url, self.show_rendered, owner=self)
+
+    def add_note(self):
+        notes = self.note_editor.toPlainText().strip()
+        uploads = self.note_editor.uploads()
+        if self.note_editor.busy():
+            QtWidgets.QMessageBox.warning(self, 'Uploads Running', "Wait for the attachments to finish uploading.")
+            return
+        if not notes and not uploads:
+            return
+        self.add_note_button.setEnabled(False)
+        run_in_background(self.save_note, notes, uploads, on_done=self.note_saved, on_error=self.note_failed,
+                          owner=self)
+
+    def save_note(self, notes, uploads):
+        fields = {'notes': notes}
+        if uploads:
+            fields['uploads'] = uploads
+        self.api.update_issue(self.issue_id, **fields)
+        return self.fetch_issue()
+
+    def note_saved(self, issue):
+        self.add_note_button.setEnabled(True)
+        self.note_editor.clear()
+        self.issue_fetched(issue)
+
+    def note_failed(self, error):
+        self.add_note_button.setEnabled(True)
+        QtWidgets.QMessageBox.warning(self, "Error", f"Failed to add the note: {error}")
+
+    def toggle_pin(self):
+        self.pins.toggle(self.record)
+        self.update_pin_button()
+
+    def update_pin_button(self):
+        self.pin_button.setText('Unpin (Ctrl+D)' if self.pins.is_pinned(self.issue_id) else 'Pin (Ctrl+D)')
+
+    def update_avatars(self):
+        for label, user_id in self.avatar_labels:
+            label.setPixmap(self.users.avatar(user_id, 24))
+            label.setToolTip(self.users.tooltip(user_id))
+
+    def done(self, result):
+        if _open_windows.get(self.issue_id) is self:
+            del _open_windows[self.issue_id]
+        self.note_editor.cancel_uploads()
+        self.relations_view.stop()
+        if self.users:
+            self.users.updated.disconnect(self.update_avatars)
+        # Log viewers are child windows, stop their workers before they go with us
+        for viewer in self.findChildren(LogViewerDialog):
+            viewer.close()
+        self.remove_temp_files()
+        super().done(result)
+
+    def show_rendered(self, key, html_text):
+        widget = self.rendered_widgets.get(key)
+        if widget is None:
+            return
+        try:
+            if isinstance(widget, QtWidgets.QLabel):
+                widget.setTextFormat(QtCore.Qt.RichText)
+                widget.setText(html_text)
+            else:
+                widget.setHtml(html_text)
+        except RuntimeError:
+            pass  # dialog was destroyed before rendering finished
+
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:
             self._drag_pos = event.globalPos() - self.frameGeometry().topLeft()
@@ -299,99 +510,61 @@ class IssueDetailsDialog(QtWidgets.QDialog):
             size_bytes /= 1024.0
         return f"{size_bytes:.1f} TB"
 
+    def preview_attachment(self, row):
+        attachments = self.issue['attachments']
+        if 0 <= row < len(attachments):
+            ahead = PreviewPane.PREFETCH
+            neighbours = attachments[row + 1:row + 1 + ahead] + attachments[max(0, row - ahead):row]
+            self.preview_pane.show_attachment(attachments[row], neighbours)
+
     def view_attachment(self, attachment):
-        # Download and open the attachment
+        # Images show in the preview pane, text and logs in the built-in viewer, however large they are
+        if preview_kind(attachment):
+            self.attachments_table.selectRow(self.issue['attachments'].index(attachment))
+            return
+        if is_text(attachment):
+            LogViewerDialog(self, attachment, self.attachment_cache, self.font_size).show()
+            return
+        # Downloaded (or reused from the cache) and copied to a temp file on a worker, then opened
+        suffix = os.path.splitext(attachment['filename'])[1]
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        temp_file.close()
+        self.temp_files.append(temp_file.name)  # Track for cleanup
+        run_in_background(self.attachment_cache.copy_to, attachment, temp_file.name,
+                          on_done=self.open_file,
+                          on_error=lambda e: QtWidgets.QMessageBox.warning(
+                              self, "Download Failed", f"Failed to download attachment: {e}"),
+                          owner=self)
+
+    def open_file(self, path):
+        # Open with default application
         try:
-            # Create a direct URL to the attachment
-            url = f"{self.redmine_url}/attachments/download/{attachment.id}/{attachment.filename}"
-
-            # Setup headers for API key authentication
-            headers = {}
-
-            # Add API key to headers if available
-            if self.api_key:
-                headers['X-Redmine-API-Key'] = self.api_key
-
-            # Download the attachment using requests with API key
-            response = requests.get(
-                url,
-                headers=headers,
-                stream=True,
-                verify=True  # Set to False if you have SSL certificate issues
-            )
-
-            if response.status_code == 200:
-                # Create temp file with correct extension
-                suffix = os.path.splitext(attachment.filename)[1]
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-                self.temp_files.append(temp_file.name)  # Track for cleanup
-
-                # Write content to temp file
-                for chunk in response.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-                temp_file.close()
-
-                # Open with default application
-                if os.name == 'nt':  # Windows
-                    os.startfile(temp_file.name)
-                elif os.name == 'posix':  # Linux/Mac
-                    subprocess.call(('xdg-open', temp_file.name))
-            else:
-                QtWidgets.QMessageBox.warning(
-                    self,
-                    "Download Failed",
-                    f"Failed to download attachment: HTTP {response.status_code}\n{response.text[:200]}"
-                )
+            if os.name == 'nt':  # Windows
+                os.startfile(path)
+            elif os.name == 'posix':  # Linux/Mac
+                subprocess.Popen(('xdg-open', path))
         except Exception as e:
             QtWidgets.QMessageBox.warning(self, "Error", f"Error viewing attachment: {str(e)}")
 
-    # Also update the save_attachment method similarly:
     def save_attachment(self, attachment):
-        try:
-            # Show save dialog
-            file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
-                self, "Save Attachment", attachment.filename, "All Files (*.*)"
-            )
-
-            if file_path:
-                # Create a direct URL to the attachment
-                url = f"{self.redmine_url}/attachments/download/{attachment.id}/{attachment.filename}"
-
-                # Setup headers for API key authentication
-                headers = {}
-
-                # Try to get API key from redmine object
-                if self.api_key:
-                    headers['X-Redmine-API-Key'] = self.api_key
-
-                # Download the attachment
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    stream=True,
-                    verify=True  # Set to False if you have SSL certificate issues
-                )
-
-                if response.status_code == 200:
-                    with open(file_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    QtWidgets.QMessageBox.information(self, "Success", "Attachment saved successfully!")
-                else:
-                    QtWidgets.QMessageBox.warning(
-                        self,
-                        "Download Failed",
-                        f"Failed to download attachment: HTTP {response.status_code}\n{response.text[:200]}"
-                    )
-        except Exception as e:
-            QtWidgets.QMessageBox.warning(self, "Error", f"Error saving attachment: {str(e)}")
-
-    def closeEvent(self, event):
-        # Clean up any temporary files
+        # Show save dialog
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Attachment", attachment['filename'], "All Files (*.*)"
+        )
+        if file_path:
+            run_in_background(self.attachment_cache.copy_to, attachment, file_path,
+                              on_done=lambda path: QtWidgets.QMessageBox.information(
+                                  self, "Success", "Attachment saved successfully!"),
+                              on_error=lambda e: QtWidgets.QMessageBox.warning(
+                                  self, "Error", f"Error saving attachment: {e}"),
+                              owner=self)
+
+    def remove_temp_files(self):
+        # Also on Esc and Ctrl+W, which never reach closeEvent
         for temp_file in self.temp_files:
             try:
                 if os.path.exists(temp_file):
                     os.unlink(temp_file)
             except:
                 pass
-        event.accept()
\ No newline at end of file
+        self.temp_files = []
\ No newline at end of file
@@ -0,0 +1,197 @@
+import re
+import mmap
+import bisect
+
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from attachment_cache import format_size
+from line_index import LineIndex, SearchState, index_lines, search_lines, file_size
+from workers import run_in_background
+
+MAX_LINE_LENGTH = 4000  # characters shown of a single line
+
+
+class LinesModel(QtCore.QAbstractListModel):
+    """Lines of a memory-mapped file, decoded only when the view asks for them"""
+
+    def __init__(self, path, index, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.line_index = index
+        self.file = None
+        self.mm = None
+        self.count = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def data(self, model_index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not model_index.isValid():
+            return None
+        return self.line(model_index.row())
+
+    def line(self, row):
+        start, end = self.line_index.offsets[row], self.line_index.offsets[row + 1]
+        end = min(end, start + MAX_LINE_LENGTH * 4)
+        text = self.mm[start:end].decode('utf-8', errors='replace').rstrip('\r\n')
+        return text[:MAX_LINE_LENGTH]
+
+    def grow(self):
+        """Show the lines indexed since the last call, remapping the grown file"""
+        count = self.line_index.line_count()
+        if count <= self.count:
+            return
+        end = self.line_index.offsets[count]
+        if self.mm is None or len(self.mm) < end:
+            self.close()
+            self.file = open(self.path, 'rb')
+            self.mm = mmap.mmap(self.file.fileno(), file_size(self.path), access=mmap.ACCESS_READ)
+        self.beginInsertRows(QtCore.QModelIndex(), self.count, count - 1)
+        self.count = count
+        self.endInsertRows()
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.file.close()
+            self.mm = self.file = None
+
+
+class LogViewerDialog(QtWidgets.QDialog):
+    """Viewer for large text attachments.
+
+    The cached file is memory-mapped and lines are decoded only as they
+    scroll into view. A worker builds the line index while the file is still
+    downloading, so the head shows up right away; searches stream their
+    matches into the list below as they are found.
+    """
+
+    def __init__(self, parent, attachment, cache, font_size=10):
+        super().__init__(parent, QtCore.Qt.Window)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.setWindowTitle(attachment['filename'])
+        self.resize(1000, 700)
+        self.cache = cache
+        self.path, self.download = cache.fetch(attachment)
+        self.line_index = LineIndex()
+        self.search = None
+        self.shown_matches = 0
+
+        layout = QtWidgets.QVBoxLayout(self)
+        search_layout = QtWidgets.QHBoxLayout()
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("Regular expression (Ctrl+F), Enter to search")
+        self.search_edit.returnPressed.connect(self.start_search)
+        self.case_check = QtWidgets.QCheckBox("Match case")
+        search_layout.addWidget(self.search_edit)
+        search_layout.addWidget(self.case_check)
+        layout.addLayout(search_layout)
+
+        font = QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+        font.setPointSize(font_size)
+        self.model = LinesModel(self.path, self.line_index, self)
+        # A table with fixed row heights never measures rows, a list view lays out all of them
+        self.lines_view = QtWidgets.QTableView()
+        self.lines_view.setFont(font)
+        self.lines_view.setModel(self.model)
+        self.lines_view.setShowGrid(False)
+        self.lines_view.setWordWrap(False)
+        self.lines_view.horizontalHeader().hide()
+        self.lines_view.horizontalHeader().setStretchLastSection(True)
+        self.lines_view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.lines_view.verticalHeader().setDefaultSectionSize(QtGui.QFontMetrics(font).height() + 2)
+        self.lines_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+
+        self.matches_list = QtWidgets.QListWidget()
+        self.matches_list.setFont(font)
+        self.matches_list.setUniformItemSizes(True)
+        self.matches_list.currentRowChanged.connect(self.go_to_match)
+        self.matches_list.hide()
+
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+        splitter.addWidget(self.lines_view)
+        splitter.addWidget(self.matches_list)
+        splitter.setSizes([500, 200])
+        layout.addWidget(splitter)
+
+        self.status_label = QtWidgets.QLabel()
+        layout.addWidget(self.status_label)
+
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+F"), self, self.search_edit.setFocus)
+
+        run_in_background(index_lines, self.path, self.line_index, self.download)
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.timeout.connect(self.poll)
+        self.poll_timer.start(200)
+        self.poll()
+
+    def start_search(self):
+        self.stop_search()
+        self.matches_list.clear()
+        self.shown_matches = 0
+        pattern = self.search_edit.text()
+        if not pattern:
+            self.matches_list.hide()
+            return
+        try:
+            self.search = SearchState(pattern, 0 if self.case_check.isChecked() else re.IGNORECASE)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, "Search", f"Invalid regular expression: {e}")
+            return
+        self.matches_list.show()
+        run_in_background(search_lines, self.path, self.line_index, self.search)
+        self.poll_timer.start()
+
+    def stop_search(self):
+        if self.search:
+            self.search.cancelled = True
+            self.search = None
+
+    def poll(self):
+        # Read before growing, so whatever the workers add after it still gets shown by a later poll
+        finished = self.line_index.finished and (self.search is None or self.search.finished)
+        self.model.grow()
+        lines = self.search.lines if self.search else []
+        # The search follows the index, which can be ahead of the mapped file; later lines wait for the next poll
+        shown = bisect.bisect_left(lines, self.model.count, self.shown_matches)
+        if shown > self.shown_matches:
+            new = lines[self.shown_matches:shown]
+            self.matches_list.addItems([f"{line + 1}: {self.model.line(line)}" for line in new])
+            self.shown_matches += len(new)
+        self.update_status()
+        if finished:
+            self.poll_timer.stop()
+
+    def update_status(self):
+        parts = []
+        if not self.download.done:
+            size = format_size(self.download.received)
+            parts.append(f"Downloading {size} of {format_size(self.download.total)}" if self.download.total
+                         else f"Downloading {size}")
+        elif self.download.error:
+            parts.append(f"Download failed: {self.download.error}")
+        parts.append(f"{self.model.count:,} lines" + ("" if self.line_index.finished else " so far"))
+        if self.search:
+            text = f"{len(self.search.lines):,} matching lines"
+            if self.search.truncated:
+                text += " (search stopped)"
+            elif not self.search.finished:
+                text += f", searching ({format_size(self.search.searched)})"
+            parts.append(text)
+        self.status_label.setText(" · ".join(parts))
+
+    def go_to_match(self, row):
+        if 0 <= row < self.shown_matches:
+            line = self.search.lines[row] if self.search else None
+            if line is not None and line < self.model.count:
+                model_index = self.model.index(line)
+                self.lines_view.scrollTo(model_index, QtWidgets.QAbstractItemView.PositionAtCenter)
+                self.lines_view.setCurrentIndex(model_index)
+
+    def done(self, result):
+        self.poll_timer.stop()
+        self.stop_search()
+        self.line_index.cancelled = True
+        self.cache.release(self.download)
+        self.model.close()
+        super().done(result)
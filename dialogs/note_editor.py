@@ -0,0 +1,165 @@
+import os
+import tempfile
+import datetime
+
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from attachment_cache import format_size
+from attachment_upload import UploadProgress, upload_file
+from workers import run_in_background
+
+
+class NoteTextEdit(QtWidgets.QTextEdit):
+    """Plain text note field that hands dropped files and pasted images to its owner"""
+    files_dropped = QtCore.pyqtSignal(list)
+    image_pasted = QtCore.pyqtSignal(QtGui.QImage)
+
+    @staticmethod
+    def local_files(source):
+        return [url.toLocalFile() for url in source.urls() if url.isLocalFile() and os.path.isfile(url.toLocalFile())]
+
+    def canInsertFromMimeData(self, source):
+        if source.hasImage() or (source.hasUrls() and self.local_files(source)):
+            return True
+        return super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        files = self.local_files(source) if source.hasUrls() else []
+        if files:
+            self.files_dropped.emit(files)
+        elif source.hasImage():
+            self.image_pasted.emit(QtGui.QImage(source.imageData()))
+        else:
+            self.insertPlainText(source.text())
+
+
+class NoteEditor(QtWidgets.QWidget):
+    """Note field with attachments: files dropped or images pasted into it upload right away.
+
+    Each file is streamed from disk to /uploads on a worker, so large logs
+    neither fill memory nor block the UI. uploads() returns the tokens to send
+    with the note; busy() tells whether some are still on their way.
+    """
+
+    def __init__(self, api, placeholder="Enter note here...", parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.entries = []  # one dict per attached file, in the order they were added
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.text_edit = NoteTextEdit()
+        self.text_edit.setPlaceholderText(f"{placeholder} Drop files or paste images to attach them.")
+        self.text_edit.files_dropped.connect(self.add_files)
+        self.text_edit.image_pasted.connect(self.add_image)
+        layout.addWidget(self.text_edit)
+        self.files_layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(self.files_layout)
+
+        # Workers only count bytes, the bars are updated from here
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(200)
+        self.progress_timer.timeout.connect(self.update_progress)
+
+    def toPlainText(self):
+        return self.text_edit.toPlainText()
+
+    def setFocus(self):
+        self.text_edit.setFocus()
+
+    def add_files(self, paths):
+        for path in paths:
+            self.start_upload(path, os.path.basename(path))
+
+    def add_image(self, image):
+        if image.isNull():
+            return
+        name = datetime.datetime.now().strftime('screenshot-%Y%m%d-%H%M%S.png')
+        fd, path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        if not image.save(path, 'PNG'):
+            os.unlink(path)
+            QtWidgets.QMessageBox.warning(self, 'Attach Failed', "Couldn't save the pasted image.")
+            return
+        self.start_upload(path, name, temporary=True)
+
+    def start_upload(self, path, filename, temporary=False):
+        entry = {'filename': filename, 'result': None, 'error': None,
+                 'progress': UploadProgress(os.path.getsize(path))}
+
+        row = QtWidgets.QWidget()
+        row_layout = QtWidgets.QHBoxLayout(row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        label = QtWidgets.QLabel(filename)
+        label.setToolTip(path if not temporary else 'Pasted image')
+        bar = QtWidgets.QProgressBar()
+        bar.setRange(0, 1000)
+        bar.setFormat(f"%p% of {format_size(entry['progress'].total)}")
+        bar.setMaximumHeight(16)
+        remove_button = QtWidgets.QPushButton('Cancel')
+        remove_button.clicked.connect(lambda: self.remove(entry))
+        row_layout.addWidget(label, 1)
+        row_layout.addWidget(bar, 2)
+        row_layout.addWidget(remove_button)
+        self.files_layout.addWidget(row)
+        entry.update(row=row, bar=bar, button=remove_button)
+        self.entries.append(entry)
+
+        entry['worker'] = run_in_background(upload_file, self.api, path, entry['progress'], filename, temporary,
+                                            on_done=lambda result: self.upload_done(entry, result),
+                                            on_error=lambda error: self.upload_failed(entry, error),
+                                            owner=self)
+        self.progress_timer.start()
+
+    def upload_done(self, entry, result):
+        entry['result'] = result
+        entry['bar'].setValue(1000)
+        entry['bar'].setFormat(f"Attached, {format_size(entry['progress'].total)}")
+        entry['button'].setText('Remove')
+        self.finish(entry)
+
+    def upload_failed(self, entry, error):
+        print(f"Failed to upload {entry['filename']}: {error}")
+        entry['error'] = error
+        entry['bar'].setFormat('Failed')
+        entry['bar'].setToolTip(error)
+        entry['button'].setText('Remove')
+        self.finish(entry)
+
+    def finish(self, entry):
+        entry['worker'] = None
+        if not self.busy():
+            self.progress_timer.stop()
+
+    def update_progress(self):
+        for entry in self.entries:
+            if entry['worker'] is not None:
+                progress = entry['progress']
+                entry['bar'].setValue(int(1000 * progress.sent / progress.total) if progress.total else 0)
+
+    def remove(self, entry):
+        # The server forgets tokens that are never attached, nothing to delete there
+        if entry['worker'] is not None:
+            entry['progress'].cancelled = True
+            entry['worker'].cancel()
+            self.finish(entry)
+        self.entries.remove(entry)
+        entry['row'].deleteLater()
+
+    def busy(self):
+        return any(entry['worker'] is not None for entry in self.entries)
+
+    def uploads(self):
+        """Tokens of the finished uploads, as the "uploads" field of an issue update"""
+        return [entry['result'] for entry in self.entries if entry['result']]
+
+    def clear(self):
+        self.text_edit.clear()
+        for entry in list(self.entries):
+            self.remove(entry)
+
+    def cancel_uploads(self):
+        for entry in list(self.entries):
+            if entry['worker'] is not None:
+                self.remove(entry)
+
@@ -0,0 +1,91 @@
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from attachment_preview import preview_kind, cached_preview, load_preview
+from workers import run_in_background
+
+
+class PreviewPane(QtWidgets.QWidget):
+    """Preview of the selected image (or PDF) attachment next to the attachments table.
+
+    Downloading and decoding run on workers and the downscaled images are
+    cached, so flipping through screenshots only costs a scale to the pane
+    size. The neighbours of the shown attachment are prepared ahead.
+    """
+    PREFETCH = 2  # attachments on each side decoded ahead
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.attachment = None
+        self.image = None
+        self.loading = set()  # attachment ids being decoded
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.image_label = QtWidgets.QLabel("Select an image to preview it.")
+        self.image_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.image_label.setMinimumSize(200, 150)
+        self.image_label.setSizePolicy(QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored)
+        self.caption_label = QtWidgets.QLabel()
+        self.caption_label.setAlignment(QtCore.Qt.AlignCenter)
+        layout.addWidget(self.image_label, 1)
+        layout.addWidget(self.caption_label)
+
+    def show_attachment(self, attachment, neighbours=()):
+        self.attachment = attachment
+        self.image = None
+        kind = preview_kind(attachment)
+        if kind is None:
+            self.image_label.setPixmap(QtGui.QPixmap())
+            self.image_label.setText("No preview for this file, use View to open it.")
+            self.caption_label.setText(attachment['filename'])
+        else:
+            image = cached_preview(attachment['id'])
+            if image is not None:
+                self.set_image(image)
+            else:
+                self.image_label.setPixmap(QtGui.QPixmap())
+                self.image_label.setText("Loading preview...")
+                self.caption_label.setText(attachment['filename'])
+                self.load(attachment, kind)
+        for neighbour in neighbours:
+            neighbour_kind = preview_kind(neighbour)
+            if neighbour_kind and cached_preview(neighbour['id']) is None:
+                self.load(neighbour, neighbour_kind)
+
+    def load(self, attachment, kind):
+        if attachment['id'] in self.loading:
+            return
+        self.loading.add(attachment['id'])
+        run_in_background(load_preview, self.cache, attachment, kind, on_done=self.loaded,
+                          on_error=lambda e, a=attachment: self.load_failed(a, e), owner=self)
+
+    def loaded(self, result):
+        attachment_id, image = result
+        self.loading.discard(attachment_id)
+        if self.attachment and self.attachment['id'] == attachment_id:
+            self.set_image(image)
+
+    def load_failed(self, attachment, error):
+        self.loading.discard(attachment['id'])
+        print(f"Failed to preview {attachment['filename']}: {error}")
+        if self.attachment and self.attachment['id'] == attachment['id']:
+            self.image_label.setText(f"Couldn't preview this file: {error}")
+
+    def set_image(self, image):
+        self.image = image
+        self.caption_label.setText(self.attachment['filename'])
+        self.update_pixmap()
+
+    def update_pixmap(self):
+        if self.image is None:
+            return
+        size = self.image_label.size()
+        image = self.image
+        if image.width() > size.width() or image.height() > size.height():
+            image = image.scaled(size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.image_label.setPixmap(QtGui.QPixmap.fromImage(image))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_pixmap()
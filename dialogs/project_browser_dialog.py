@@ -0,0 +1,269 @@
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from redmine_api import RedmineApi
+from workers import run_in_background
+
+# (label, sort key, filter used for the keyset condition)
+SORT_ORDERS = [
+    ('Last updated', 'updated_on', 'updated_on'),
+    ('Newest first', 'id', 'issue_id'),
+]
+
+
+def fetch_issue_page(redmine, filters, sort_key, filter_name, cursor, page_size):
+    """Fetch one page after the given cursor.
+
+    The cursor is (boundary value, rows to skip): the next page holds rows with
+    key <= boundary, minus the ones at exactly the boundary we have already
+    seen. Unlike a plain offset this stays cheap and stable deep into the list.
+    """
+    sort = f'{sort_key}:desc' if sort_key == 'id' else f'{sort_key}:desc,id:desc'
+    params = dict(filters, sort=sort)
+    offset = 0
+    if cursor:
+        boundary, offset = cursor
+        params[filter_name] = f'<={boundary}'
+    return RedmineApi(redmine).issue_page(offset, page_size, **params)
+
+
+class IssueBrowserModel(QtCore.QAbstractTableModel):
+    """Issue table loaded page by page as the view scrolls.
+
+    Only MAX_PAGES pages are kept in memory; rows of evicted pages show as
+    loading and are fetched again from their saved cursor when scrolled back to.
+    """
+    PAGE_SIZE = 100
+    MAX_PAGES = 10
+    COLUMNS = ['ID', 'Subject', 'Status', 'Priority', 'Updated']
+
+    load_failed = QtCore.pyqtSignal(str)
+    page_arrived = QtCore.pyqtSignal()
+
+    def __init__(self, redmine, store=None, parent=None):
+        super().__init__(parent)
+        self.redmine = redmine
+        self.store = store
+        self.filters = None
+        self.reset_pages()
+
+    def reset_pages(self):
+        self.pages = {}  # page number -> list of IssueRecord
+        self.cursors = [None]  # cursors[n] fetches page n
+        self.row_count = 0
+        self.total_count = None
+        self.exhausted = False
+        self.loading = set()
+        self.recent_page = 0
+        self.generation = getattr(self, 'generation', 0) + 1
+
+    def set_query(self, filters, sort_key, filter_name):
+        self.beginResetModel()
+        self.filters = filters
+        self.sort_key = sort_key
+        self.filter_name = filter_name
+        self.reset_pages()
+        self.endResetModel()
+        self.fetchMore(QtCore.QModelIndex())
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.row_count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def record(self, row):
+        page, offset = divmod(row, self.PAGE_SIZE)
+        records = self.pages.get(page)
+        if records is None:
+            return None
+        return records[offset] if offset < len(records) else None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        page = index.row() // self.PAGE_SIZE
+        self.recent_page = page
+        record = self.record(index.row())
+        if record is None:
+            self.load_page(page)
+            return 'Loading...' if index.column() == 1 else ''
+        return [str(record.id), record.subject, record.status_name, record.priority_name,
+                record.updated_on][index.column()]
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.filters is None or self.exhausted:
+            return False
+        # The last known cursor points at a page whose rows are not in the model yet
+        return self.row_count == (len(self.cursors) - 1) * self.PAGE_SIZE
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        self.load_page(len(self.cursors) - 1)
+
+    def load_page(self, page):
+        if page in self.loading or page >= len(self.cursors):
+            return
+        self.loading.add(page)
+        generation = self.generation
+        run_in_background(fetch_issue_page, self.redmine, self.filters, self.sort_key, self.filter_name,
+                          self.cursors[page], self.PAGE_SIZE,
+                          on_done=lambda result: self.page_loaded(generation, page, result),
+                          on_error=lambda e: self.page_failed(generation, page, e), owner=self)
+
+    def page_failed(self, generation, page, error):
+        if generation == self.generation:
+            self.loading.discard(page)
+            self.load_failed.emit(error)
+
+    def page_loaded(self, generation, page, result):
+        if generation != self.generation:
+            return  # query changed while this page was loading
+        records, total_count = result
+        self.loading.discard(page)
+        if page == 0:
+            self.total_count = total_count  # later pages only count what is left after their cursor
+        self.pages[page] = records
+        if self.store and records:
+            self.store.upsert_issues(records)
+
+        first_row = page * self.PAGE_SIZE
+        if first_row == self.row_count:
+            # Newly discovered page, remember where the following one starts
+            if len(records) == self.PAGE_SIZE:
+                self.cursors.append(self.next_cursor(page, records))
+            else:
+                self.exhausted = True
+            if records:
+                self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(records) - 1)
+                self.row_count = first_row + len(records)
+                self.endInsertRows()
+        elif records:
+            self.dataChanged.emit(self.index(first_row, 0),
+                                  self.index(first_row + len(records) - 1, len(self.COLUMNS) - 1))
+        self.evict_pages()
+        self.page_arrived.emit()
+
+    def next_cursor(self, page, records):
+        boundary = getattr(records[-1], self.sort_key)
+        tail = sum(1 for r in records if getattr(r, self.sort_key) == boundary)
+        previous = self.cursors[page]
+        if previous and previous[0] == boundary:
+            # The whole page shares the boundary value, keep skipping past it
+            tail += previous[1]
+        return boundary, tail
+
+    def evict_pages(self):
+        while len(self.pages) > self.MAX_PAGES:
+            farthest = max(self.pages, key=lambda p: abs(p - self.recent_page))
+            del self.pages[farthest]
+
+
+class ProjectBrowserDialog(QtWidgets.QDialog):
+    def __init__(self, parent, redmine, font_size, store=None):
+        super().__init__(parent)
+        self.redmine = redmine
+        self.selected_issue = None
+
+        self.setWindowTitle('Browse Project Issues')
+        self.resize(1080, 600)
+        layout = QtWidgets.QVBoxLayout()
+
+        filter_layout = QtWidgets.QHBoxLayout()
+        filter_layout.addWidget(QtWidgets.QLabel('Project (Alt+P):'))
+        self.project_combo = QtWidgets.QComboBox()
+        self.project_combo.setMinimumWidth(300)
+        filter_layout.addWidget(self.project_combo)
+
+        filter_layout.addWidget(QtWidgets.QLabel('Status:'))
+        self.status_combo = QtWidgets.QComboBox()
+        self.status_combo.addItem('Open', 'open')
+        self.status_combo.addItem('All', '*')
+        filter_layout.addWidget(self.status_combo)
+
+        filter_layout.addWidget(QtWidgets.QLabel('Sort:'))
+        self.sort_combo = QtWidgets.QComboBox()
+        for label, sort_key, filter_name in SORT_ORDERS:
+            self.sort_combo.addItem(label, (sort_key, filter_name))
+        filter_layout.addWidget(self.sort_combo)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        self.model = IssueBrowserModel(redmine, store, self)
+        self.model.load_failed.connect(lambda e: self.status_label.setText(f'Failed to load issues: {e}'))
+        self.model.page_arrived.connect(self.update_status)
+        self.model.modelReset.connect(self.update_status)
+
+        self.issues_view = QtWidgets.QTableView()
+        self.issues_view.setModel(self.model)
+        self.issues_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.issues_view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.issues_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.issues_view.verticalHeader().setVisible(False)
+        self.issues_view.setFont(QtGui.QFont('', font_size))
+        self.issues_view.setColumnWidth(0, 60)
+        self.issues_view.setColumnWidth(1, 600)
+        self.issues_view.doubleClicked.connect(lambda index: self.select_issue())
+        layout.addWidget(self.issues_view)
+
+        self.status_label = QtWidgets.QLabel('Loading projects...')
+        layout.addWidget(self.status_label)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        select_button = QtWidgets.QPushButton('Select as current (Ctrl+S)')
+        select_button.setShortcut('Ctrl+S')
+        select_button.clicked.connect(self.select_issue)
+        button_layout.addWidget(select_button)
+
+        cancel_button = QtWidgets.QPushButton('Cancel (Esc)')
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+        QtWidgets.QShortcut(QtGui.QKeySequence("Alt+P"), self, self.project_combo.setFocus)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Return"), self.issues_view, self.select_issue)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Escape"), self, self.reject)
+
+        self.setLayout(layout)
+
+        run_in_background(lambda: [(p.id, p.name) for p in redmine.project.all()],
+                          on_done=self.set_projects,
+                          on_error=lambda e: self.status_label.setText(f'Failed to load projects: {e}'),
+                          owner=self)
+
+    def set_projects(self, projects):
+        for project_id, name in projects:
+            self.project_combo.addItem(name, project_id)
+        self.project_combo.currentIndexChanged.connect(self.run_query)
+        self.status_combo.currentIndexChanged.connect(self.run_query)
+        self.sort_combo.currentIndexChanged.connect(self.run_query)
+        if projects:
+            self.run_query()
+        else:
+            self.status_label.setText('No projects available')
+
+    def run_query(self):
+        filters = {'project_id': self.project_combo.currentData(), 'status_id': self.status_combo.currentData()}
+        sort_key, filter_name = self.sort_combo.currentData()
+        self.model.set_query(filters, sort_key, filter_name)
+
+    def update_status(self):
+        if self.model.total_count is None:
+            self.status_label.setText('Loading issues...')
+        else:
+            text = f'{self.model.row_count} of {self.model.total_count} issues loaded'
+            if not self.model.exhausted:
+                text += ', scroll to load more'
+            self.status_label.setText(text)
+
+    def select_issue(self):
+        selected = self.issues_view.selectionModel().selectedRows()
+        record = self.model.record(selected[0].row()) if selected else None
+        if record:
+            self.selected_issue = record
+            self.accept()
+        else:
+            QtWidgets.QMessageBox.warning(self, 'No selection', 'Please select an issue.')
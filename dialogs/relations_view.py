@@ -0,0 +1,107 @@
+import time
+import webbrowser
+
+from PyQt5 import QtWidgets, QtCore
+
+from issue_graph import RelationGraph, walk_relations
+from workers import run_in_background
+
+
+class RelationsView(QtWidgets.QWidget):
+    """Parent, subtasks and related issues of an issue, and theirs, down to a chosen depth.
+
+    The graph is walked on a worker and the tree grows as levels arrive;
+    every issue shows once, under the first issue it was reached from.
+    Double-click opens an issue in the browser.
+    """
+    DEFAULT_DEPTH = 2
+    COLUMNS = ['Issue', 'Relation', 'Status', 'Tracker']
+
+    def __init__(self, api, store, issue_id, redmine_url, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.store = store
+        self.issue_id = issue_id
+        self.redmine_url = redmine_url
+        self.graph = None
+        self.items = {}  # issue id -> tree item
+        self.shown_events = 0
+        self.started_at = 0
+
+        layout = QtWidgets.QVBoxLayout(self)
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(QtWidgets.QLabel('Depth:'))
+        self.depth_spin = QtWidgets.QSpinBox()
+        self.depth_spin.setRange(1, 6)
+        self.depth_spin.setValue(self.DEFAULT_DEPTH)
+        self.depth_spin.valueChanged.connect(self.start)
+        controls.addWidget(self.depth_spin)
+        self.status_label = QtWidgets.QLabel()
+        controls.addWidget(self.status_label, 1)
+        layout.addLayout(controls)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setUniformRowHeights(True)
+        self.tree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.tree.header().setStretchLastSection(False)
+        self.tree.itemActivated.connect(
+            lambda item: webbrowser.open(f"{self.redmine_url}/issues/{item.data(0, QtCore.Qt.UserRole)}"))
+        layout.addWidget(self.tree)
+
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Walked the first time the tab is opened, most issues are looked at without it
+        if self.graph is None:
+            self.start()
+
+    def start(self):
+        self.stop()
+        self.tree.clear()
+        self.items = {}
+        self.shown_events = 0
+        self.started_at = time.monotonic()
+        self.graph = RelationGraph(self.issue_id, self.depth_spin.value())
+        run_in_background(walk_relations, self.api, self.store, self.graph,
+                          on_error=lambda e: print(f"Failed to walk the relations of #{self.issue_id}: {e}"),
+                          owner=self)
+        self.poll_timer.start(100)
+
+    def stop(self):
+        self.poll_timer.stop()
+        if self.graph:
+            self.graph.cancelled = True
+
+    def poll(self):
+        graph = self.graph
+        finished = graph.finished  # read before the events, so none appended before it is missed
+        events = graph.events[self.shown_events:]
+        self.shown_events += len(events)
+        for node, via, relation, depth in events:
+            item = QtWidgets.QTreeWidgetItem([f"#{node['id']} {node['subject']}", relation or '',
+                                              node['status'], node['tracker']])
+            item.setData(0, QtCore.Qt.UserRole, node['id'])
+            parent = self.items.get(via)
+            if parent is None:
+                self.tree.addTopLevelItem(item)
+            else:
+                parent.addChild(item)
+            item.setExpanded(depth == 0)
+            self.items[node['id']] = item
+        if finished:
+            self.poll_timer.stop()
+        self.update_status(finished)
+
+    def update_status(self, finished):
+        graph = self.graph
+        text = f"{len(self.items)} issues · {graph.requests} requests · {graph.cached} from the cache"
+        if graph.error:
+            text += f" · failed: {graph.error}"
+        elif finished:
+            text += f" · {time.monotonic() - self.started_at:.1f} s"
+        else:
+            text += " · loading..."
+        self.status_label.setText(text)
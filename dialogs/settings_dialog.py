@@ -1,6 +1,8 @@
 from PyQt5 import QtWidgets, QtGui
 import keyboard
 
+from text_render import TEXT_FORMATTINGS
+
 class SettingsDialog(QtWidgets.QDialog):
     def __init__(self, parent):
         super().__init__(parent)
@@ -9,6 +11,8 @@ class SettingsDialog(QtWidgets.QDialog):
 
         self.font_size = parent.font_size
         self.hotkey = parent.hotkey
+        self.timer_hotkey = parent.timer_hotkey
+        self.text_formatting = parent.text_formatting
 
         layout = QtWidgets.QVBoxLayout()
 
@@ -33,6 +37,27 @@ class SettingsDialog(QtWidgets.QDialog):
 
         layout.addLayout(hotkey_layout)
 
+        # Timer hotkey input
+        timer_hotkey_layout = QtWidgets.QHBoxLayout()
+        timer_hotkey_layout.addWidget(QtWidgets.QLabel('Timer hotkey:'))
+
+        self.timer_hotkey_edit = QtWidgets.QLineEdit(self.timer_hotkey)
+        timer_hotkey_layout.addWidget(self.timer_hotkey_edit)
+
+        layout.addLayout(timer_hotkey_layout)
+
+        # Text formatting, should match the Redmine server setting
+        formatting_layout = QtWidgets.QHBoxLayout()
+        formatting_layout.addWidget(QtWidgets.QLabel('Text formatting:'))
+
+        self.formatting_combo = QtWidgets.QComboBox()
+        self.formatting_combo.addItems(TEXT_FORMATTINGS)
+        if self.text_formatting in TEXT_FORMATTINGS:
+            self.formatting_combo.setCurrentText(self.text_formatting)
+        formatting_layout.addWidget(self.formatting_combo)
+
+        layout.addLayout(formatting_layout)
+
         # Test hotkey
         test_button = QtWidgets.QPushButton('Test Hotkey (Alt+T)')
         test_button.setShortcut('Alt+T')
@@ -77,4 +102,6 @@ class SettingsDialog(QtWidgets.QDialog):
     def accepted(self):
         self.font_size = self.font_spin.value()
         self.hotkey = self.hotkey_edit.text()
+        self.timer_hotkey = self.timer_hotkey_edit.text()
+        self.text_formatting = self.formatting_combo.currentText()
         self.accept()
\ No newline at end of file
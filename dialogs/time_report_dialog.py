@@ -0,0 +1,127 @@
+from PyQt5 import QtWidgets, QtCore
+
+from time_report import GROUPINGS
+from workers import run_in_background
+
+
+class TimeReportDialog(QtWidgets.QDialog):
+    """Spent vs estimated hours grouped by project, tracker, week, status, user or activity.
+
+    The report is computed from the local TimeEntryStore, so changing the
+    period or the grouping answers at once; fetching new entries runs in the
+    background and refreshes the table when it is done.
+    """
+    COLUMNS = ['', 'Spent (h)', 'Estimated (h)', 'Entries']
+
+    def __init__(self, parent, api, store, user_id=None, font_size=10):
+        super().__init__(parent)
+        self.setWindowTitle('Time report')
+        self.resize(700, 520)
+        self.api = api
+        self.store = store
+        self.user_id = user_id
+        self.fetching = False
+
+        layout = QtWidgets.QVBoxLayout(self)
+        controls = QtWidgets.QHBoxLayout()
+        today = QtCore.QDate.currentDate()
+        self.start_edit = QtWidgets.QDateEdit(QtCore.QDate(today.year(), 1, 1))
+        self.end_edit = QtWidgets.QDateEdit(today)
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat('yyyy-MM-dd')
+            edit.dateChanged.connect(self.recompute)
+        controls.addWidget(QtWidgets.QLabel('From:'))
+        controls.addWidget(self.start_edit)
+        controls.addWidget(QtWidgets.QLabel('to:'))
+        controls.addWidget(self.end_edit)
+        controls.addWidget(QtWidgets.QLabel('Group by:'))
+        self.group_combo = QtWidgets.QComboBox()
+        self.group_combo.addItems([grouping.capitalize() for grouping in GROUPINGS])
+        self.group_combo.currentIndexChanged.connect(self.recompute)
+        controls.addWidget(self.group_combo)
+        self.mine_check = QtWidgets.QCheckBox('Only my time')
+        self.mine_check.setEnabled(user_id is not None)
+        self.mine_check.setChecked(user_id is not None)
+        self.mine_check.toggled.connect(self.recompute)
+        self.mine_check.setVisible(store.users != ['me'])  # only a team's time has someone else's in it
+        controls.addWidget(self.mine_check)
+        controls.addStretch()
+        self.fetch_button = QtWidgets.QPushButton('Fetch (F5)')
+        self.fetch_button.setShortcut('F5')
+        self.fetch_button.setToolTip('Download the entries added or changed since the last fetch, Shift for all of them')
+        self.fetch_button.clicked.connect(self.fetch)
+        controls.addWidget(self.fetch_button)
+        layout.addLayout(controls)
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        font = self.table.font()
+        font.setPointSize(font_size)
+        self.table.setFont(font)
+        layout.addWidget(self.table)
+
+        self.status_label = QtWidgets.QLabel()
+        layout.addWidget(self.status_label)
+
+        self.recompute()
+        self.fetch()
+
+    def period(self):
+        return self.start_edit.date().toString('yyyy-MM-dd'), self.end_edit.date().toString('yyyy-MM-dd')
+
+    def recompute(self):
+        start, end = self.period()
+        by = GROUPINGS[self.group_combo.currentIndex()]
+        user_id = self.user_id if self.mine_check.isChecked() else None
+        rows, elapsed = self.store.aggregate(by, start, end, user_id)
+        self.table.setHorizontalHeaderLabels([by.capitalize()] + self.COLUMNS[1:])
+        total = ('Total', sum(r[1] for r in rows), sum(r[2] for r in rows), sum(r[3] for r in rows))
+        self.table.setRowCount(len(rows) + 1)
+        for row, values in enumerate(rows + [total]):
+            for column, value in enumerate(values):
+                text = f'{value:,.2f}' if isinstance(value, float) else f'{value:,}' if column else value
+                item = QtWidgets.QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.update_status(f'computed in {elapsed * 1000:.1f} ms')
+
+    def update_status(self, text):
+        parts = [f'{self.store.entry_count():,} entries stored']
+        covered = self.store.covered
+        start, end = self.period()
+        if covered is None or start < covered[0] or end > covered[1]:
+            parts.append('period not fully fetched')
+        if self.fetching:
+            parts.append('fetching new entries...')
+        elif self.store.synced_on:
+            parts.append(f'last fetched {self.store.synced_on}')
+        if text:
+            parts.append(text)
+        self.status_label.setText(' · '.join(parts))
+
+    def fetch(self):
+        if self.fetching:
+            return
+        full = bool(QtWidgets.QApplication.keyboardModifiers() & QtCore.Qt.ShiftModifier)
+        self.fetching = True
+        self.fetch_button.setEnabled(False)
+        start, end = self.period()
+        run_in_background(self.store.sync, self.api, start, end, full, on_done=self.fetched,
+                          on_error=self.fetch_failed, owner=self)
+        self.update_status('')
+
+    def fetched(self, count):
+        self.fetching = False
+        self.fetch_button.setEnabled(True)
+        print(f"Fetched {count} time entries")
+        self.recompute()
+
+    def fetch_failed(self, error):
+        self.fetching = False
+        self.fetch_button.setEnabled(True)
+        self.update_status(f'fetch failed: {error}')
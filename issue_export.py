@@ -0,0 +1,149 @@
+"""Export issue lists to CSV, JSON or NDJSON, streamed page by page.
+
+    python issue_export.py --query mine --format csv -o my_issues.csv
+    python issue_export.py --query 42 --project 7 --format ndjson -o report.ndjson --journals
+    python issue_export.py --filter tracker_id=1 --filter status_id=* --format json -o bugs.json
+
+Reads url and api_key from config.cfg like the app. Memory stays constant
+however many issues match: every page is written out before the next one
+is requested.
+"""
+import os
+import csv
+import sys
+import json
+import argparse
+import configparser
+
+from redmine_api import RedmineApi
+
+FORMATS = ['csv', 'json', 'ndjson']
+CSV_COLUMNS = ['id', 'project', 'tracker', 'status', 'priority', 'subject', 'author', 'assigned_to',
+               'fixed_version', 'start_date', 'due_date', 'done_ratio', 'estimated_hours', 'created_on',
+               'updated_on', 'closed_on', 'custom_fields', 'description']
+
+
+class ExportProgress:
+    """Shared between the exporting worker and the GUI that polls it"""
+
+    def __init__(self):
+        self.written = 0
+        self.cancelled = False
+
+
+def csv_row(issue):
+    row = []
+    for column in CSV_COLUMNS:
+        value = issue.get(column, '')
+        if column == 'custom_fields':
+            value = '; '.join(f"{cf.get('name')}={cf.get('value') if cf.get('value') is not None else ''}"
+                              for cf in value or [])
+        elif isinstance(value, dict):
+            value = value.get('name', value.get('id', ''))
+        row.append('' if value is None else value)
+    if 'journals' in issue:
+        row.append('\n---\n'.join(f"{j.get('user', {}).get('name', '')} {j.get('created_on', '')}: {j['notes']}"
+                                  for j in issue['journals'] if j.get('notes')))
+    return row
+
+
+def with_journals(api, issues, store=None):
+    """Add journals to every issue; stored details are reused when they are current"""
+    for issue in issues:
+        details = store.get_details(issue['id']) if store else None
+        if details is None or details.get('updated_on') != issue.get('updated_on'):
+            details = api.get_uncached(f"/issues/{issue['id']}.json", include='journals')['issue']
+        issue['journals'] = details.get('journals', [])
+        yield issue
+
+
+def export_issues(api, filters, path, fmt, journals=False, store=None, progress=None):
+    """Write every issue matching the filters to path, return the number written.
+
+    Writes to a temporary file first, so a cancelled or failed export never
+    leaves a truncated file behind.
+    """
+    progress = progress or ExportProgress()
+    issues = api.iter_issues(**filters)
+    if journals:
+        issues = with_journals(api, issues, store)
+    tmp_path = path + '.part'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(CSV_COLUMNS + (['notes'] if journals else []))
+            elif fmt == 'json':
+                f.write('{"issues": [\n')
+            for issue in issues:
+                if progress.cancelled:
+                    break
+                if fmt == 'csv':
+                    writer.writerow(csv_row(issue))
+                elif fmt == 'json':
+                    f.write((',\n' if progress.written else '') + json.dumps(issue, ensure_ascii=False))
+                else:
+                    f.write(json.dumps(issue, ensure_ascii=False) + '\n')
+                progress.written += 1
+            if fmt == 'json':
+                f.write(f'\n], "total_count": {progress.written}}}\n')
+        if progress.cancelled:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return progress.written
+
+
+def query_filters(query, project=None, extra=()):
+    """Filters for "mine", a saved query id or nothing, plus key=value pairs"""
+    if query == 'mine':
+        filters = {'assigned_to_id': 'me', 'status_id': 'open'}
+    elif query:
+        filters = {'query_id': query}
+    else:
+        filters = {}
+    if project:
+        filters['project_id'] = project
+    for pair in extra:
+        key, _, value = pair.partition('=')
+        filters[key] = value
+    return filters
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--query', help='"mine" or a saved query id (default: all issues the filters match)')
+    parser.add_argument('--project', help='project id or identifier')
+    parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE',
+                        help='any /issues.json filter, may be repeated')
+    parser.add_argument('--format', choices=FORMATS, help='default: from the output file extension')
+    parser.add_argument('--journals', action='store_true', help='include notes (one extra request per issue)')
+    parser.add_argument('--config', default='config.cfg')
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        parser.error(f"can't tell the format from {args.output!r}, use --format")
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    if 'Redmine' not in config or not config['Redmine'].get('api_key'):
+        print(f"No Redmine url and api_key in {args.config}")
+        return 1
+
+    # Imported here so --help answers without loading the HTTP stack
+    from redminelib import Redmine
+    from request_cache import CachingEngine
+    redmine = Redmine(config['Redmine']['url'], key=config['Redmine']['api_key'], engine=CachingEngine)
+    count = export_issues(RedmineApi(redmine), query_filters(args.query, args.project, args.filter),
+                          args.output, fmt, args.journals)
+    print(f"Exported {count} issues to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+MAX_CONCURRENT = 4  # requests in flight per walk, the rate limiter caps the whole app anyway
+CHUNK = 100  # issue ids per list request, Redmine's largest page
+NODE_TTL = 300  # seconds a stored node or list of subtasks is used without asking the server
+
+# Stored relation type -> (label seen from issue_id, label seen from issue_to_id)
+RELATION_LABELS = {
+    'relates': ('related to', 'related to'),
+    'duplicates': ('duplicates', 'duplicated by'),
+    'blocks': ('blocks', 'blocked by'),
+    'precedes': ('precedes', 'follows'),
+    'copied_to': ('copied to', 'copied from'),
+}
+
+
+def issue_node(issue):
+    """The fields of an issue the relations tab shows, with its links seen from this issue"""
+    relations = []
+    for relation in issue.get('relations', []):
+        outgoing, incoming = RELATION_LABELS.get(relation['relation_type'], (relation['relation_type'],) * 2)
+        if relation['issue_id'] == issue['id']:
+            relations.append((relation['issue_to_id'], outgoing))
+        else:
+            relations.append((relation['issue_id'], incoming))
+    return {'id': issue['id'], 'subject': issue.get('subject', ''),
+            'tracker': (issue.get('tracker') or {}).get('name', ''),
+            'status': (issue.get('status') or {}).get('name', ''),
+            'parent_id': (issue.get('parent') or {}).get('id'), 'relations': relations}
+
+
+class RelationGraph:
+    """Issues reached from a root issue, filled in by walk_relations on a worker.
+
+    Every node is reported once in `events` as (node, id it was reached
+    from, relation, depth), in breadth-first order, so the GUI can show the
+    new tail whenever it polls.
+    """
+
+    def __init__(self, root_id, max_depth):
+        self.root_id = root_id
+        self.max_depth = max_depth
+        self.events = []
+        self.requests = 0
+        self.cached = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class _Walk:
+    """Loads nodes and subtasks for one walk, from the store while fresh, else in batched requests"""
+
+    def __init__(self, api, store, graph, pool, pages):
+        self.api = api
+        self.store = store
+        self.graph = graph
+        self.pool = pool
+        # Further pages wait in their own pool: a task of `pool` waiting for a page queued behind it would deadlock
+        self.pages = pages
+
+    def list_issues(self, **filters):
+        """Every issue matching the filters, further pages requested in parallel once the count is known"""
+        params = dict(filters, status_id='*', include='relations', limit=CHUNK)
+        self.graph.requests += 1
+        first = self.api.get('/issues.json', offset=0, **params)
+        issues = first.get('issues', [])
+        offsets = range(CHUNK, first.get('total_count', 0), CHUNK)
+        futures = [self.pages.submit(self.api.get, '/issues.json', offset=offset, **params) for offset in offsets]
+        self.graph.requests += len(futures)
+        for future in futures:
+            issues.extend(future.result().get('issues', []))
+        return [issue_node(issue) for issue in issues]
+
+    def submit_nodes(self, ids):
+        """Futures of {id: node} for the given ids"""
+        since = time.time() - NODE_TTL
+        stored = self.store.load_nodes(ids, since) if self.store else {}
+        self.graph.cached += len(stored)
+        futures = [_done(stored)] if stored else []
+        missing = [i for i in ids if i not in stored]
+        for start in range(0, len(missing), CHUNK):
+            chunk = missing[start:start + CHUNK]
+            futures.append(self.pool.submit(self.fetch_nodes, chunk))
+        return futures
+
+    def fetch_nodes(self, ids):
+        if self.graph.cancelled:
+            return {}
+        nodes = {node['id']: node for node in self.list_issues(issue_id=','.join(map(str, ids)))}
+        if self.store:
+            self.store.save_nodes(nodes.values())
+        return nodes
+
+    def submit_children(self, ids):
+        """Futures of {parent id: [child nodes]} for the given ids"""
+        since = time.time() - NODE_TTL
+        stored = self.store.load_children(ids, since) if self.store else {}
+        children = {}
+        child_nodes = self.store.load_nodes([c for cs in stored.values() for c in cs], since) if stored else {}
+        for parent_id, child_ids in stored.items():
+            if all(c in child_nodes for c in child_ids):
+                children[parent_id] = [child_nodes[c] for c in child_ids]
+        self.graph.cached += sum(map(len, children.values()))
+        futures = [_done(children)] if children else []
+        missing = [i for i in ids if i not in children]
+        for start in range(0, len(missing), CHUNK):
+            futures.append(self.pool.submit(self.fetch_children, missing[start:start + CHUNK]))
+        return futures
+
+    def fetch_children(self, ids):
+        if self.graph.cancelled:
+            return {}
+        # parent_id takes a list, so one request covers the subtasks of up to a page of issues
+        children = {parent_id: [] for parent_id in ids}
+        for node in self.list_issues(parent_id=','.join(map(str, ids))):
+            children.setdefault(node['parent_id'], []).append(node)
+        if self.store:
+            self.store.save_nodes([node for nodes in children.values() for node in nodes])
+            self.store.save_children({parent_id: [n['id'] for n in nodes] for parent_id, nodes in children.items()})
+        return children
+
+
+def walk_relations(api, store, graph):
+    """Walk parents, subtasks and relations breadth-first from graph.root_id, run on a worker.
+
+    Each level is loaded with a few list requests (issue_id=... for linked
+    issues, parent_id=... for subtasks) running in parallel on a small
+    pool; an issue reached twice is only reported the first time.
+    """
+    pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT)
+    pages = ThreadPoolExecutor(max_workers=MAX_CONCURRENT)
+    try:
+        walk = _Walk(api, store, graph, pool, pages)
+        seen = {graph.root_id}
+        level = {graph.root_id: (None, None)}  # id -> (reached from, relation)
+        ready = {}  # nodes of this level already loaded, subtasks come with their data
+        for depth in range(graph.max_depth + 1):
+            if graph.cancelled or not level:
+                break
+            expand = depth < graph.max_depth
+            for node_id, node in ready.items():
+                graph.events.append((node,) + level[node_id] + (depth,))
+            futures = walk.submit_nodes([i for i in level if i not in ready])
+            children_futures = walk.submit_children(list(level)) if expand else []
+            nodes = dict(ready)
+            for future in as_completed(futures):
+                for node_id, node in future.result().items():
+                    if node_id in level and node_id not in nodes:
+                        nodes[node_id] = node
+                        graph.events.append((node,) + level[node_id] + (depth,))
+            if not expand:
+                break
+            next_level, ready = {}, {}
+            for future in children_futures:
+                for parent_id, children in future.result().items():
+                    for child in children:
+                        if child['id'] not in seen:
+                            seen.add(child['id'])
+                            next_level[child['id']] = (parent_id, 'subtask')
+                            ready[child['id']] = child
+            for node in nodes.values():
+                links = [(node['parent_id'], 'parent')] if node['parent_id'] else []
+                for other_id, label in links + node['relations']:
+                    if other_id not in seen:
+                        seen.add(other_id)
+                        next_level[other_id] = (node['id'], label)
+            level = next_level
+    except Exception as e:
+        graph.error = str(e)
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pages.shutdown(wait=False, cancel_futures=True)
+        graph.finished = True
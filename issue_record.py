@@ -0,0 +1,78 @@
+import sys
+
+
+def _name(value):
+    # Status, priority, project and user names repeat across thousands of issues, share one string each
+    return sys.intern(value['name']) if value else ''
+
+
+class IssueRecord:
+    """Compact issue representation used everywhere outside the API boundary.
+
+    redminelib Resources keep their manager, the raw dict and lazily-resolved
+    attributes alive; this keeps only the fields we display.
+    """
+    __slots__ = ('id', 'subject', 'status_id', 'status_name', 'priority_id', 'priority_name',
+                 'updated_on', 'project_id', 'project_name', 'assignee_id', 'assignee_name',
+                 'author_id', 'author_name')
+
+    def __init__(self, id, subject, status_id=None, status_name='', priority_id=None, priority_name='',
+                 updated_on='', project_id=None, project_name='', assignee_id=None, assignee_name='',
+                 author_id=None, author_name=''):
+        self.id = id
+        self.subject = subject
+        self.status_id = status_id
+        self.status_name = status_name
+        self.priority_id = priority_id
+        self.priority_name = priority_name
+        self.updated_on = updated_on
+        self.project_id = project_id
+        self.project_name = project_name
+        self.assignee_id = assignee_id
+        self.assignee_name = assignee_name
+        self.author_id = author_id
+        self.author_name = author_name
+
+    @classmethod
+    def from_dict(cls, data):
+        status = data.get('status')
+        priority = data.get('priority')
+        project = data.get('project')
+        assignee = data.get('assigned_to')
+        author = data.get('author')
+        return cls(
+            data['id'],
+            data.get('subject', ''),
+            status['id'] if status else None,
+            _name(status),
+            priority['id'] if priority else None,
+            _name(priority),
+            data.get('updated_on', ''),
+            project['id'] if project else None,
+            _name(project),
+            assignee['id'] if assignee else None,
+            _name(assignee),
+            author['id'] if author else None,
+            _name(author),
+        )
+
+    @classmethod
+    def from_resource(cls, issue):
+        # Read the decoded JSON directly instead of going through Resource attribute wrapping
+        return cls.from_dict(issue.raw())
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, IssueRecord) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<IssueRecord #{self.id} {self.subject!r}>'
+
+
+def records_from_resources(issues):
+    return [IssueRecord.from_resource(issue) for issue in issues]
@@ -0,0 +1,121 @@
+import os
+import re
+import mmap
+import time
+import bisect
+from array import array
+from itertools import accumulate, islice
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class LineIndex:
+    """Byte offsets of the line starts of a text file, filled in by a worker.
+
+    offsets[n] is where line n starts and offsets[n + 1] where it ends, so
+    len(offsets) - 1 lines can be read. The GUI only ever reads below that
+    count while the worker appends, which the GIL keeps consistent.
+    """
+
+    def __init__(self):
+        self.offsets = array('Q', [0])
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    def line_of(self, position):
+        return bisect.bisect_right(self.offsets, position) - 1
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def index_lines(path, index, download):
+    """Build the index of path, run on a worker; follows the file while it is still downloading"""
+    try:
+        while not index.cancelled:
+            done = download.done  # read before the size, so nothing written after it is missed
+            size = file_size(path)
+            start = index.offsets[-1]
+            if size > start:
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                    while start < size and not index.cancelled:
+                        end = min(size, start + CHUNK_SIZE)
+                        last = mm.rfind(b'\n', start, end)
+                        if last < 0:
+                            # One line longer than a chunk, or the incomplete tail
+                            last = mm.find(b'\n', end)
+                            if last < 0:
+                                break
+                        # Line lengths come from split, the sums from accumulate, no Python loop per line
+                        lengths = map(len, mm[start:last].split(b'\n'))
+                        index.offsets.extend(islice(accumulate(map((1).__add__, lengths), initial=start), 1, None))
+                        start = last + 1
+            if done:
+                if download.error:
+                    index.error = download.error
+                elif file_size(path) > index.offsets[-1]:
+                    index.offsets.append(file_size(path))  # last line without a newline
+                break
+            time.sleep(0.1)
+    finally:
+        index.finished = True
+
+
+class SearchState:
+    """Matches found so far by search_lines, as line numbers in file order"""
+
+    def __init__(self, pattern, flags=0):
+        self.regex = re.compile(pattern.encode('utf-8'), flags | re.MULTILINE)
+        self.lines = []
+        self.searched = 0  # bytes searched so far
+        self.finished = False
+        self.cancelled = False
+        self.truncated = False
+
+
+def search_lines(path, index, state, limit=100000):
+    """Stream the lines matching state.regex into state.lines, run on a worker.
+
+    Searches whole lines the index already knows in chunks, and keeps
+    following the index until it is finished.
+    """
+    try:
+        while not state.cancelled:
+            finished = index.finished
+            end = index.offsets[-1]
+            if end > state.searched:
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as mm:
+                    while state.searched < end and not state.cancelled:
+                        chunk_end = min(end, state.searched + CHUNK_SIZE)
+                        if chunk_end < end:
+                            chunk_end = index.offsets[index.line_of(chunk_end)]
+                            if chunk_end <= state.searched:
+                                chunk_end = index.offsets[index.line_of(state.searched) + 1]
+                        last_line = -1
+                        for match in state.regex.finditer(mm, state.searched, chunk_end):
+                            if match.start() < chunk_end:
+                                line = index.line_of(match.start())
+                            elif finished and chunk_end == end and mm[end - 1] != 0x0a:
+                                line = index.line_of(end - 1)  # $ of a last line without a newline
+                            else:
+                                break  # an empty match at the end belongs to the next line
+                            if line != last_line:
+                                state.lines.append(line)
+                                last_line = line
+                                if len(state.lines) >= limit:
+                                    state.truncated = True
+                                    return
+                        state.searched = chunk_end
+            if finished:
+                break
+            time.sleep(0.1)
+    finally:
+        state.finished = True
@@ -0,0 +1,251 @@
+import re
+import html
+import json
+import time
+import sqlite3
+import threading
+
+from issue_record import IssueRecord
+from redmine_api import RedmineApi
+
+ISSUE_COLUMNS = IssueRecord.__slots__
+
+
+class LocalStore:
+    """SQLite cache of issues with a full-text index over subject, description and notes.
+
+    Shared between the GUI thread and background workers, so every access goes
+    through one connection guarded by a lock.
+    """
+
+    def __init__(self, path='redtoy.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.has_fts = True
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS issues ('
+                'id INTEGER PRIMARY KEY, subject TEXT, status_id INTEGER, status_name TEXT, '
+                'priority_id INTEGER, priority_name TEXT, updated_on TEXT, project_id INTEGER, '
+                'project_name TEXT, indexed_on TEXT, assignee_id INTEGER, assignee_name TEXT, '
+                'author_id INTEGER, author_name TEXT)')
+            # Databases from older versions miss columns added to IssueRecord since
+            existing = {row[1] for row in self.conn.execute('PRAGMA table_info(issues)')}
+            for column in ISSUE_COLUMNS:
+                if column not in existing:
+                    kind = 'INTEGER' if column.endswith('_id') else 'TEXT'
+                    self.conn.execute(f'ALTER TABLE issues ADD COLUMN {column} {kind}')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'id INTEGER PRIMARY KEY, name TEXT, login TEXT, mail TEXT, fetched_on REAL, '
+                'avatar BLOB, avatar_checked_on REAL)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS issue_details ('
+                'id INTEGER PRIMARY KEY, updated_on TEXT, fetched_on REAL, data TEXT)')
+            # Relation graph nodes (issue_graph.issue_node) and the ids of their subtasks when those were listed
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS issue_nodes ('
+                'id INTEGER PRIMARY KEY, fetched_on REAL, data TEXT, children TEXT, children_fetched_on REAL)')
+            try:
+                self.conn.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS issue_fts '
+                    "USING fts5(subject, description, notes, tokenize='unicode61')")
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5, fall back to LIKE queries on a plain table
+                self.has_fts = False
+                self.conn.execute(
+                    'CREATE TABLE IF NOT EXISTS issue_fts (subject TEXT, description TEXT, notes TEXT)')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def upsert_issues(self, records):
+        rows = [tuple(getattr(r, c) for c in ISSUE_COLUMNS) for r in records]
+        placeholders = ', '.join('?' * len(ISSUE_COLUMNS))
+        updates = ', '.join(f'{c}=excluded.{c}' for c in ISSUE_COLUMNS if c != 'id')
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f'INSERT INTO issues ({", ".join(ISSUE_COLUMNS)}) VALUES ({placeholders}) '
+                f'ON CONFLICT(id) DO UPDATE SET {updates}', rows)
+            # Keep the subject searchable even before description and notes are indexed
+            for r in records:
+                if self.conn.execute('UPDATE issue_fts SET subject=? WHERE rowid=?', (r.subject, r.id)).rowcount == 0:
+                    self.conn.execute("INSERT INTO issue_fts (rowid, subject, description, notes) VALUES (?, ?, '', '')",
+                                      (r.id, r.subject))
+
+    def get_issue(self, issue_id):
+        with self.lock:
+            row = self.conn.execute(f'SELECT {", ".join(ISSUE_COLUMNS)} FROM issues WHERE id=?', (issue_id,)).fetchone()
+        return IssueRecord(*row) if row else None
+
+    def stale_issue_ids(self, records):
+        """Ids whose description and notes were not indexed at their current updated_on"""
+        with self.lock:
+            indexed = dict(self.conn.execute(
+                f'SELECT id, indexed_on FROM issues WHERE id IN ({", ".join("?" * len(records))})',
+                [r.id for r in records]).fetchall()) if records else {}
+        return [r.id for r in records if indexed.get(r.id) != r.updated_on]
+
+    def load_users(self):
+        """Every known user as {id: dict of the users table columns}"""
+        with self.lock:
+            cursor = self.conn.execute(
+                'SELECT id, name, login, mail, fetched_on, avatar, avatar_checked_on FROM users')
+            columns = [c[0] for c in cursor.description]
+            return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def upsert_users(self, users):
+        """Save user dicts (id, name, optionally login, mail, fetched_on), keeping what they don't carry"""
+        rows = [(u['id'], u.get('name') or '', u.get('login'), u.get('mail'), u.get('fetched_on')) for u in users]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO users (id, name, login, mail, fetched_on) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET name=excluded.name, '
+                'login=COALESCE(excluded.login, users.login), mail=COALESCE(excluded.mail, users.mail), '
+                'fetched_on=COALESCE(excluded.fetched_on, users.fetched_on)', rows)
+
+    def set_avatar(self, user_id, data, checked_on):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE users SET avatar=?, avatar_checked_on=? WHERE id=?',
+                              (data, checked_on, user_id))
+
+    def save_details(self, issue):
+        """Keep the full issue (journals, attachments) so its details open without a fetch"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO issue_details (id, updated_on, fetched_on, data) VALUES (?, ?, ?, ?)',
+                (issue['id'], issue.get('updated_on'), time.time(), json.dumps(issue)))
+
+    def get_details(self, issue_id):
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM issue_details WHERE id=?', (issue_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def details_updated_on(self, issue_ids):
+        """{issue id: updated_on} of the stored details among issue_ids"""
+        if not issue_ids:
+            return {}
+        with self.lock:
+            return dict(self.conn.execute(
+                f'SELECT id, updated_on FROM issue_details WHERE id IN ({", ".join("?" * len(issue_ids))})',
+                list(issue_ids)).fetchall())
+
+    def prune_details(self, keep_ids, limit=200):
+        """Drop all but the `limit` most recently fetched details, never the ones in keep_ids"""
+        keep_ids = list(keep_ids)
+        keep = f'id NOT IN ({", ".join("?" * len(keep_ids))}) AND ' if keep_ids else ''
+        with self.lock, self.conn:
+            self.conn.execute(
+                f'DELETE FROM issue_details WHERE {keep}'
+                f'id NOT IN (SELECT id FROM issue_details ORDER BY fetched_on DESC LIMIT ?)',
+                keep_ids + [limit])
+
+    def save_nodes(self, nodes):
+        rows = [(node['id'], time.time(), json.dumps(node)) for node in nodes]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO issue_nodes (id, fetched_on, data) VALUES (?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET fetched_on=excluded.fetched_on, data=excluded.data', rows)
+
+    def save_children(self, children):
+        """Remember the subtask ids of issues, {issue id: [child ids]}"""
+        rows = [(parent_id, json.dumps(child_ids), time.time()) for parent_id, child_ids in children.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO issue_nodes (id, children, children_fetched_on) VALUES (?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET children=excluded.children, '
+                'children_fetched_on=excluded.children_fetched_on', rows)
+
+    def load_nodes(self, issue_ids, since):
+        """{id: node} of the stored nodes among issue_ids fetched after `since`"""
+        if not issue_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT id, data FROM issue_nodes WHERE id IN ({", ".join("?" * len(issue_ids))}) '
+                f'AND data IS NOT NULL AND fetched_on >= ?', list(issue_ids) + [since]).fetchall()
+        return {issue_id: json.loads(data) for issue_id, data in rows}
+
+    def load_children(self, issue_ids, since):
+        """{id: [child ids]} of the issues among issue_ids whose subtasks were listed after `since`"""
+        if not issue_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT id, children FROM issue_nodes WHERE id IN ({", ".join("?" * len(issue_ids))}) '
+                f'AND children IS NOT NULL AND children_fetched_on >= ?', list(issue_ids) + [since]).fetchall()
+        return {issue_id: json.loads(children) for issue_id, children in rows}
+
+    def index_issue(self, record, description, notes):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM issue_fts WHERE rowid=?', (record.id,))
+            self.conn.execute('INSERT INTO issue_fts (rowid, subject, description, notes) VALUES (?, ?, ?, ?)',
+                              (record.id, record.subject, description or '', '\n\n'.join(notes)))
+        self.upsert_issues([record])
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE issues SET indexed_on=? WHERE id=?', (record.updated_on, record.id))
+
+    @staticmethod
+    def fts_query(text):
+        # Every word must match, as a prefix, without exposing FTS query syntax to the user
+        words = re.findall(r'\w+', text)
+        return ' '.join(f'"{w}"*' for w in words)
+
+    def search(self, text, limit=50):
+        """Return (IssueRecord, snippet html) pairs, best match first"""
+        query = self.fts_query(text)
+        if not query:
+            return []
+        columns = ', '.join(f'issues.{c}' for c in ISSUE_COLUMNS)
+        with self.lock:
+            if self.has_fts:
+                rows = self.conn.execute(
+                    f"SELECT {columns}, snippet(issue_fts, -1, char(2), char(3), '…', 12) FROM issue_fts "
+                    f'JOIN issues ON issues.id = issue_fts.rowid '
+                    f'WHERE issue_fts MATCH ? ORDER BY bm25(issue_fts, 10.0, 2.0, 1.0) LIMIT ?',
+                    (query, limit)).fetchall()
+            else:
+                like = f'%{text}%'
+                rows = self.conn.execute(
+                    f'SELECT {columns}, substr(issue_fts.description, 1, 80) FROM issue_fts '
+                    f'JOIN issues ON issues.id = issue_fts.rowid '
+                    f'WHERE issue_fts.subject LIKE ? OR issue_fts.description LIKE ? OR issue_fts.notes LIKE ? '
+                    f'LIMIT ?', (like, like, like, limit)).fetchall()
+        return [(IssueRecord(*row[:-1]), self.snippet_html(row[-1])) for row in rows]
+
+    @staticmethod
+    def snippet_html(snippet):
+        # Highlight markers are control characters so the text itself can be escaped safely
+        return html.escape(snippet or '').replace('\x02', '<b>').replace('\x03', '</b>').replace('\n', ' ')
+
+
+INDEX_BATCH = 20  # issues fetched per sync, a large query gets indexed over the next loads
+_indexing = set()  # ids a worker is fetching right now
+_indexing_lock = threading.Lock()
+
+
+def sync_issue_index(redmine, store, issue_ids):
+    """Fetch description and notes of the first INDEX_BATCH changed issues and index them, run on a worker"""
+    with _indexing_lock:
+        issue_ids = [i for i in issue_ids if i not in _indexing][:INDEX_BATCH]
+        _indexing.update(issue_ids)
+    try:
+        api = RedmineApi(redmine)
+        for issue_id in issue_ids:
+            index_issue_data(store, api.get_issue(issue_id, include=['journals']))
+    finally:
+        with _indexing_lock:
+            _indexing.difference_update(issue_ids)
+    return len(issue_ids)
+
+
+def index_issue_data(store, issue):
+    notes = [journal['notes'] for journal in issue.get('journals', []) if journal.get('notes')]
+    store.index_issue(IssueRecord.from_dict(issue), issue.get('description') or '', notes)
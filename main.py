@@ -1,7 +1,7 @@
 import sys
 import os
 import ctypes
-from redmine_helper_service import RedmineHelperService
+from redtoy_cli import send_command, NoReply, COMMAND_TIMEOUTS
 
 def is_admin():
     try:
@@ -13,9 +13,38 @@ def is_admin():
         return False
 
 if __name__ == "__main__":
+    service_mode = len(sys.argv) > 1 and sys.argv[1] == '--service'
+    command = sys.argv[2:] if service_mode else sys.argv[1:]
+
+    # Hand the command to an already running instance before paying for the Qt import
+    benchmarking = bool(os.environ.get('REDTOY_STARTUP_PROBE'))
+    forwarded = command or (['ping'] if service_mode else ['show'])
+    try:
+        reply = None if benchmarking else send_command(forwarded, COMMAND_TIMEOUTS.get(forwarded[0], 5.0))
+    except NoReply as e:
+        # Running but busy: a second instance would only fight it for the socket and the hotkeys
+        print(e)
+        sys.exit(1)
+    if reply is not None:
+        print(reply)
+        sys.exit(1 if reply.startswith('error:') else 0)
+
+    from redmine_helper_service import RedmineHelperService
+    from single_instance import AlreadyRunning
     if not is_admin():
         print("Warning: This application may need administrator privileges to register global hotkeys.")
-    service = RedmineHelperService()
-    if not (len(sys.argv) > 1 and sys.argv[1] == '--service'):
+    try:
+        service = RedmineHelperService()
+    except AlreadyRunning:
+        # Another instance took the socket since we asked, hand it the command after all
+        try:
+            reply = send_command(forwarded, COMMAND_TIMEOUTS.get(forwarded[0], 5.0))
+        except NoReply as e:
+            reply = f'error: {e}'
+        print(reply or 'error: RedToy is already running but not answering')
+        sys.exit(1 if not reply or reply.startswith('error:') else 0)
+    if command:
+        service.run_command(command)
+    elif not service_mode:
         service.helper.show()
     sys.exit(service.run())
@@ -0,0 +1,219 @@
+import time
+import threading
+
+from redminelib.exceptions import ForbiddenError, ResourceNotFoundError
+
+from redmine_api import RedmineApi
+
+# Journal detail attribute -> lookup table its ids refer to
+FIELD_TABLES = {
+    'status_id': 'statuses',
+    'priority_id': 'priorities',
+    'tracker_id': 'trackers',
+    'assigned_to_id': 'users',
+    'author_id': 'users',
+    'fixed_version_id': 'versions',
+    'category_id': 'categories',
+    'project_id': 'projects',
+    'parent_id': 'issues',
+}
+FIELD_LABELS = {'fixed_version_id': 'Target version', 'parent_id': 'Parent task', 'done_ratio': '% Done'}
+# Tables that come as one list for the whole server
+GLOBAL_TABLES = {
+    'statuses': ('/issue_statuses.json', 'issue_statuses'),
+    'priorities': ('/enumerations/issue_priorities.json', 'issue_priorities'),
+    'trackers': ('/trackers.json', 'trackers'),
+    'projects': ('/projects.json', 'projects'),
+}
+# Tables listed per project, with the endpoint for single ids the project list didn't cover
+PROJECT_TABLES = {
+    'users': ('/projects/{}/memberships.json', 'memberships', '/users/{}.json'),
+    'versions': ('/projects/{}/versions.json', 'versions', '/versions/{}.json'),
+    'categories': ('/projects/{}/issue_categories.json', 'issue_categories', '/issue_categories/{}.json'),
+}
+
+
+def field_label(name):
+    if name in FIELD_LABELS:
+        return FIELD_LABELS[name]
+    if name.endswith('_id'):
+        name = name[:-len('_id')]
+    return name.replace('_', ' ').capitalize()
+
+
+def user_name(user):
+    return f"{user.get('firstname', '')} {user.get('lastname', '')}".strip() or user.get('name', '')
+
+
+class NameLookup:
+    """Names for the ids referenced by journal details, shared by all issue dialogs.
+
+    resolve(issue) collects the ids of every journal of the issue and loads
+    what is still unknown in bulk: one request per table (statuses, project
+    members, versions, ...). Ids those lists don't contain, e.g. users who
+    left the project, come from the list of every user (administrators) and
+    the versions of the other projects in the history, and only then one by
+    one. Tables are reloaded after TTL seconds, and ids the server said
+    don't exist are asked about again after the same time.
+    """
+    TTL = 3600
+
+    def __init__(self, redmine):
+        self.api = RedmineApi(redmine)
+        self.lock = threading.RLock()
+        self.tables = {}  # table -> {id: name}
+        self.loaded = {}  # (table, project id or None) -> time the list was fetched
+        self.unknown = {}  # (table, id) -> time the server said there is no such thing
+        self.list_users = True  # until /users.json says we aren't an administrator
+
+    def name(self, table, value):
+        """Name for an id as it appears in journal details (a string), the value itself if unknown"""
+        if value is None or value == '':
+            return ''
+        try:
+            return self.tables.get(table, {}).get(int(value), value)
+        except (TypeError, ValueError):
+            return value
+
+    def add(self, table, items, name_key='name'):
+        names = self.tables.setdefault(table, {})
+        for item in items:
+            if item and 'id' in item:
+                names[item['id']] = item.get(name_key) or item.get('name', '')
+
+    def remember_issue(self, issue):
+        # Names that came with the issue itself cost nothing
+        for field, table in (('status', 'statuses'), ('priority', 'priorities'), ('tracker', 'trackers'),
+                             ('project', 'projects'), ('author', 'users'), ('assigned_to', 'users'),
+                             ('fixed_version', 'versions'), ('category', 'categories')):
+            self.add(table, [issue.get(field)])
+        self.add('users', [journal.get('user') for journal in issue.get('journals', [])])
+
+    def referenced_ids(self, issue):
+        wanted = {}
+        for journal in issue.get('journals', []):
+            for detail in journal.get('details', []):
+                table = FIELD_TABLES.get(detail.get('name')) if detail.get('property') == 'attr' else None
+                if table is None:
+                    continue
+                for value in (detail.get('old_value'), detail.get('new_value')):
+                    if value and str(value).isdigit():
+                        wanted.setdefault(table, set()).add(int(value))
+        return wanted
+
+    def has_names(self, issue):
+        """Whether every id in the issue's history can already be named without a fetch"""
+        # Called from the GUI thread, don't wait for a worker that is fetching names
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.remember_issue(issue)
+            return all(i in self.tables.get(table, {}) or self.is_unknown(table, i)
+                       for table, ids in self.referenced_ids(issue).items() for i in ids)
+        finally:
+            self.lock.release()
+
+    def is_fresh(self, table, project_id=None):
+        return time.time() - self.loaded.get((table, project_id), 0) < self.TTL
+
+    def is_unknown(self, table, item_id):
+        return time.time() - self.unknown.get((table, item_id), 0) < self.TTL
+
+    def resolve(self, issue):
+        """Make sure every id in the issue's journal details has a name, run on a worker if possible"""
+        with self.lock:
+            self.remember_issue(issue)
+            project_id = issue.get('project', {}).get('id')
+            wanted = self.referenced_ids(issue)
+            # Versions of an issue that moved belong to the projects it was in
+            project_ids = {project_id} | wanted.get('projects', set())
+            for table, ids in wanted.items():
+                missing = {i for i in ids if i not in self.tables.get(table, {}) and not self.is_unknown(table, i)}
+                if missing:
+                    self.load(table, missing, project_id, project_ids - {None})
+
+    def missing(self, table, ids):
+        return ids - set(self.tables.get(table, {}))
+
+    def load(self, table, ids, project_id, project_ids=()):
+        failed = set()
+        if table in GLOBAL_TABLES:
+            if not self.is_fresh(table):
+                path, container = GLOBAL_TABLES[table]
+                self.add(table, self.api.list_all(path, container))
+                self.loaded[(table, None)] = time.time()
+        elif table == 'issues':
+            records = self.api.list_issues(issue_id=','.join(map(str, sorted(ids))), status_id='*')
+            self.tables.setdefault('issues', {}).update({r.id: f'#{r.id} {r.subject}' for r in records})
+        elif table in PROJECT_TABLES:
+            path, container, single_path = PROJECT_TABLES[table]
+            if project_id:
+                self.load_project_list(table, project_id)
+            if table == 'users' and self.missing(table, ids) and self.list_users and not self.is_fresh('users'):
+                try:
+                    # Locked accounts too, people who left are the ones the project list misses
+                    users = self.api.list_all('/users.json', 'users', status='')
+                    self.add('users', [dict(user, name=user_name(user)) for user in users])
+                    self.loaded[('users', None)] = time.time()
+                except (ForbiddenError, ResourceNotFoundError):
+                    self.list_users = False
+            if table == 'versions':
+                for other_id in project_ids:
+                    if self.missing(table, ids):
+                        self.load_project_list(table, other_id)
+            if table != 'users' or not self.is_fresh('users'):
+                failed = self.load_singles(table, single_path, self.missing(table, ids))
+        # Only ids a complete answer left out are unknown, a failed request is tried again next time
+        for item_id in self.missing(table, ids) - failed:
+            self.unknown[(table, item_id)] = time.time()
+
+    def load_project_list(self, table, project_id):
+        if self.is_fresh(table, project_id):
+            return
+        path, container, _ = PROJECT_TABLES[table]
+        try:
+            items = self.api.list_all(path.format(project_id), container)
+        except (ForbiddenError, ResourceNotFoundError):
+            items = []  # a project we can't see anymore
+        if table == 'users':
+            # Memberships name either a user or a group
+            items = [m.get('user') or m.get('group') for m in items]
+        self.add(table, items)
+        self.loaded[(table, project_id)] = time.time()
+
+    def load_singles(self, table, single_path, ids):
+        """Fetch ids one by one, returns those whose request failed"""
+        failed = set()
+        for item_id in ids:
+            try:
+                item = self.api.get(single_path.format(item_id))
+            except ResourceNotFoundError:
+                continue  # left missing, so marked unknown
+            except Exception as e:
+                print(f"Failed to look up {table} #{item_id}: {e}")
+                failed.add(item_id)
+                continue
+            item = next(iter(item.values()))
+            if table == 'users':
+                item['name'] = user_name(item)
+            self.add(table, [item])
+        return failed
+
+    def describe(self, detail, issue):
+        """(label, old, new) of a journal detail, with ids replaced by names"""
+        prop = detail.get('property')
+        name = detail.get('name', '')
+        old, new = detail.get('old_value') or '', detail.get('new_value') or ''
+        if prop == 'attr':
+            table = FIELD_TABLES.get(name)
+            if table:
+                old, new = self.name(table, old), self.name(table, new)
+            return field_label(name), old, new
+        if prop == 'cf':
+            fields = {str(cf.get('id')): cf.get('name') for cf in issue.get('custom_fields', [])}
+            return fields.get(str(name), f'Custom field #{name}'), old, new
+        if prop == 'attachment':
+            return 'File', old, new
+        if prop == 'relation':
+            return field_label(name), old and f'#{old}', new and f'#{new}'
+        return field_label(name), old, new
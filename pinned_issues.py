@@ -0,0 +1,128 @@
+from PyQt5 import QtCore
+
+from local_store import index_issue_data
+from redmine_api import RedmineApi
+from workers import run_in_background
+
+DETAIL_INCLUDES = ['attachments', 'journals']
+PINNED = 'pinned'  # picker entry listing the pinned issues
+
+
+def fetch_details(api, store, issue_id, names=None):
+    """Fetch an issue with everything the details dialog shows and keep it in the store"""
+    issue = api.get_issue(issue_id, include=DETAIL_INCLUDES)
+    if store:
+        store.save_details(issue)
+        index_issue_data(store, issue)
+    if names:
+        names.resolve(issue)
+    return issue
+
+
+def sync_pinned(api, store, names, issue_ids, include_watched):
+    """Refresh stored details of pinned issues that changed, run on a worker.
+
+    One batched list request tells which issues changed since their details
+    were stored; only those are fetched in full. Returns (pinned records,
+    watched records, ids whose details were refreshed).
+    """
+    watched = api.list_issues(watcher_id='me', status_id='open') if include_watched else []
+    records = []
+    for start in range(0, len(issue_ids), api.PAGE_SIZE):
+        chunk = issue_ids[start:start + api.PAGE_SIZE]
+        records.extend(api.list_issues(issue_id=','.join(map(str, chunk)), status_id='*'))
+    known = {r.id: r for r in watched}
+    known.update((r.id, r) for r in records)
+    stored = store.details_updated_on(list(known))
+    refreshed = []
+    for record in known.values():
+        if stored.get(record.id) != record.updated_on:
+            fetch_details(api, store, record.id, names)
+            refreshed.append(record.id)
+    store.prune_details(known)
+    return records, watched, refreshed
+
+
+class PinnedIssues(QtCore.QObject):
+    """Issues the user keeps returning to, with their full details kept warm.
+
+    The list is part of the session. Every SYNC_INTERVAL seconds the details of
+    pinned issues that changed on the server are fetched again into the local
+    store, so opening one renders from the store right away. With
+    include_watched, issues the user watches on Redmine are pinned too, unless
+    the user unpinned them before.
+    """
+    changed = QtCore.pyqtSignal()
+    synced = QtCore.pyqtSignal(object)  # ids whose stored details were refreshed
+
+    SYNC_INTERVAL = 300
+
+    def __init__(self, redmine, store, session, names=None, include_watched=False, parent=None):
+        super().__init__(parent)
+        self.api = RedmineApi(redmine) if redmine else None
+        self.store = store
+        self.session = session
+        self.names = names
+        self.include_watched = include_watched
+        self.syncing = False
+
+        self.sync_timer = QtCore.QTimer(self)
+        self.sync_timer.timeout.connect(self.sync)
+        self.sync_timer.start(self.SYNC_INTERVAL * 1000)
+
+    def records(self):
+        return list(self.session.pinned_issues)
+
+    def is_pinned(self, issue_id):
+        return any(r.id == issue_id for r in self.session.pinned_issues)
+
+    def pin(self, record):
+        if self.is_pinned(record.id):
+            return
+        self.session.pinned_issues.append(record)
+        self.session.dismissed_pins.discard(record.id)
+        self.session.save()
+        self.changed.emit()
+        self.sync()
+
+    def unpin(self, issue_id):
+        self.session.pinned_issues = [r for r in self.session.pinned_issues if r.id != issue_id]
+        self.session.dismissed_pins.add(issue_id)
+        self.session.save()
+        self.changed.emit()
+
+    def toggle(self, record):
+        """Pin or unpin, return whether the issue is pinned now"""
+        if self.is_pinned(record.id):
+            self.unpin(record.id)
+            return False
+        self.pin(record)
+        return True
+
+    def sync(self):
+        if self.syncing or not self.api or not self.store:
+            return
+        ids = [r.id for r in self.session.pinned_issues]
+        if not ids and not self.include_watched:
+            return
+        self.syncing = True
+        run_in_background(sync_pinned, self.api, self.store, self.names, ids, self.include_watched,
+                          on_done=self.sync_done, on_error=self.sync_failed)
+
+    def sync_done(self, result):
+        self.syncing = False
+        records, watched, refreshed = result
+        self.session.update_records(records)
+        pinned = {r.id for r in self.session.pinned_issues}
+        new = [r for r in watched if r.id not in pinned and r.id not in self.session.dismissed_pins]
+        if new:
+            self.session.pinned_issues.extend(new)
+            self.session.save()
+        if records or new:
+            self.changed.emit()
+        if refreshed:
+            self.synced.emit(refreshed)
+
+    def sync_failed(self, error):
+        self.syncing = False
+        print(f"Failed to sync pinned issues: {error}")
@@ -0,0 +1,123 @@
+import time
+
+from PyQt5 import QtCore
+
+from redmine_api import RedmineApi
+from workers import run_in_background
+
+MY_ISSUES = 'mine'
+
+
+class QueryCache(QtCore.QObject):
+    """Result sets of "my open issues" and saved queries, each cached separately.
+
+    Every query has its own time-to-live (the [QueryTTL] config section, keyed
+    by query id or "mine"). Stale results are still returned immediately and a
+    background refresh replaces them, announced through `updated`.
+    """
+    updated = QtCore.pyqtSignal(object)
+    queries_loaded = QtCore.pyqtSignal()
+
+    REFRESH_CHECK_INTERVAL = 60
+    KEEP_WARM_FOR = 3600  # keep refreshing queries used within the last hour
+
+    def __init__(self, redmine, store=None, default_ttl=300, ttls=None, parent=None):
+        super().__init__(parent)
+        self.redmine = redmine
+        self.api = RedmineApi(redmine) if redmine else None
+        self.store = store
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.entries = {}  # query key -> {'records', 'fetched_at', 'used_at'}
+        self.refreshing = set()
+        self.queries = []  # (query id, name, project id) of saved queries visible to the user
+        self.queries_fetched_at = 0
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_stale)
+        self.refresh_timer.start(self.REFRESH_CHECK_INTERVAL * 1000)
+
+    def ttl(self, key):
+        return self.ttls.get(str(key), self.default_ttl)
+
+    def filters(self, key):
+        if key == MY_ISSUES:
+            return {'assigned_to_id': 'me', 'status_id': 'open'}
+        filters = {'query_id': key}
+        for query_id, name, project_id in self.queries:
+            if query_id == key and project_id:
+                filters['project_id'] = project_id  # project queries only run inside their project
+        return filters
+
+    def fetch(self, key):
+        records = self.api.list_issues(**self.filters(key))
+        if self.store:
+            self.store.upsert_issues(records)
+        return records
+
+    def is_stale(self, key):
+        entry = self.entries.get(key)
+        return entry is None or time.time() - entry['fetched_at'] > self.ttl(key)
+
+    def get(self, key):
+        """Cached records for the query (refreshing in the background if stale), or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry['used_at'] = time.time()
+        if self.is_stale(key):
+            self.refresh(key)
+        return entry['records']
+
+    def get_or_fetch(self, key):
+        records = self.get(key)
+        if records is None:
+            records = self.fetch(key)
+            self.put(key, records)
+        return records
+
+    def put(self, key, records):
+        now = time.time()
+        self.entries[key] = {'records': records, 'fetched_at': now,
+                             'used_at': self.entries.get(key, {}).get('used_at', now)}
+
+    def refresh(self, key):
+        if key in self.refreshing or not self.redmine:
+            return
+        self.refreshing.add(key)
+        run_in_background(self.fetch, key,
+                          on_done=lambda records: self.refreshed(key, records),
+                          on_error=lambda e: self.refresh_failed(key, e))
+
+    def refreshed(self, key, records):
+        self.refreshing.discard(key)
+        self.put(key, records)
+        self.updated.emit(key)
+
+    def refresh_failed(self, key, error):
+        self.refreshing.discard(key)
+        print(f"Failed to refresh query {key}: {error}")
+
+    def refresh_stale(self):
+        now = time.time()
+        for key, entry in list(self.entries.items()):
+            if now - entry['used_at'] < self.KEEP_WARM_FOR and self.is_stale(key):
+                self.refresh(key)
+
+    def invalidate(self):
+        # Something changed on the server (e.g. a status update), refresh whatever is in use
+        for entry in self.entries.values():
+            entry['fetched_at'] = 0
+        self.refresh_stale()
+
+    def load_queries(self):
+        if not self.redmine or time.time() - self.queries_fetched_at < self.default_ttl:
+            return
+        self.queries_fetched_at = time.time()
+        run_in_background(lambda: [(q.id, q.name, getattr(q, 'project_id', None)) for q in self.redmine.query.all()],
+                          on_done=self.set_queries,
+                          on_error=lambda e: print(f"Failed to load saved queries: {e}"))
+
+    def set_queries(self, queries):
+        self.queries = queries
+        self.queries_loaded.emit()
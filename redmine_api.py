@@ -0,0 +1,103 @@
+from issue_record import IssueRecord
+
+
+class RedmineApi:
+    """Thin client for the endpoints we call all the time.
+
+    Requests go through the engine of the redminelib client, so they share its
+    pooled session, request coalescing and caches, but responses are handed
+    back as plain dicts and IssueRecords instead of Resource objects.
+    redminelib stays for everything else.
+    """
+    PAGE_SIZE = 100  # the largest page Redmine serves
+
+    def __init__(self, redmine):
+        self.redmine = redmine
+
+    def get(self, path, **params):
+        return self.redmine.engine.request('get', f'{self.redmine.url}{path}', params=params)
+
+    def get_uncached(self, path, **params):
+        engine = self.redmine.engine
+        request = getattr(engine, 'request_uncached', engine.request)
+        return request('get', f'{self.redmine.url}{path}', params=params)
+
+    def iter_issues(self, **filters):
+        """Yield raw issue dicts page by page without caching them, for exports of any size.
+
+        Without an issue_id filter pages are cut by id (issue_id >= next id)
+        instead of offset, so issues created or changed during a long export
+        are neither skipped nor repeated. A saved query (query_id) ignores
+        URL filters and sort, so it is paged by offset up to its total_count.
+        """
+        keyset = 'issue_id' not in filters and 'query_id' not in filters
+        params = dict(filters, sort='id', limit=self.PAGE_SIZE) if keyset else dict(filters, limit=self.PAGE_SIZE)
+        offset = 0
+        while True:
+            response = self.get_uncached('/issues.json', offset=0 if keyset else offset, **params)
+            page = response.get('issues', [])
+            yield from page
+            if len(page) < self.PAGE_SIZE or (not keyset and offset + len(page) >= response.get('total_count', 0)):
+                return
+            if keyset:
+                params['issue_id'] = f'>={page[-1]["id"] + 1}'
+            else:
+                offset += len(page)
+
+    def iter_time_entries(self, start, end, **filters):
+        """Yield raw time entries spent from start to end (ISO dates, inclusive), uncached"""
+        params = dict(filters, limit=self.PAGE_SIZE, **{'from': start, 'to': end})
+        offset = 0
+        while True:
+            response = self.get_uncached('/time_entries.json', offset=offset, **params)
+            page = response.get('time_entries', [])
+            yield from page
+            offset += len(page)
+            if len(page) < self.PAGE_SIZE or offset >= response.get('total_count', 0):
+                return
+
+    def list_all(self, path, container, **params):
+        """Every item of a paginated list; endpoints without paging return in one request"""
+        items = []
+        while True:
+            response = self.get(path, offset=len(items), limit=self.PAGE_SIZE, **params)
+            page = response.get(container, [])
+            items.extend(page)
+            if len(page) < self.PAGE_SIZE or len(items) >= response.get('total_count', 0):
+                return items
+
+    def issue_page(self, offset=0, limit=PAGE_SIZE, **filters):
+        """One page of issues as (records, total count)"""
+        response = self.get('/issues.json', offset=offset, limit=limit, **filters)
+        return [IssueRecord.from_dict(issue) for issue in response['issues']], response.get('total_count', 0)
+
+    def list_issues(self, limit=None, **filters):
+        """All issues matching the filters (at most `limit`), fetched in pages of PAGE_SIZE"""
+        records = []
+        while limit is None or len(records) < limit:
+            page_size = self.PAGE_SIZE if limit is None else min(self.PAGE_SIZE, limit - len(records))
+            page, total_count = self.issue_page(len(records), page_size, **filters)
+            records.extend(page)
+            if len(page) < page_size or len(records) >= total_count:
+                break
+        return records
+
+    def get_issue(self, issue_id, include=()):
+        params = {'include': ','.join(include)} if include else {}
+        return self.get(f'/issues/{issue_id}.json', **params)['issue']
+
+    def get_issue_record(self, issue_id):
+        return IssueRecord.from_dict(self.get_issue(issue_id))
+
+    def update_issue(self, issue_id, **fields):
+        self.redmine.engine.request('put', f'{self.redmine.url}/issues/{issue_id}.json', data={'issue': fields})
+
+    def upload(self, body, filename):
+        """Send a file-like body to /uploads and return the token to attach it with"""
+        response = self.redmine.engine.request(
+            'post', f'{self.redmine.url}/uploads.json', params={'filename': filename},
+            headers={'Content-Type': 'application/octet-stream'}, data=body)
+        return response['upload']['token']
+
+    def statuses(self):
+        return self.get('/issue_statuses.json')['issue_statuses']
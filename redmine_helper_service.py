@@ -1,11 +1,47 @@
 from PyQt5 import QtCore, QtWidgets
+import os
 import sys
+import time
 from redmine_main_window import RedmineMainWindow
+from single_instance import CommandServer
+
+# Set by tools/startup_benchmark.py: report startup milestones on stdout, then quit
+STARTUP_PROBE = os.environ.get('REDTOY_STARTUP_PROBE')
+
+class StartupProbe(QtCore.QObject):
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.marks = {}
+        window.installEventFilter(self)
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.time()
+            print(f"STARTUP {name} {self.marks[name]:.6f}", flush=True)
+        # Without a visible window (--service) tray-ready is the last milestone
+        if 'tray-ready' in self.marks and ('first-window' in self.marks or not self.window.isVisible()):
+            QtCore.QTimer.singleShot(0, QtWidgets.QApplication.quit)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            self.mark('first-window')
+        return False
+
+    def start(self):
+        # Runs on the first event loop iteration, after the tray icon has been shown
+        QtCore.QTimer.singleShot(0, lambda: self.mark('tray-ready'))
 
 class RedmineHelperService:
     def __init__(self):
         self.app = QtWidgets.QApplication(sys.argv)
+        # Second launches and the CLI talk to this instance instead of starting their own.
+        # Claimed before the window exists, so a duplicate raises AlreadyRunning before registering hotkeys.
+        self.command_server = CommandServer(lambda args, reply: self.helper.handle_command(args, reply))
+        if not STARTUP_PROBE:
+            self.command_server.listen()
         self.helper = RedmineMainWindow()
+        self.startup_probe = StartupProbe(self.helper) if STARTUP_PROBE else None
 
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.process_events)
@@ -14,5 +50,10 @@ class RedmineHelperService:
     def process_events(self):
         QtWidgets.QApplication.processEvents()
 
+    def run_command(self, args):
+        QtCore.QTimer.singleShot(0, lambda: self.helper.handle_command(args, print))
+
     def run(self):
+        if self.startup_probe:
+            self.startup_probe.start()
         return self.app.exec_()
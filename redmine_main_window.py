@@ -1,7 +1,9 @@
 import os
 import configparser
 import webbrowser
+import random
 import sys
+import threading
 
 from PyQt5 import QtWidgets, QtCore, QtGui
 from redminelib import Redmine
@@ -9,11 +11,26 @@ from redminelib.exceptions import AuthError
 import keyboard
 
 from dialogs.settings_dialog import SettingsDialog
-from dialogs.issue_details_dialog import IssueDetailsDialog
+from dialogs.issue_details_dialog import show_issue_window
 from dialogs.change_status_dialog import ChangeStatusDialog
 from dialogs.choose_issue_dialog import ChooseIssueDialog
+from time_tracker import TimeTracker
+from local_store import LocalStore
+from query_cache import QueryCache
+from request_cache import CachingEngine, LIMITER
+from session_state import SessionState
+from redmine_api import RedmineApi
+from name_lookup import NameLookup
+from user_directory import UserDirectory
+from pinned_issues import PinnedIssues
+from workers import run_in_background
 
 class RedmineMainWindow(QtWidgets.QWidget):
+    # keyboard hotkey callbacks run on their own thread, hop back to the GUI thread
+    hotkey_pressed = QtCore.pyqtSignal()
+    timer_hotkey_pressed = QtCore.pyqtSignal()
+    MAX_RECONNECT_DELAY = 300  # seconds
+
     def __init__(self):
         super().__init__()
         if getattr(sys, 'frozen', False):  # Check if running as a compiled executable
@@ -24,11 +41,37 @@ class RedmineMainWindow(QtWidgets.QWidget):
         self.config_file = 'config.cfg'
         self.current_issue = None
         self.redmine = None
+        self.api = None
+        self.names = None
         self.hotkey = None
+        self.timer_hotkey = None
+        self.hotkey_handles = []  # removers returned by keyboard.add_hotkey
         self.font_size = 10
+        self.current_user = None
+        self.statuses = None  # (id, name) of issue statuses, fetched on first use
+        self.time_entries = None  # TimeEntryStore, loaded when the report is first opened
+        self.connect_attempts = 0  # failed logins in a row, the reconnect delay grows with them
+        self.auth_failed = False
+        self.reconnect_timer = QtCore.QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.reconnect)
         self.load_config()
+        # Local state first, the network only revalidates it later
+        self.session = SessionState()
+        self.current_issue = self.session.current_issue
         self.init_redmine()
+        self.store = LocalStore()
+        self.users = UserDirectory(self.redmine, self.store, self.gravatar, parent=self)
+        self.pins = PinnedIssues(self.redmine, self.store, self.session, self.names, self.pin_watched, parent=self)
+        self.query_cache = QueryCache(self.redmine, self.store, self.query_ttl, self.query_ttls, parent=self)
+        self.query_cache.queries = [tuple(q) for q in self.session.picker.get('queries', [])]
+        self.query_cache.queries_loaded.connect(lambda: self.session.save_picker(queries=self.query_cache.queries))
+        self.time_tracker = TimeTracker(self.redmine, parent=self)
+        self.time_tracker.state_changed.connect(self.update_timer_label)
+        self.hotkey_pressed.connect(self.toggle_window)
+        self.timer_hotkey_pressed.connect(self.toggle_timer)
         self.init_ui()
+        self.show_current_issue()
         self.apply_font_size()
         self.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
         QtCore.QTimer.singleShot(1000, self.register_hotkey)
@@ -43,7 +86,7 @@ class RedmineMainWindow(QtWidgets.QWidget):
         show_action.triggered.connect(self.toggle_window)
 
         quit_action = tray_menu.addAction("Quit")
-        quit_action.triggered.connect(QtWidgets.qApp.quit)
+        quit_action.triggered.connect(self.quit)  # not qApp.quit, the timer has to be closed and saved first
 
         self.tray_icon.setContextMenu(tray_menu)
         self.tray_icon.activated.connect(self.on_tray_icon_activated)
@@ -58,6 +101,17 @@ class RedmineMainWindow(QtWidgets.QWidget):
         self.redmine_url = "https://redmine.example.com"
         self.api_key = ""
         self.hotkey = "ctrl+shift+r"
+        self.timer_hotkey = "ctrl+shift+t"
+        self.text_formatting = "textile"
+        self.query_ttl = 300
+        self.query_ttls = {}
+        self.request_memo_ttl = CachingEngine.DEFAULT_MEMO_TTL
+        self.rate_limit = LIMITER.rate  # requests per second once a burst is used up
+        self.rate_burst = LIMITER.burst
+        self.max_concurrent_requests = LIMITER.concurrency
+        self.gravatar = False  # opt-in: sends a hash of every colleague's email to gravatar.com
+        self.pin_watched = False
+        self.time_report_team = []  # user ids whose time the report fetches, only ours when empty
         self.font_size = 10
         if os.path.exists(self.config_file):
             config.read(self.config_file)
@@ -66,10 +120,26 @@ class RedmineMainWindow(QtWidgets.QWidget):
                 self.api_key = config['Redmine'].get('api_key', self.api_key)
             if 'Settings' in config:
                 self.hotkey = config['Settings'].get('hotkey', self.hotkey)
+                self.timer_hotkey = config['Settings'].get('timer_hotkey', self.timer_hotkey)
+                self.text_formatting = config['Settings'].get('text_formatting', self.text_formatting)
                 self.font_size = config['Settings'].getint('font_size', self.font_size)
+                self.query_ttl = config['Settings'].getint('query_ttl', self.query_ttl)
+                self.request_memo_ttl = config['Settings'].getint('request_memo_ttl', self.request_memo_ttl)
+                self.rate_limit = config['Settings'].getfloat('rate_limit', self.rate_limit)
+                self.rate_burst = config['Settings'].getint('rate_burst', self.rate_burst)
+                self.max_concurrent_requests = config['Settings'].getint('max_concurrent_requests',
+                                                                         self.max_concurrent_requests)
+                self.gravatar = config['Settings'].getboolean('gravatar', self.gravatar)
+                self.pin_watched = config['Settings'].getboolean('pin_watched', self.pin_watched)
+                team = config['Settings'].get('time_report_team', '')
+                self.time_report_team = [int(user_id) for user_id in team.split(',') if user_id.strip()]
+            if 'QueryTTL' in config:
+                # Per saved query staleness, e.g. "mine = 60" or "42 = 1800" (seconds)
+                self.query_ttls = {key: config['QueryTTL'].getint(key) for key in config['QueryTTL']}
         else:
             config['Redmine'] = {'url': self.redmine_url, 'api_key': self.api_key}
-            config['Settings'] = {'hotkey': self.hotkey, 'font_size': str(self.font_size)}
+            config['Settings'] = {'hotkey': self.hotkey, 'timer_hotkey': self.timer_hotkey,
+                              'font_size': str(self.font_size)}
             with open(self.config_file, 'w') as f:
                 config.write(f)
             print(f"Default configuration file created at {self.config_file}")
@@ -77,30 +147,80 @@ class RedmineMainWindow(QtWidgets.QWidget):
     def save_config(self):
         config = configparser.ConfigParser()
         config['Redmine'] = {'url': self.redmine_url, 'api_key': self.api_key}
-        config['Settings'] = {'hotkey': self.hotkey, 'font_size': str(self.font_size)}
+        config['Settings'] = {'hotkey': self.hotkey, 'timer_hotkey': self.timer_hotkey,
+                              'text_formatting': self.text_formatting, 'font_size': str(self.font_size),
+                              'query_ttl': str(self.query_ttl), 'request_memo_ttl': str(self.request_memo_ttl),
+                              'rate_limit': str(self.rate_limit), 'rate_burst': str(self.rate_burst),
+                              'max_concurrent_requests': str(self.max_concurrent_requests),
+                              'gravatar': 'yes' if self.gravatar else 'no',
+                              'pin_watched': 'yes' if self.pin_watched else 'no',
+                              'time_report_team': ','.join(map(str, self.time_report_team))}
+        config['QueryTTL'] = {key: str(ttl) for key, ttl in self.query_ttls.items()}
         with open(self.config_file, 'w') as f:
             config.write(f)
 
     def init_redmine(self):
+        if not self.api_key:
+            print("API key not set.")
+            return None
+        LIMITER.configure(self.rate_limit, self.rate_burst, self.max_concurrent_requests)
+        LIMITER.gui_thread = threading.current_thread()  # requests made here fail instead of freezing the window
+        # Creating the client is offline, logging in happens in the background
+        self.redmine = Redmine(self.redmine_url, key=self.api_key,
+                               engine=CachingEngine, memo_ttl=self.request_memo_ttl)
+        self.api = RedmineApi(self.redmine)
+        self.names = NameLookup(self.redmine)
+        self.reconnect()
+        return True
+
+    def reconnect(self):
+        run_in_background(self.connect_redmine, on_done=self.on_connected, on_error=self.on_connection_failed)
+
+    def connect_redmine(self):
         try:
-            if not self.api_key:
-                print("API key not set.")
-                return None
-            self.redmine = Redmine(self.redmine_url, key=self.api_key)
-            self.current_user = self.redmine.user.get('current')
-            print(f"Connected to Redmine as {self.current_user.firstname} {self.current_user.lastname}")
-            return True
+            return self.redmine.user.get('current')
         except AuthError:
-            print("Authentication failed.")
-            return False
-        except Exception as e:
-            print(f"Failed to connect: {str(e)}")
-            return False
+            self.auth_failed = True
+            raise Exception("Authentication failed.")
+
+    def on_connected(self, user):
+        self.connect_attempts = 0
+        self.current_user = user
+        print(f"Connected to Redmine as {user.firstname} {user.lastname}")
+        self.status_label.setText(f'Connected as {user.firstname} {user.lastname}')
+        self.users.refresh()
+        self.pins.sync()
+        self.revalidate_session()
+
+    def on_connection_failed(self, error):
+        print(f"Failed to connect: {error}")
+        if self.auth_failed:
+            self.status_label.setText(f'Not connected: {error}')
+            return  # retrying a wrong key only gets it locked out
+        # Full jitter: clients that lost the server together don't come back together
+        delay = random.uniform(0, min(self.MAX_RECONNECT_DELAY, 2 * 2 ** self.connect_attempts))
+        delay = max(delay, LIMITER.paused_for())
+        self.connect_attempts += 1
+        self.reconnect_timer.start(int(delay * 1000))
+        self.status_label.setText(f'Not connected: {error}, retrying in {delay:.0f} s')
+
+    def revalidate_session(self):
+        ids = self.session.issue_ids()
+        if not ids:
+            return
+        run_in_background(self.api.list_issues, issue_id=','.join(map(str, ids)), status_id='*',
+                          on_done=self.on_session_revalidated,
+                          on_error=lambda e: print(f"Failed to revalidate session: {e}"))
+
+    def on_session_revalidated(self, records):
+        self.session.update_records(records)
+        self.current_issue = self.session.current_issue
+        self.show_current_issue()
 
     def init_ui(self):
         self.setWindowTitle('Redmine Helper')
         self.setWindowIcon(QtGui.QIcon('icon.ico'))
-        self.resize(650, 380)
+        self.resize(650, 520)
         self.setMinimumSize(650, 380)
         layout = QtWidgets.QVBoxLayout()
 
@@ -126,12 +246,43 @@ class RedmineMainWindow(QtWidgets.QWidget):
         self.settings_button.clicked.connect(self.show_settings)
         layout.addWidget(self.settings_button)
 
-        self.status_label = QtWidgets.QLabel(f'Connected as {self.current_user.firstname} {self.current_user.lastname}' if self.redmine else 'Not connected')
+        self.timer_button = QtWidgets.QPushButton('5. Start/stop timer (5)')
+        self.timer_button.setShortcut('5')
+        self.timer_button.clicked.connect(self.toggle_timer)
+        self.timer_button.setEnabled(False)
+        layout.addWidget(self.timer_button)
+
+        self.report_button = QtWidgets.QPushButton('6. Time report (6)')
+        self.report_button.setShortcut('6')
+        self.report_button.clicked.connect(self.show_time_report)
+        self.report_button.setEnabled(self.redmine is not None)
+        layout.addWidget(self.report_button)
+
+        self.status_label = QtWidgets.QLabel('Connecting...' if self.redmine else 'Not connected')
         layout.addWidget(self.status_label)
+        self.throttle_label = QtWidgets.QLabel()
+        self.throttle_label.hide()
+        layout.addWidget(self.throttle_label)
 
         self.issue_label = QtWidgets.QLabel('No issue selected')
         layout.addWidget(self.issue_label)
 
+        layout.addWidget(QtWidgets.QLabel('Recent issues (Ctrl+1..9):'))
+        self.recent_list = QtWidgets.QListWidget()
+        self.recent_list.itemActivated.connect(lambda item: self.switch_to_recent(self.recent_list.row(item)))
+        layout.addWidget(self.recent_list)
+        for number in range(1, SessionState.MRU_SIZE + 1):
+            QtWidgets.QShortcut(QtGui.QKeySequence(f"Ctrl+{number}"), self,
+                                lambda index=number - 1: self.switch_to_recent(index))
+
+        self.timer_label = QtWidgets.QLabel()
+        layout.addWidget(self.timer_label)
+        self.timer_refresh = QtCore.QTimer(self)
+        self.timer_refresh.timeout.connect(self.update_timer_label)
+        self.timer_refresh.timeout.connect(self.update_throttle_label)
+        self.timer_refresh.start(1000)
+        self.update_timer_label()
+
         self.hotkey_label = QtWidgets.QLabel(f'Press {self.hotkey} to toggle this window, Alt+H to hide')
         layout.addWidget(self.hotkey_label)
 
@@ -158,6 +309,7 @@ class RedmineMainWindow(QtWidgets.QWidget):
         self.hide()
 
     def quit(self):
+        self.time_tracker.shutdown()
         sys.exit(self)
 
     def closeEvent(self, event):
@@ -174,10 +326,18 @@ class RedmineMainWindow(QtWidgets.QWidget):
     def register_hotkey(self):
         """Register global hotkey for showing the application"""
         try:
-            # keyboard.remove_all_hotkeys()
-            # Register the new hotkey with a direct reference to toggle_window
-            keyboard.add_hotkey(self.hotkey, self.toggle_window)
+            # Drop the previous hotkeys, otherwise every settings change adds another hook
+            for remove in self.hotkey_handles:
+                try:
+                    keyboard.remove_hotkey(remove)
+                except (KeyError, ValueError):
+                    pass
+            self.hotkey_handles = []
+            self.hotkey_handles.append(keyboard.add_hotkey(self.hotkey, self.hotkey_pressed.emit))
             print(f"Hotkey registered: {self.hotkey}")
+            if self.timer_hotkey:
+                self.hotkey_handles.append(keyboard.add_hotkey(self.timer_hotkey, self.timer_hotkey_pressed.emit))
+                print(f"Timer hotkey registered: {self.timer_hotkey}")
 
             # Update the label
             if hasattr(self, 'hotkey_label'):
@@ -201,34 +361,161 @@ class RedmineMainWindow(QtWidgets.QWidget):
 
     def show_settings(self):
         dialog = SettingsDialog(self)
-        if dialog.exec_():
+        accepted = dialog.exec_()
+        dialog.deleteLater()
+        if accepted:
             self.font_size = dialog.font_size
             self.hotkey = dialog.hotkey
+            self.timer_hotkey = dialog.timer_hotkey
+            self.text_formatting = dialog.text_formatting
             self.apply_font_size()
             self.register_hotkey()
             self.save_config()
             self.hotkey_label.setText(f'Press {self.hotkey} to toggle this window, Alt+H to hide')
 
+    def show_time_report(self):
+        # Imported on first use, NumPy alone would add a tenth of a second to startup
+        import time_report
+        from dialogs.time_report_dialog import TimeReportDialog
+        if time_report.np is None:
+            QtWidgets.QMessageBox.warning(self, 'Time report', 'The time report needs NumPy (pip install numpy).')
+            return
+        if self.time_entries is None:
+            self.time_entries = time_report.TimeEntryStore(users=self.time_report_team)
+        user_id = self.current_user.id if self.current_user else None
+        dialog = TimeReportDialog(self, self.api, self.time_entries, user_id, self.font_size)
+        dialog.exec_()
+        dialog.deleteLater()
+
     def view_issue_details(self):
         if not self.current_issue:
             QtWidgets.QMessageBox.warning(self, 'No issue', 'No issue is currently selected.')
             return
-        dialog = IssueDetailsDialog(self, self.redmine, self.current_issue, self.font_size, self.redmine_url, self.api_key)
-        dialog.exec_()
+        # Non-modal, this window and the hotkey stay usable and several issues can be open side by side
+        return show_issue_window(self, self.redmine, self.current_issue, self.font_size, self.redmine_url, self.api_key,
+                                 self.text_formatting, self.store, self.names, self.users, self.pins)
 
     def change_issue_status(self):
         if not self.current_issue:
             QtWidgets.QMessageBox.warning(self, 'No issue', 'No issue is currently selected.')
             return
         dialog = ChangeStatusDialog(self, self.redmine, self.current_issue, self.font_size)
-        if dialog.exec_():
-            self.current_issue = dialog.updated_issue
-            self.issue_label.setText(f'Working on #{self.current_issue.id}: {self.current_issue.subject}')
+        accepted = dialog.exec_()
+        dialog.deleteLater()
+        if accepted:
+            self.query_cache.invalidate()
+            self.set_current_issue(dialog.updated_issue)
 
     def choose_issue(self):
-        dialog = ChooseIssueDialog(self, self.redmine, self.font_size, self.redmine_url, self.api_key)
-        if dialog.exec_():
-            self.current_issue = dialog.selected_issue
+        dialog = ChooseIssueDialog(self, self.redmine, self.font_size, self.redmine_url, self.api_key,
+                                   self.text_formatting, self.store, self.query_cache, self.session, self.names,
+                                   self.users, self.pins)
+        accepted = dialog.exec_()
+        dialog.deleteLater()
+        if accepted:
+            self.set_current_issue(dialog.selected_issue)
+
+    def switch_to_recent(self, index):
+        if 0 <= index < len(self.session.recent_issues):
+            self.set_current_issue(self.session.recent_issues[index])
+
+    def set_current_issue(self, issue):
+        self.current_issue = issue
+        self.session.set_current(issue)
+        self.time_tracker.switch(issue)
+        self.show_current_issue()
+
+    def handle_command(self, args, reply):
+        """Commands forwarded by later launches and redtoy_cli.py, answered from the warm state"""
+        command = args[0] if args else 'show'
+        if command == 'ping':
+            reply('pong')
+        elif command == 'show':
+            self.manually_hidden = False
+            self.show()
+            self.raise_()
+            self.activateWindow()
+            reply('ok')
+        elif command == 'pick':
+            self.show()
+            self.raise_()
+            self.activateWindow()
+            # The picker is modal, answer first so the client doesn't wait for the user
+            reply('ok')
+            QtCore.QTimer.singleShot(0, self.choose_issue)
+        elif command == 'current':
+            if self.current_issue:
+                reply(f'#{self.current_issue.id}: {self.current_issue.subject} [{self.current_issue.status_name}]')
+            else:
+                reply('none')
+        elif command == 'set-status':
+            if len(args) < 3 or not args[1].isdigit():
+                reply('error: usage: set-status <issue id> <status name>')
+            elif not self.redmine:
+                reply('error: not connected to Redmine')
+            else:
+                run_in_background(self.set_issue_status, int(args[1]), ' '.join(args[2:]),
+                                  on_done=lambda record: self.on_status_set(record, reply),
+                                  on_error=lambda e: reply(f'error: {e}'))
+        else:
+            reply(f'error: unknown command {command!r}, expected show, pick, current or set-status')
+
+    def set_issue_status(self, issue_id, status_name):
+        if self.statuses is None:
+            self.statuses = [(s['id'], s['name']) for s in self.api.statuses()]
+        matches = [status_id for status_id, name in self.statuses
+                   if name.lower() == status_name.lower() or str(status_id) == status_name]
+        if not matches:
+            raise Exception(f"unknown status {status_name!r}")
+        self.api.update_issue(issue_id, status_id=matches[0])
+        return self.api.get_issue_record(issue_id)
+
+    def on_status_set(self, record, reply):
+        self.query_cache.invalidate()
+        self.session.update_records([record])
+        if self.current_issue and self.current_issue.id == record.id:
+            self.current_issue = record
+        self.show_current_issue()
+        reply(f'#{record.id}: {record.subject} [{record.status_name}]')
+
+    def show_current_issue(self):
+        has_issue = self.current_issue is not None
+        if has_issue:
             self.issue_label.setText(f'Working on #{self.current_issue.id}: {self.current_issue.subject}')
-            self.view_button.setEnabled(True)
-            self.status_button.setEnabled(True)
+        self.view_button.setEnabled(has_issue)
+        self.status_button.setEnabled(has_issue)
+        self.timer_button.setEnabled(has_issue or self.time_tracker.is_running())
+        self.recent_list.clear()
+        for number, issue in enumerate(self.session.recent_issues, 1):
+            self.recent_list.addItem(f'Ctrl+{number}  #{issue.id}: {issue.subject} [{issue.status_name}]')
+
+    def toggle_timer(self):
+        if not self.time_tracker.is_running() and not self.current_issue:
+            QtWidgets.QMessageBox.warning(self, 'No issue', 'Choose an issue before starting the timer.')
+            return
+        self.time_tracker.toggle(self.current_issue)
+
+    def update_timer_label(self):
+        tracker = self.time_tracker
+        if tracker.is_running():
+            elapsed = int(tracker.elapsed())
+            text = f"Timer: #{tracker.active['issue_id']} {elapsed // 3600:02d}:{elapsed % 3600 // 60:02d}:{elapsed % 60:02d}"
+        else:
+            text = f'Timer stopped ({self.timer_hotkey} to start)'
+        if tracker.pending_count():
+            text += f' - {tracker.pending_count()} interval(s) not submitted yet'
+        if tracker.last_error:
+            text += ' (server unreachable, will retry)'
+        self.timer_label.setText(text)
+
+    def update_throttle_label(self):
+        waiting, active, paused = LIMITER.state()
+        if paused >= 1:
+            text = f'Redmine asked to slow down, requests paused for {paused:.0f} s'
+        elif waiting:
+            text = f'Throttling requests: {waiting} waiting, {active} in flight'
+        else:
+            self.throttle_label.hide()
+            return
+        self.throttle_label.setText(text)
+        self.throttle_label.show()
@@ -0,0 +1,127 @@
+"""Thin command line client for a running RedToy instance.
+
+    python redtoy_cli.py show
+    python redtoy_cli.py pick
+    python redtoy_cli.py current
+    python redtoy_cli.py set-status 123 Resolved
+
+Only the standard library is imported so the answer comes back in
+milliseconds from the already running instance.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import getpass
+import tempfile
+import threading
+
+ERROR_PIPE_BUSY = 231
+# set-status waits for Redmine, which may be slowed down by the rate limiter
+COMMAND_TIMEOUTS = {'set-status': 60.0}
+
+
+def server_address():
+    # Must match what the running instance listens on, see single_instance.CommandServer
+    name = f'redtoy-{getpass.getuser()}'
+    if os.name == 'nt':
+        return r'\\.\pipe' + '\\' + name
+    return os.path.join(tempfile.gettempdir(), name + '.sock')
+
+
+class NoReply(Exception):
+    """An instance is running but didn't answer in time"""
+
+
+def _pipe_exchange(address, request, deadline):
+    # Windows named pipe; a busy pipe (all instances serving) is retried until the deadline
+    while True:
+        try:
+            pipe = open(address, 'r+b', buffering=0)
+            break
+        except OSError as e:
+            if getattr(e, 'winerror', None) != ERROR_PIPE_BUSY or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+    with pipe:
+        pipe.write(request)
+        chunks = []
+        while True:
+            chunk = pipe.read(4096)
+            if not chunk:
+                return chunks
+            chunks.append(chunk)
+
+
+def _socket_exchange(address, request, deadline):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(max(deadline - time.monotonic(), 0.1))
+        sock.connect(address)
+        sock.sendall(request)
+        chunks = []
+        while True:
+            sock.settimeout(max(deadline - time.monotonic(), 0.1))
+            chunk = sock.recv(4096)
+            if not chunk:
+                return chunks
+            chunks.append(chunk)
+
+
+def send_command(args, timeout=5.0):
+    """Send a command to the running instance and return its reply, or None if nothing is running.
+
+    Only a missing or refusing socket means nothing is running; an instance
+    that doesn't answer within `timeout` raises NoReply, so callers never
+    start a second one next to it.
+    """
+    request = (json.dumps(list(args)) + '\n').encode('utf-8')
+    address = server_address()
+    deadline = time.monotonic() + timeout
+    exchange = _pipe_exchange if os.name == 'nt' else _socket_exchange
+    if os.name == 'nt':
+        # Pipe reads can't time out, the exchange runs on a thread we stop waiting for
+        result = {}
+
+        def run():
+            try:
+                result['chunks'] = exchange(address, request, deadline)
+            except OSError as e:
+                result['error'] = e
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            raise NoReply(f"RedToy didn't answer within {timeout:.0f} s")
+        error = result.get('error')
+        chunks = result.get('chunks')
+    else:
+        try:
+            chunks, error = exchange(address, request, deadline), None
+        except OSError as e:
+            error = e
+    if isinstance(error, (FileNotFoundError, ConnectionRefusedError)):
+        return None
+    if isinstance(error, socket.timeout):
+        raise NoReply(f"RedToy didn't answer within {timeout:.0f} s")
+    if error is not None:
+        raise NoReply(f"RedToy didn't answer: {error}")
+    return b''.join(chunks).decode('utf-8').rstrip('\n')
+
+
+def main(argv):
+    args = argv or ['show']
+    try:
+        reply = send_command(args, COMMAND_TIMEOUTS.get(args[0], 5.0))
+    except NoReply as e:
+        print(e)
+        return 1
+    if reply is None:
+        print("RedToy is not running, start it with main.py first.")
+        return 1
+    print(reply)
+    return 1 if reply.startswith('error:') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,321 @@
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from redminelib import exceptions
+from redminelib.engines.sync import SyncEngine
+
+try:
+    import orjson  # optional, decodes large issue lists several times faster
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Lists that can change when a resource of the given collection changes
+RELATED_COLLECTIONS = {'issues': ('search',)}
+
+
+class RateLimited(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket and a cap on concurrent requests, shared by every client in the process.
+
+    Up to `burst` requests go out back to back, which covers anything a user
+    does by hand, then `rate` per second. At most `concurrency` requests are
+    in flight at once; the others wait for a slot. When the server answers
+    429 or 503 with Retry-After, nothing is sent until that time has passed.
+
+    The thread set as gui_thread never waits: it skips the concurrency cap
+    and raises RateLimited when a request couldn't go out within GUI_MAX_WAIT.
+    """
+    GUI_MAX_WAIT = 0.25
+
+    def __init__(self, rate=8.0, burst=30, concurrency=4):
+        self.condition = threading.Condition()
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.active = 0
+        self.waiting = 0
+        self.paused_until = 0
+        self.gui_thread = None
+        self.stats = {'delayed': 0, 'retry_after': 0}
+
+    def configure(self, rate, burst, concurrency):
+        with self.condition:
+            self.rate = max(rate, 0.1)
+            self.burst = max(burst, 1)
+            self.concurrency = max(concurrency, 1)
+            self.tokens = min(self.tokens, self.burst)
+            self.condition.notify_all()
+
+    def acquire(self, slot=True):
+        """Wait until a request may go out; with slot, it counts against the concurrency cap until release()"""
+        gui = threading.current_thread() is self.gui_thread
+        with self.condition:
+            self.waiting += 1
+            delayed = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if now < self.paused_until:
+                        wait = self.paused_until - now
+                    elif self.tokens < 1:
+                        wait = (1 - self.tokens) / self.rate
+                    elif slot and self.active >= self.concurrency and not gui:
+                        wait = None  # until release() notifies
+                    else:
+                        break
+                    if gui and (wait > self.GUI_MAX_WAIT or delayed):
+                        raise RateLimited(f"Too many requests to Redmine, try again in {max(wait, 1):.0f} s")
+                    delayed = True
+                    self.condition.wait(wait)
+                self.tokens -= 1
+                if slot:
+                    self.active += 1
+                if delayed:
+                    self.stats['delayed'] += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pause(self, seconds):
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.stats['retry_after'] += 1
+
+    def paused_for(self):
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def state(self):
+        """(requests waiting, requests in flight, seconds until the server wants to hear from us again)"""
+        with self.condition:
+            return self.waiting, self.active, self.paused_for()
+
+
+# One limiter for the whole process: every engine and attachment download shares the server's patience
+LIMITER = RateLimiter()
+
+
+def retry_after(response, default):
+    """Seconds a 429/503 response asks us to wait, `default` if it doesn't say"""
+    value = response.headers.get('Retry-After', '').strip()
+    if value.isdigit():
+        return float(value)
+    if value:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+class _Pending:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class CachingEngine(SyncEngine):
+    """redminelib engine that shares GET responses between callers.
+
+    Identical GETs running at the same time (same url, params and headers) go
+    to the server once and every caller gets the answer. Responses are then
+    kept for `memo_ttl` seconds. PUT/POST/DELETE expire the entries of the
+    resource they touch and the lists it can appear in, e.g. updating
+    /issues/12.json expires /issues/12.json with any include and every issue
+    list, but nothing about projects or users. memo_ttl=0 disables the memo,
+    concurrent requests are still merged.
+
+    Past the memo time the last response is kept with its ETag/Last-Modified
+    and the next GET is conditional: a 304 reuses it instead of downloading
+    the same JSON again.
+
+    Whatever does go to the server passes the process-wide LIMITER first.
+    A GET answered with 429/503 is sent again once after the server's
+    Retry-After if that is at most MAX_RETRY_WAIT seconds away.
+    """
+    DEFAULT_MEMO_TTL = 10
+    VALIDATED_CAPACITY = 200  # responses kept for conditional requests
+    MAX_RETRY_WAIT = 30
+    DEFAULT_RETRY_AFTER = 5  # when a 429/503 doesn't say how long to wait
+
+    def __init__(self, **options):
+        self.memo_ttl = options.pop('memo_ttl', self.DEFAULT_MEMO_TTL)
+        super().__init__(**options)
+        self.lock = threading.Lock()
+        # request key -> {'expires', 'etag', 'last_modified', 'response'}, least recently used first
+        self.responses = OrderedDict()
+        self.pending = {}  # request key -> _Pending
+        self.stats = {'sent': 0, 'memo_hits': 0, 'coalesced': 0, 'not_modified': 0, 'bytes_received': 0}
+
+    def cacheable(self, method, data):
+        # Raw and ignored responses are streams, they can't be shared
+        return (method == 'get' and not data and not self.ignore_response
+                and self.return_response and not self.return_raw_response)
+
+    def send(self, method, url, **kwargs):
+        """One HTTP request through the rate limiter, waiting out Retry-After for GETs"""
+        for attempt in range(2):
+            with LIMITER.slot():
+                raw = self.session.request(method, url, **kwargs)
+            if raw.status_code not in (429, 503):
+                break
+            wait = retry_after(raw, self.DEFAULT_RETRY_AFTER)
+            LIMITER.pause(min(wait, 300))
+            print(f"Redmine asked to slow down ({raw.status_code}), pausing requests for {wait:.0f} s")
+            if method != 'get' or wait > self.MAX_RETRY_WAIT or threading.current_thread() is LIMITER.gui_thread:
+                break
+        return raw
+
+    def request(self, method, url, headers=None, params=None, data=None):
+        if not self.cacheable(method, data):
+            kwargs = self.construct_request_kwargs(method, headers, params, data)
+            response = self.process_response(self.send(method, url, **kwargs))
+            if method != 'get':
+                self.invalidate(url)
+            return response
+
+        key = (url, json.dumps(params or {}, sort_keys=True, default=str),
+               json.dumps(headers or {}, sort_keys=True, default=str))
+        with self.lock:
+            entry = self.responses.get(key)
+            if entry is not None:
+                self.responses.move_to_end(key)
+                if entry['expires'] > time.monotonic():
+                    self.stats['memo_hits'] += 1
+                    return copy.deepcopy(entry['response'])
+            pending = self.pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.pending[key] = _Pending()
+                self.stats['sent'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return copy.deepcopy(pending.response)
+
+        try:
+            response, entry = self.conditional_get(url, headers, params, entry)
+            pending.response = response
+            with self.lock:
+                # An invalidation while the request ran means the answer may already be outdated
+                if self.pending.get(key) is pending:
+                    entry['expires'] = time.monotonic() + self.memo_ttl
+                else:
+                    entry['expires'] = 0
+                if entry['etag'] or entry['last_modified'] or self.memo_ttl > 0:
+                    self.responses[key] = entry
+                    self.responses.move_to_end(key)
+                    while len(self.responses) > self.VALIDATED_CAPACITY:
+                        self.responses.popitem(last=False)
+            pending.response = entry['response']
+            return response
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.pending.get(key) is pending:
+                    del self.pending[key]
+            pending.done.set()
+
+    def request_uncached(self, method, url, headers=None, params=None, data=None):
+        """Bypass the caches for one-off bulk reads (exports) that would only evict useful entries"""
+        kwargs = self.construct_request_kwargs(method, headers, params, data)
+        return self.process_response(self.send(method, url, **kwargs))
+
+    def conditional_get(self, url, headers, params, entry):
+        """GET revalidating `entry` if it has validators, return (response, new entry)"""
+        kwargs = self.construct_request_kwargs('get', dict(headers or {}), params, None)
+        if entry is not None:
+            if entry['etag']:
+                kwargs['headers']['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                kwargs['headers']['If-Modified-Since'] = entry['last_modified']
+        raw = self.send('get', url, **kwargs)
+        self.stats['bytes_received'] += len(raw.content)
+        if raw.status_code == 304 and entry is not None:
+            self.stats['not_modified'] += 1
+            response = copy.deepcopy(entry['response'])
+        else:
+            response = self.process_response(raw)
+        # Copies are handed out, callers are free to modify what they get
+        return response, {'expires': 0, 'response': copy.deepcopy(response),
+                          'etag': raw.headers.get('ETag') or (entry or {}).get('etag'),
+                          'last_modified': raw.headers.get('Last-Modified') or (entry or {}).get('last_modified')}
+
+    def process_response(self, response):
+        if (response.status_code in (200, 201) and self.return_response and not self.return_raw_response
+                and not self.ignore_response and not response.history and response.content.strip()):
+            try:
+                return json_loads(response.content)
+            except ValueError:
+                raise exceptions.JSONDecodeError(response)
+        return super().process_response(response)
+
+    def invalidate(self, url):
+        """Forget responses that a change to `url` can make outdated"""
+        path = urlsplit(url).path
+        if path.endswith('.json'):
+            path = path[:-len('.json')]
+        parts = path.rstrip('/').split('/')
+        resources = []
+        collections = set()
+        for i, part in enumerate(parts):
+            if part.isdigit() and i > 0:
+                resources.append('/'.join(parts[:i + 1]))
+                collections.add(parts[i - 1])
+        if parts and not parts[-1].isdigit():
+            collections.add(parts[-1])
+        for collection in list(collections):
+            collections.update(RELATED_COLLECTIONS.get(collection, ()))
+
+        def affected(url):
+            stem = urlsplit(url).path
+            if stem.endswith('.json'):
+                stem = stem[:-len('.json')]
+            return (stem.rsplit('/', 1)[-1] in collections
+                    or any(stem == r or stem.startswith(r + '/') for r in resources))
+
+        with self.lock:
+            # Validators stay, the next GET asks the server whether anything changed
+            for key, entry in self.responses.items():
+                if affected(key[0]):
+                    entry['expires'] = 0
+            # Requests still running were sent before the change, don't memoize their answers
+            for key in [k for k in self.pending if affected(k[0])]:
+                del self.pending[key]
+
+    def clear(self):
+        with self.lock:
+            self.responses.clear()
+            self.pending.clear()
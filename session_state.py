@@ -0,0 +1,78 @@
+import os
+import json
+
+from issue_record import IssueRecord
+
+
+class SessionState:
+    """Current issue, recently used and pinned issues and picker settings, kept across restarts.
+
+    Everything here is restored before any network call, so the main window is
+    usable immediately and revalidated against Redmine afterwards.
+    """
+    MRU_SIZE = 9
+
+    def __init__(self, state_file='session.json'):
+        self.state_file = state_file
+        self.current_issue = None
+        self.recent_issues = []
+        self.pinned_issues = []
+        self.dismissed_pins = set()  # watched issues the user unpinned, not pinned again
+        self.picker = {'query': 'mine', 'filter': '', 'sort_column': None, 'sort_order': 0, 'queries': []}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            current = state.get('current_issue')
+            self.current_issue = IssueRecord(**current) if current else None
+            self.recent_issues = [IssueRecord(**r) for r in state.get('recent_issues', [])]
+            self.pinned_issues = [IssueRecord(**r) for r in state.get('pinned_issues', [])]
+            self.dismissed_pins = set(state.get('dismissed_pins', []))
+            self.picker.update(state.get('picker', {}))
+        except Exception as e:
+            print(f"Failed to load session state: {e}")
+
+    def save(self):
+        state = {
+            'current_issue': self.current_issue.to_dict() if self.current_issue else None,
+            'recent_issues': [r.to_dict() for r in self.recent_issues],
+            'pinned_issues': [r.to_dict() for r in self.pinned_issues],
+            'dismissed_pins': sorted(self.dismissed_pins),
+            'picker': self.picker,
+        }
+        tmp_file = self.state_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            print(f"Failed to save session state: {e}")
+
+    def set_current(self, record):
+        self.current_issue = record
+        self.recent_issues = [record] + [r for r in self.recent_issues if r.id != record.id]
+        del self.recent_issues[self.MRU_SIZE:]
+        self.save()
+
+    def update_records(self, records):
+        # Fresh copies from the server replace the stored ones, order stays as is
+        by_id = {r.id: r for r in records}
+        if self.current_issue and self.current_issue.id in by_id:
+            self.current_issue = by_id[self.current_issue.id]
+        self.recent_issues = [by_id.get(r.id, r) for r in self.recent_issues]
+        self.pinned_issues = [by_id.get(r.id, r) for r in self.pinned_issues]
+        self.save()
+
+    def issue_ids(self):
+        ids = [r.id for r in self.recent_issues]
+        if self.current_issue and self.current_issue.id not in ids:
+            ids.insert(0, self.current_issue.id)
+        return ids
+
+    def save_picker(self, **settings):
+        self.picker.update(settings)
+        self.save()
@@ -0,0 +1,76 @@
+import os
+import json
+
+from PyQt5 import QtCore, QtNetwork
+
+from redtoy_cli import server_address
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+class CommandServer(QtCore.QObject):
+    """Local socket owned by the first instance.
+
+    Later launches and redtoy_cli.py send a JSON list of arguments terminated by
+    a newline; handler(args, reply) answers by calling reply(text) once, either
+    right away or later from a worker callback. listen() raises AlreadyRunning
+    when another instance owns the name.
+    """
+
+    def __init__(self, handler, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.server = QtNetwork.QLocalServer(self)
+        self.server.setSocketOptions(QtNetwork.QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+
+    def listen(self):
+        address = server_address()
+        name = address if os.name != 'nt' else address.rsplit('\\', 1)[-1]
+        # Asked first: with access options Qt binds elsewhere and renames onto the name, which would
+        # silently take it from a live instance and make every later launch a duplicate
+        probe = QtNetwork.QLocalSocket()
+        probe.connectToServer(name)
+        if probe.waitForConnected(1000):
+            probe.disconnectFromServer()
+            raise AlreadyRunning(name)
+        if probe.error() not in (QtNetwork.QLocalSocket.ConnectionRefusedError,
+                                 QtNetwork.QLocalSocket.ServerNotFoundError):
+            raise AlreadyRunning(name)  # there, but too busy to accept
+        # Only a refused connection proves it dead, a crashed instance can leave its socket file behind
+        QtNetwork.QLocalServer.removeServer(name)
+        if self.server.listen(name):
+            return True
+        print(f"Failed to listen for commands: {self.server.errorString()}")
+        return False
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            buffer = bytearray()
+            connection.readyRead.connect(lambda c=connection, b=buffer: self.on_ready_read(c, b))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def on_ready_read(self, connection, buffer):
+        buffer.extend(bytes(connection.readAll()))
+        if b'\n' not in buffer:
+            return
+        line = bytes(buffer).split(b'\n', 1)[0]
+        connection.readyRead.disconnect()
+        try:
+            args = json.loads(line.decode('utf-8'))
+        except ValueError:
+            self.reply(connection, 'error: malformed command')
+            return
+        self.handler(args, lambda text, c=connection: self.reply(c, text))
+
+    @staticmethod
+    def reply(connection, text):
+        try:
+            connection.write((text + '\n').encode('utf-8'))
+            connection.flush()
+            connection.disconnectFromServer()
+        except RuntimeError:
+            pass  # the client gave up and the socket is gone
@@ -0,0 +1,130 @@
+import re
+import html
+from collections import OrderedDict
+
+from workers import run_in_background
+
+try:
+    import textile
+except ImportError:
+    textile = None
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+TEXT_FORMATTINGS = ['textile', 'markdown', 'common_mark', 'none']
+
+_PRE_BLOCK = re.compile(r'<pre>(.*?)</pre>|```[^\n]*\n(.*?)```', re.S)
+_TEXTILE_PRE = re.compile(r'<pre>(.*?)</pre>', re.S)
+_MARKDOWN_CODE = re.compile(r'^```[^\n]*\n.*?^```|(`+)[^\n]+?\1', re.S | re.M)
+
+
+def _render_plain(text):
+    # Escape everything but keep <pre> and fenced code blocks readable
+    parts = []
+    pos = 0
+    for match in _PRE_BLOCK.finditer(text):
+        parts.append(html.escape(text[pos:match.start()]).replace('\n', '<br>'))
+        code = match.group(1) if match.group(1) is not None else match.group(2)
+        parts.append(f'<pre>{html.escape(code)}</pre>')
+        pos = match.end()
+    parts.append(html.escape(text[pos:]).replace('\n', '<br>'))
+    return ''.join(parts)
+
+
+def _render_textile(text):
+    # Restricted mode escapes raw HTML like the server does, <pre> blocks still show as code
+    parts = []
+    pos = 0
+    for match in _TEXTILE_PRE.finditer(text):
+        parts.append(textile.textile_restricted(text[pos:match.start()], lite=False, noimage=False))
+        parts.append(f'<pre>{html.escape(match.group(1))}</pre>')
+        pos = match.end()
+    parts.append(textile.textile_restricted(text[pos:], lite=False, noimage=False))
+    return ''.join(parts)
+
+
+def _escape_markdown(text):
+    # Raw HTML is escaped before markdown sees it; code is left alone, markdown escapes that itself.
+    # '>' stays, it starts block quotes and can't open a tag on its own.
+    parts = []
+    pos = 0
+    for match in _MARKDOWN_CODE.finditer(text):
+        parts.append(text[pos:match.start()].replace('&', '&amp;').replace('<', '&lt;'))
+        parts.append(match.group(0))
+        pos = match.end()
+    parts.append(text[pos:].replace('&', '&amp;').replace('<', '&lt;'))
+    return ''.join(parts)
+
+
+def render_text(text, formatting='textile', base_url=''):
+    """Convert Redmine wiki text to HTML the way the server's text formatting setting would"""
+    if not text:
+        return ''
+    rendered = None
+    try:
+        if formatting == 'textile' and textile:
+            rendered = _render_textile(text)
+        elif formatting in ('markdown', 'common_mark') and markdown:
+            rendered = markdown.markdown(_escape_markdown(text), extensions=['fenced_code', 'tables', 'nl2br'])
+    except Exception as e:
+        print(f"Failed to render text as {formatting}: {e}")
+    if rendered is None:
+        rendered = _render_plain(text)
+    if base_url:
+        # Redmine links like /issues/123 are relative to the server
+        rendered = rendered.replace('href="/', f'href="{base_url.rstrip("/")}/')
+    return rendered
+
+
+class RenderCache:
+    """LRU of rendered HTML, keyed by (kind, id, updated_on)"""
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        html_text = self.entries.get(key)
+        if html_text is not None:
+            self.entries.move_to_end(key)
+        return html_text
+
+    def put(self, key, html_text):
+        self.entries[key] = html_text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+render_cache = RenderCache()
+
+
+def _render_all(items, formatting, base_url):
+    return {key: render_text(text, formatting, base_url) for key, text in items}
+
+
+def render_in_background(items, formatting, base_url, on_rendered, owner=None):
+    """Render (key, text) pairs, calling on_rendered(key, html) for each.
+
+    Cache hits are delivered immediately; the rest is rendered on a worker
+    thread and delivered in one batch when done, unless owner is gone by then.
+    """
+    missing = []
+    for key, text in items:
+        cached = render_cache.get((formatting,) + key)
+        if cached is not None:
+            on_rendered(key, cached)
+        else:
+            missing.append((key, text))
+    if not missing:
+        return None
+
+    def deliver(results):
+        for key, html_text in results.items():
+            render_cache.put((formatting,) + key, html_text)
+            on_rendered(key, html_text)
+
+    return run_in_background(_render_all, missing, formatting, base_url, on_done=deliver, owner=owner)
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import numpy as np  # optional, the time report is computed with it
+except ImportError:
+    np = None
+
+GROUPINGS = ('project', 'tracker', 'week', 'status', 'user', 'activity')
+RESYNC_DAYS = 14  # entries spent this long before the last fetch are fetched again, they may have been edited
+ISSUE_CHUNK = 100  # issue ids per request
+
+ENTRY_COLUMNS = {'id': 'int64', 'spent_on': 'datetime64[D]', 'hours': 'float64', 'user': 'int32',
+                 'project': 'int32', 'activity': 'int32', 'issue': 'int32'}
+ISSUE_COLUMNS = {'id': 'int32', 'tracker': 'int32', 'status': 'int32', 'estimated': 'float64'}
+
+
+def _id(value):
+    return value['id'] if value else 0
+
+
+def _columns(kinds, rows=()):
+    """Column name -> array from row tuples in the order of `kinds`"""
+    columns = list(zip(*rows)) or [()] * len(kinds)
+    return {name: np.array(values, dtype=kind) for (name, kind), values in zip(kinds.items(), columns)}
+
+
+def _take(columns, mask):
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def _concat(a, b):
+    return {name: np.concatenate([a[name], b[name]]) for name in a}
+
+
+class TimeEntryStore:
+    """Time entries and the estimates of their issues, kept column by column in NumPy arrays.
+
+    Reports are grouped with array operations over the columns, so changing
+    the period or the grouping doesn't touch Python objects per entry. The
+    columns are saved to an .npz file and fetching only asks the server for
+    what changed since the last time (see sync), and only for the time of
+    `users`: ids of the team, or just the current user ('me').
+    """
+
+    def __init__(self, path='time_entries.npz', users=()):
+        self.path = path
+        self.users = [str(user) for user in users] or ['me']
+        self.lock = threading.Lock()  # one sync at a time
+        self.entries = _columns(ENTRY_COLUMNS)
+        self.issues = _columns(ISSUE_COLUMNS)  # sorted by id
+        self.names = {kind: {} for kind in ('project', 'tracker', 'status', 'user', 'activity')}
+        self.covered = None  # (first day, last day) fetched, ISO dates
+        self.synced_on = None  # UTC time the last fetch started
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                entries = {name: data[f'entry_{name}'] for name in ENTRY_COLUMNS}
+                issues = {name: data[f'issue_{name}'] for name in ISSUE_COLUMNS}
+                meta = json.loads(str(data['meta']))
+        except Exception as e:
+            print(f"Failed to load time entries from {self.path}: {e}")
+            return
+        if meta.get('users') != self.users:
+            print(f"Time entries in {self.path} are for other users, fetching them again")
+            return
+        self.entries, self.issues = entries, issues
+        self.names = {kind: {int(k): v for k, v in names.items()} for kind, names in meta['names'].items()}
+        self.covered = tuple(meta['covered']) if meta['covered'] else None
+        self.synced_on = meta['synced_on']
+
+    def save(self):
+        arrays = {f'entry_{name}': values for name, values in self.entries.items()}
+        arrays.update({f'issue_{name}': values for name, values in self.issues.items()})
+        meta = {'names': self.names, 'covered': self.covered, 'synced_on': self.synced_on, 'users': self.users}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(temp_path, self.path)
+
+    def entry_count(self):
+        return len(self.entries['id'])
+
+    def ranges_to_fetch(self, start, end, full=False):
+        """Date ranges (inclusive ISO dates) to download so that start..end is complete and current"""
+        if full or self.covered is None:
+            return [(start, end)]
+        covered_start, covered_end = (date.fromisoformat(d) for d in self.covered)
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - timedelta(days=1)))
+        # Recent entries are still being logged and corrected, older ones are settled
+        recent = max(covered_start, date.fromisoformat(self.synced_on[:10]) - timedelta(days=RESYNC_DAYS))
+        if recent <= covered_end:
+            ranges.append((recent, covered_end))
+        if end > covered_end:
+            if ranges and ranges[-1][1] == covered_end:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((covered_end + timedelta(days=1), end))
+        return [(a.isoformat(), b.isoformat()) for a, b in ranges]
+
+    def sync(self, api, start, end, full=False):
+        """Bring start..end up to date, run on a worker; returns the number of entries downloaded"""
+        with self.lock:
+            synced_on = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            ranges = self.ranges_to_fetch(start, end, full)
+            rows = []
+            for range_start, range_end in ranges:
+                for user in self.users:
+                    for entry in api.iter_time_entries(range_start, range_end, user_id=user):
+                        rows.append((entry['id'], entry['spent_on'], entry['hours'], _id(entry.get('user')),
+                                     _id(entry.get('project')), _id(entry.get('activity')), _id(entry.get('issue'))))
+                        for kind in ('user', 'project', 'activity'):
+                            if entry.get(kind):
+                                self.names[kind][entry[kind]['id']] = entry[kind].get('name', '')
+            fetched = _columns(ENTRY_COLUMNS, rows)
+
+            # The fetched ranges replace what was stored for them, which also drops deleted entries
+            if full:
+                entries = fetched
+            else:
+                keep = np.ones(self.entry_count(), dtype=bool)
+                for range_start, range_end in ranges:
+                    spent_on = self.entries['spent_on']
+                    keep &= (spent_on < np.datetime64(range_start)) | (spent_on > np.datetime64(range_end))
+                entries = _concat(_take(self.entries, keep), fetched)
+            _, first = np.unique(entries['id'], return_index=True)  # a page shifted by new entries repeats some
+            entries = _take(entries, np.sort(first))
+
+            issues = self.sync_issues(api, entries, full)
+            if self.covered is None or full:
+                self.covered = (start, end)
+            else:
+                self.covered = (min(start, self.covered[0]), max(end, self.covered[1]))
+            self.synced_on = synced_on
+            self.entries, self.issues = entries, issues
+            self.save()
+            return len(rows)
+
+    def sync_issues(self, api, entries, full):
+        """Issue columns for the issues of `entries`: new ones fetched, changed ones refreshed"""
+        needed = np.unique(entries['issue'])
+        needed = needed[needed > 0]
+        issues = self.issues if not full else _columns(ISSUE_COLUMNS)
+        missing = np.setdiff1d(needed, issues['id'])
+        rows = {}
+        for offset in range(0, len(missing), ISSUE_CHUNK):
+            ids = ','.join(map(str, missing[offset:offset + ISSUE_CHUNK]))
+            for issue in api.iter_issues(issue_id=ids, status_id='*'):
+                rows[issue['id']] = issue
+        if self.synced_on and not full:
+            # Statuses and estimates of known issues change too, ask which of ours were updated since
+            known = np.intersect1d(issues['id'], needed)
+            for offset in range(0, len(known), ISSUE_CHUNK):
+                ids = ','.join(map(str, known[offset:offset + ISSUE_CHUNK]))
+                for issue in api.iter_issues(issue_id=ids, status_id='*', updated_on=f'>={self.synced_on}'):
+                    rows[issue['id']] = issue
+        for issue in rows.values():
+            for kind in ('tracker', 'status', 'project'):
+                if issue.get(kind):
+                    self.names[kind][issue[kind]['id']] = issue[kind].get('name', '')
+        fetched = _columns(ISSUE_COLUMNS, [(i['id'], _id(i.get('tracker')), _id(i.get('status')),
+                                            i.get('estimated_hours') or 0.0) for i in rows.values()])
+        issues = _concat(_take(issues, ~np.isin(issues['id'], fetched['id'])), fetched)
+        issues = _take(issues, np.isin(issues['id'], needed))  # issues no entry refers to anymore
+        return _take(issues, np.argsort(issues['id']))
+
+    def aggregate(self, by, start, end, user_id=None):
+        """Spent and estimated hours per `by` group over start..end (ISO dates, inclusive).
+
+        Returns (rows, seconds taken) with rows of (name, spent, estimated,
+        entry count), largest spent first, weeks in date order. An issue's
+        estimate counts once in every group it has time in.
+        """
+        began = time.perf_counter()
+        entries, issues = self.entries, self.issues  # sync swaps in new columns, never changes these
+        spent_on = entries['spent_on']
+        mask = (spent_on >= np.datetime64(start)) & (spent_on <= np.datetime64(end))
+        if user_id is not None:
+            mask &= entries['user'] == user_id
+        hours = entries['hours'][mask]
+        issue = entries['issue'][mask]
+
+        # Join entries to their issues by binary search in the sorted issue ids
+        issue_count = len(issues['id'])
+        position = np.minimum(np.searchsorted(issues['id'], issue), max(issue_count - 1, 0))
+        found = issues['id'][position] == issue if issue_count else np.zeros(len(issue), dtype=bool)
+
+        if by == 'week':
+            days = spent_on[mask].astype('int64')
+            keys = days - (days + 3) % 7  # the Monday, day 0 was a Thursday
+        elif by in ('tracker', 'status'):
+            keys = np.where(found, issues[by][position], 0) if issue_count else np.zeros(len(issue), dtype='int32')
+        else:
+            keys = entries[by][mask]
+
+        groups, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        spent = np.bincount(inverse, weights=hours, minlength=len(groups))
+        counts = np.bincount(inverse, minlength=len(groups))
+        pairs = np.unique(inverse[found].astype('int64') * max(issue_count, 1) + position[found])
+        estimated = np.bincount(pairs // max(issue_count, 1), weights=issues['estimated'][pairs % max(issue_count, 1)],
+                                minlength=len(groups)) if issue_count else np.zeros(len(groups))
+
+        order = np.arange(len(groups)) if by == 'week' else np.argsort(-spent, kind='stable')
+        names = self.names.get(by, {})
+        rows = []
+        for i in order:
+            key = int(groups[i])
+            if by == 'week':
+                name = f"Week of {np.datetime64(key, 'D')}"
+            else:
+                name = names.get(key, f'#{key}') if key else '(none)'
+            rows.append((name, float(spent[i]), float(estimated[i]), int(counts[i])))
+        return rows, time.perf_counter() - began
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import datetime
+import threading
+
+from PyQt5 import QtCore
+from redminelib.exceptions import ResourceNotFoundError
+
+from workers import run_in_background
+
+
+class TimeTracker(QtCore.QObject):
+    """Start/stop timer for the current issue.
+
+    Switching issues only closes the running interval in memory and writes the
+    small local state file. Closed intervals are coalesced per issue and day and
+    submitted to Redmine as one time entry each, in the background and with
+    retry, so nothing is lost while the server is unreachable. Today's time is
+    kept locally until the day is over or the app quits; the id of every entry
+    created is remembered, so time added to the same issue and day later (after
+    a restart) updates that entry instead of adding another.
+    """
+    state_changed = QtCore.pyqtSignal()
+
+    MIN_HOURS = 0.01
+    MAX_RETRY_DELAY = 3600
+    SHUTDOWN_WAIT = 10  # seconds quitting waits for today's entries to go out
+    KEEP_CREATED_DAYS = 7
+
+    def __init__(self, redmine, state_file='time_tracker.json', flush_interval=300, parent=None):
+        super().__init__(parent)
+        self.redmine = redmine
+        self.state_file = state_file
+        self.flush_interval = flush_interval
+        self.active = None  # {'issue_id', 'subject', 'start', 'last_seen'}
+        self.intervals = []  # closed intervals waiting for submission
+        self.created = {}  # "issue id|spent_on" -> {'id', 'hours'} of entries we created
+        self.flushing = False
+        self.retry_delay = 0
+        self.last_error = None
+        self.load()
+
+        self.flush_timer = QtCore.QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(self.flush_interval * 1000)
+
+        # Remember when we were last alive so a crash only loses the last minute
+        self.heartbeat_timer = QtCore.QTimer(self)
+        self.heartbeat_timer.timeout.connect(self.heartbeat)
+        self.heartbeat_timer.start(60 * 1000)
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"Failed to load time tracker state: {e}")
+            return
+        self.intervals = state.get('intervals', [])
+        self.created = state.get('created', {})
+        active = state.get('active')
+        if active:
+            # The process died with the timer running, close it at the last heartbeat
+            self.intervals.extend(self.split_by_day(active['issue_id'], active['start'], active['last_seen']))
+            self.save()
+
+    def save(self):
+        state = {'active': self.active, 'intervals': self.intervals, 'created': self.created}
+        tmp_file = self.state_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            print(f"Failed to save time tracker state: {e}")
+
+    def heartbeat(self):
+        if self.active:
+            self.active['last_seen'] = time.time()
+            self.save()
+
+    def is_running(self):
+        return self.active is not None
+
+    def elapsed(self):
+        if not self.active:
+            return 0
+        return time.time() - self.active['start']
+
+    def pending_count(self):
+        return len(self.intervals)
+
+    def start(self, issue):
+        if self.active and self.active['issue_id'] == issue.id:
+            return
+        now = time.time()
+        self._close_active(now)
+        self.active = {'issue_id': issue.id, 'subject': issue.subject, 'start': now, 'last_seen': now}
+        self.save()
+        self.state_changed.emit()
+
+    def stop(self):
+        if not self.active:
+            return
+        self._close_active(time.time())
+        self.save()
+        self.state_changed.emit()
+
+    def toggle(self, issue):
+        if self.active:
+            self.stop()
+        elif issue:
+            self.start(issue)
+
+    def switch(self, issue):
+        # Follow the current issue only while the timer is running
+        if self.active:
+            self.start(issue)
+
+    def _close_active(self, now):
+        if self.active:
+            self.intervals.extend(self.split_by_day(self.active['issue_id'], self.active['start'], now))
+            self.active = None
+
+    @staticmethod
+    def split_by_day(issue_id, start, end):
+        # Time entries are per day, so intervals crossing midnight are split
+        intervals = []
+        while start < end:
+            day = datetime.date.fromtimestamp(start)
+            midnight = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).timestamp()
+            chunk_end = min(end, midnight)
+            intervals.append({'issue_id': issue_id, 'spent_on': day.isoformat(), 'start': start, 'end': chunk_end})
+            start = chunk_end
+        return intervals
+
+    def coalesce(self, intervals, include_today=False):
+        totals = {}
+        for interval in intervals:
+            key = (interval['issue_id'], interval['spent_on'])
+            totals[key] = totals.get(key, 0) + interval['end'] - interval['start']
+        today = datetime.date.today().isoformat()
+        entries = []
+        for (issue_id, spent_on), seconds in sorted(totals.items()):
+            if spent_on >= today and not include_today:
+                continue  # the day isn't over, more time for this issue may come
+            hours = round(seconds / 3600.0, 2)
+            created = self.created.get(f'{issue_id}|{spent_on}')
+            entries.append({'issue_id': issue_id, 'spent_on': spent_on, 'hours': hours,
+                            'entry_id': created and created['id'], 'total': hours + (created['hours'] if created else 0)})
+        return entries
+
+    def flush(self):
+        if self.flushing or not self.intervals or not self.redmine:
+            self._schedule_flush()
+            return
+        batch = list(self.intervals)
+        entries = self.coalesce(batch)
+        if not entries:
+            self._schedule_flush()
+            return
+        self.flushing = True
+        run_in_background(self._submit, entries,
+                          on_done=lambda result: self._on_submitted(batch, result))
+
+    def _submit(self, entries):
+        submitted = []
+        error = None
+        for entry in entries:
+            if entry['hours'] < self.MIN_HOURS:
+                submitted.append(entry)  # nothing worth recording, just drop it
+                continue
+            try:
+                if entry['entry_id']:
+                    try:
+                        self.redmine.time_entry.update(entry['entry_id'], hours=round(entry['total'], 2))
+                        submitted.append(entry)
+                        continue
+                    except ResourceNotFoundError:
+                        entry = dict(entry, total=entry['hours'])  # deleted on the server, start a new one
+                created = self.redmine.time_entry.create(issue_id=entry['issue_id'], spent_on=entry['spent_on'],
+                                                         hours=entry['hours'], comments='Tracked with RedToy')
+                submitted.append(dict(entry, entry_id=created.id))
+            except Exception as e:
+                error = str(e)
+                break
+        return submitted, error
+
+    def _on_submitted(self, batch, result):
+        submitted, error = result
+        self.flushing = False
+        done_keys = {(e['issue_id'], e['spent_on']) for e in submitted}
+        for entry in submitted:
+            if entry['entry_id']:
+                self.created[f"{entry['issue_id']}|{entry['spent_on']}"] = {'id': entry['entry_id'],
+                                                                            'hours': entry['total']}
+        oldest = (datetime.date.today() - datetime.timedelta(days=self.KEEP_CREATED_DAYS)).isoformat()
+        self.created = {key: value for key, value in self.created.items() if key.split('|')[1] >= oldest}
+        batch_ids = {id(i) for i in batch}
+        # Intervals closed while we were submitting are not in the batch and stay pending
+        remaining = [i for i in self.intervals
+                     if id(i) not in batch_ids or (i['issue_id'], i['spent_on']) not in done_keys]
+        self.intervals = remaining
+        self.save()
+
+        if error:
+            self.last_error = error
+            self.retry_delay = min(max(self.retry_delay * 2, 30), self.MAX_RETRY_DELAY)
+            print(f"Failed to submit time entries, retrying in {self.retry_delay}s: {error}")
+        else:
+            self.last_error = None
+            self.retry_delay = 0
+        self.state_changed.emit()
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        delay = self.retry_delay or self.flush_interval
+        self.flush_timer.start(delay * 1000)
+
+    def shutdown(self):
+        self.stop()
+        self.save()
+        # Today's time goes out now, waiting a little; what doesn't make it is sent on the next start
+        if self.flushing or not self.intervals or not self.redmine:
+            return
+        self.flush_timer.stop()
+        batch = list(self.intervals)
+        entries = self.coalesce(batch, include_today=True)
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(done=self._submit(entries)), daemon=True)
+        thread.start()
+        thread.join(self.SHUTDOWN_WAIT)
+        if 'done' in result:
+            self._on_submitted(batch, result['done'])
@@ -0,0 +1,349 @@
+"""Soak test for RedToy: thousands of hotkey toggles and dialog opens in one process.
+
+Runs the real main window (offscreen unless QT_QPA_PLATFORM says otherwise)
+against a local stand-in Redmine server, and cycles through the things a tray
+process does for weeks: toggling the window with the global hotkey, opening
+issue details (and a log attachment), changing a status, opening the issue
+picker and saving the settings, which registers the hotkeys again.
+
+Every --sample iterations it records RSS, live Qt objects, Python objects,
+open file handles and registered hotkeys. After the warm-up, growth past the
+budgets fails the run with exit code 1.
+
+The global keyboard hook is simulated: keyboard.add_hotkey/remove_hotkey are
+replaced by a registry whose callbacks are fired from a separate thread, the
+way the keyboard listener does, so the test neither needs nor grabs the real
+keyboard.
+
+    python tools/soak_test.py
+    python tools/soak_test.py --iterations 5000 --sample 250
+"""
+import os
+import re
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ISSUE_COUNT = 50
+STATUSES = [{'id': 1, 'name': 'New'}, {'id': 2, 'name': 'In Progress'}, {'id': 3, 'name': 'Resolved'}]
+# metric -> default allowed growth between the end of the warm-up and the end of the run
+BUDGETS = {'rss_mb': 40, 'qt_objects': 50, 'widgets': 20, 'python_objects': 50000, 'open_files': 10, 'hotkeys': 0}
+
+try:
+    import psutil  # optional, the only way to count handles on Windows
+except ImportError:
+    psutil = None
+
+
+def issue_data(issue_id, full=False):
+    issue = {'id': issue_id, 'subject': f'Issue {issue_id}', 'description': f'Description of *{issue_id}*',
+             'status': STATUSES[issue_id % 3], 'priority': {'id': 2, 'name': 'Normal'},
+             'project': {'id': 1, 'name': 'Soak'}, 'tracker': {'id': 1, 'name': 'Bug'},
+             'author': {'id': 5, 'name': 'Ann Author'}, 'assigned_to': {'id': 7, 'name': 'Bob Dev'},
+             'created_on': '2024-01-01T00:00:00Z', 'updated_on': '2024-02-01T00:00:00Z'}
+    if full:
+        issue['journals'] = [{'id': issue_id * 10 + k, 'user': {'id': 7, 'name': 'Bob Dev'}, 'notes': f'note {k}',
+                              'created_on': '2024-01-02T00:00:00Z',
+                              'details': [{'property': 'attr', 'name': 'status_id', 'old_value': '1',
+                                           'new_value': '2'}]} for k in range(3)]
+        issue['attachments'] = [{'id': 1000 + issue_id, 'filename': 'app.log', 'filesize': len(LOG_BODY),
+                                 'content_type': 'text/plain', 'author': {'id': 5, 'name': 'Ann Author'},
+                                 'created_on': '2024-01-01T00:00:00Z'}]
+    return issue
+
+
+LOG_BODY = b''.join(b'2024-01-01 12:00:00 INFO line %d\n' % n for n in range(5000))
+
+
+class StandInRedmine(BaseHTTPRequestHandler):
+    """Just enough of the Redmine REST API for the main window and its dialogs"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, code=200, content_type='application/json'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, code=200):
+        self.send_body(json.dumps(data).encode('utf-8'), code)
+
+    def listing(self, name, items):
+        return self.send_json({name: items, 'total_count': len(items), 'offset': 0, 'limit': 100})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        if path == '/users/current.json':
+            return self.send_json({'user': {'id': 7, 'firstname': 'Bob', 'lastname': 'Dev', 'login': 'bob'}})
+        match = re.match(r'/users/(\d+)\.json', path)
+        if match:
+            return self.send_json({'user': {'id': int(match[1]), 'firstname': 'User', 'lastname': match[1]}})
+        if path == '/issues.json':
+            ids = list(range(ISSUE_COUNT, 0, -1))
+            if 'issue_id' in query and query['issue_id'][:1].isdigit():
+                ids = [int(i) for i in query['issue_id'].split(',') if int(i) <= ISSUE_COUNT]
+            offset, limit = int(query.get('offset', 0)), int(query.get('limit', 25))
+            return self.send_json({'issues': [issue_data(i) for i in ids[offset:offset + limit]],
+                                   'total_count': len(ids), 'offset': offset, 'limit': limit})
+        match = re.match(r'/issues/(\d+)\.json', path)
+        if match:
+            return self.send_json({'issue': issue_data(int(match[1]), full=True)})
+        if path.startswith('/attachments/download/'):
+            return self.send_body(LOG_BODY, content_type='text/plain')
+        lists = {
+            '/issue_statuses.json': ('issue_statuses', STATUSES),
+            '/trackers.json': ('trackers', [{'id': 1, 'name': 'Bug'}]),
+            '/enumerations/issue_priorities.json': ('issue_priorities', [{'id': 2, 'name': 'Normal'}]),
+            '/projects.json': ('projects', [{'id': 1, 'name': 'Soak', 'identifier': 'soak'}]),
+            '/queries.json': ('queries', [{'id': 1, 'name': 'Soak query', 'is_public': True}]),
+            '/projects/1/memberships.json': ('memberships', [{'user': {'id': 5, 'name': 'Ann Author'}},
+                                                            {'user': {'id': 7, 'name': 'Bob Dev'}}]),
+            '/projects/1/versions.json': ('versions', []),
+            '/time_entries.json': ('time_entries', []),
+            '/search.json': ('results', []),
+        }
+        if path in lists:
+            return self.listing(*lists[path])
+        return self.send_json({}, 404)
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_body(b'', 204)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/uploads'):
+            return self.send_json({'upload': {'token': 'soak'}}, 201)
+        return self.send_json({'time_entry': {'id': 1}}, 201)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # the app dropping a connection it no longer needs is not a failure
+
+
+class SimulatedHotkeys:
+    """Stands in for keyboard.add_hotkey/remove_hotkey and counts what is registered"""
+
+    def __init__(self):
+        self.registered = {}  # remover -> (hotkey, callback)
+
+    def install(self, keyboard):
+        keyboard.add_hotkey = self.add_hotkey
+        keyboard.remove_hotkey = self.remove_hotkey
+
+    def add_hotkey(self, hotkey, callback, *args, **kwargs):
+        def remove():
+            del self.registered[remove]
+        self.registered[remove] = (hotkey, callback)
+        return remove
+
+    def remove_hotkey(self, hotkey_or_remover):
+        if hotkey_or_remover in self.registered:
+            return hotkey_or_remover()
+        for remove, (hotkey, callback) in list(self.registered.items()):
+            if hotkey_or_remover in (hotkey, callback):
+                return remove()
+        raise KeyError(hotkey_or_remover)
+
+    def press(self, hotkey):
+        # The keyboard listener calls back from its own thread
+        callbacks = [callback for key, callback in self.registered.values() if key == hotkey]
+        thread = threading.Thread(target=lambda: [callback() for callback in callbacks])
+        thread.start()
+        thread.join()
+
+
+def open_files():
+    if psutil:
+        process = psutil.Process()
+        return process.num_handles() if os.name == 'nt' else process.num_fds()
+    if os.path.isdir('/proc/self/fd'):
+        return len(os.listdir('/proc/self/fd'))
+    return None
+
+
+def rss_mb():
+    if psutil:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Soak:
+    def __init__(self, app, window, hotkeys, QtCore, QtWidgets):
+        self.app = app
+        self.window = window
+        self.hotkeys = hotkeys
+        self.QtCore = QtCore
+        self.QtWidgets = QtWidgets
+        self.samples = []
+
+    def pump(self, ms=0):
+        # Deferred deletes only run from the event loop, flush them every time
+        deadline = time.time() + ms / 1000.0
+        while True:
+            self.app.processEvents()
+            self.app.sendPostedEvents(None, self.QtCore.QEvent.DeferredDelete)
+            if time.time() >= deadline:
+                break
+            time.sleep(0.005)
+
+    def close_dialog_soon(self, before_close=None, delay=30):
+        """Close the modal dialog the next action opens, after letting its workers start"""
+        def close():
+            dialog = self.app.activeModalWidget()
+            if dialog is None:
+                self.QtCore.QTimer.singleShot(10, close)
+                return
+            if before_close:
+                before_close(dialog)
+            if dialog.isVisible():
+                dialog.reject()
+        self.QtCore.QTimer.singleShot(delay, close)
+
+    def view_log(self, dialog):
+        attachments = dialog.issue.get('attachments') or []
+        if attachments:
+            dialog.view_attachment(attachments[0])
+
+    def step(self, iteration):
+        from issue_record import IssueRecord
+        window = self.window
+        self.hotkeys.press(window.hotkey)
+        self.pump()
+        if iteration % 5 == 0:
+            # Issue windows are non-modal, two open side by side and close after loading
+            windows = []
+            for offset in (1, 2):
+                # Built here: requests from the GUI thread fail instead of waiting for the rate limiter
+                window.current_issue = IssueRecord.from_dict(issue_data((iteration + offset) % ISSUE_COUNT + 1))
+                windows.append(window.view_issue_details())
+            self.pump(30)
+            for dialog in windows:
+                if iteration % 10 == 0 and dialog.issue is not None:
+                    self.view_log(dialog)
+                dialog.close()
+        if iteration % 7 == 0:
+            self.close_dialog_soon()
+            window.choose_issue()
+        if iteration % 11 == 0 and window.current_issue:
+            self.close_dialog_soon()
+            window.change_issue_status()
+        if iteration % 13 == 0:
+            self.close_dialog_soon(lambda dialog: dialog.accepted())  # OK, as if a setting changed
+            window.show_settings()
+        self.pump()
+
+    def sample(self, iteration):
+        # Let workers finish and their results arrive before counting
+        self.pump(200)
+        gc.collect()
+        sample = {
+            'iteration': iteration,
+            'rss_mb': rss_mb(),
+            'qt_objects': len(self.window.findChildren(self.QtCore.QObject)) + len(self.app.topLevelWidgets()),
+            'widgets': len(self.app.allWidgets()),
+            'python_objects': len(gc.get_objects()),
+            'open_files': open_files(),
+            'hotkeys': len(self.hotkeys.registered),
+        }
+        self.samples.append(sample)
+        print('  '.join(f"{key} {value:8.1f}" if isinstance(value, float) else f"{key} {value}"
+                        for key, value in sample.items() if value is not None), flush=True)
+
+
+def check_growth(samples, warmup, budgets):
+    """Growth of every metric from the first sample after the warm-up to the last one"""
+    after = [s for s in samples if s['iteration'] >= warmup]
+    if len(after) < 2:
+        return ["not enough samples after the warm-up, run more iterations"]
+    failures = []
+    for metric, budget in budgets.items():
+        first, last = after[0].get(metric), after[-1].get(metric)
+        if first is None or last is None:
+            continue
+        growth = last - first
+        if growth > budget:
+            failures.append(f"{metric} grew by {growth:.1f} (budget {budget}) between iteration "
+                            f"{after[0]['iteration']} and {after[-1]['iteration']}")
+    return failures
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--sample', type=int, default=100, help='iterations between samples (default 100)')
+    parser.add_argument('--warmup', type=float, default=0.2, help='share of the run ignored for growth (default 0.2)')
+    for metric, budget in BUDGETS.items():
+        parser.add_argument(f"--max-{metric.replace('_', '-')}", type=float, default=budget,
+                            help=f'allowed growth of {metric} after the warm-up (default {budget})')
+    args = parser.parse_args(argv)
+    budgets = {metric: getattr(args, f'max_{metric}') for metric in BUDGETS}
+
+    server = StandInServer(('127.0.0.1', 0), StandInRedmine)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp(prefix='redtoy-soak-')
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        with open('config.cfg', 'w') as f:
+            f.write(f'[Redmine]\nurl = http://127.0.0.1:{server.server_address[1]}\napi_key = soak\n\n'
+                    '[Settings]\nhotkey = ctrl+shift+r\ntimer_hotkey = ctrl+shift+t\nfont_size = 10\n')
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        sys.path.insert(0, ROOT)
+        import keyboard
+        hotkeys = SimulatedHotkeys()
+        hotkeys.install(keyboard)
+        from PyQt5 import QtCore, QtWidgets
+        app = QtWidgets.QApplication(sys.argv[:1])
+        QtWidgets.QMessageBox.information = lambda *a, **k: QtWidgets.QMessageBox.Ok  # status changes confirm
+        from redmine_main_window import RedmineMainWindow
+        window = RedmineMainWindow()
+        soak = Soak(app, window, hotkeys, QtCore, QtWidgets)
+        soak.pump(1500)  # connect and register the hotkeys
+
+        started = time.time()
+        for iteration in range(args.iterations + 1):
+            if iteration % args.sample == 0:
+                soak.sample(iteration)
+            soak.step(iteration)
+        print(f"\n{args.iterations} iterations in {time.time() - started:.0f} s")
+        failures = check_growth(soak.samples, args.iterations * args.warmup, budgets)
+        window.time_tracker.shutdown()
+        window.store.conn.close()
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print("\nUnbounded growth:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nNo growth past the budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+"""Startup benchmark for RedToy, as a script and as the frozen build from build.bat.
+
+Measures time from launch to the first painted window and to tray-ready, cold
+(first run, nothing compiled or unpacked yet) and warm (median of later runs),
+and breaks the script's startup down per imported package with -X importtime.
+Fails with exit code 1 when a budget from startup_budget.cfg is exceeded.
+
+    python tools/startup_benchmark.py
+    python tools/startup_benchmark.py --exe output/RedToy.exe --runs 5
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import configparser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MILESTONES = ['first-window', 'tray-ready']
+
+
+def launch(command, workdir, env, timeout):
+    """Start RedToy once and return ({milestone: seconds since launch}, stderr)"""
+    env = dict(env, REDTOY_STARTUP_PROBE='1')
+    started = time.time()
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+    marks = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == 'STARTUP':
+            marks[parts[1]] = float(parts[2]) - started
+    missing = [m for m in MILESTONES if m not in marks]
+    if missing:
+        raise RuntimeError(f"{' '.join(command)} exited without reporting {', '.join(missing)}:\n"
+                           f"{result.stdout}\n{result.stderr}")
+    return marks, result.stderr
+
+
+def parse_importtime(stderr):
+    """Import time in ms per root package, summing the self time of all its modules"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000.0
+    return packages
+
+
+def benchmark(label, command, runs, timeout, env=None, pycache=False):
+    """Run one cold and `runs` warm launches in a fresh working directory"""
+    env = dict(env or os.environ)
+    workdir = tempfile.mkdtemp(prefix='redtoy-bench-')
+    try:
+        # Empty API key: measure local startup, not the Redmine server
+        with open(os.path.join(workdir, 'config.cfg'), 'w') as f:
+            f.write('[Redmine]\nurl = https://redmine.example.com\napi_key = \n')
+        if pycache:
+            # A private bytecode cache makes the first run a real cold start
+            env['PYTHONPYCACHEPREFIX'] = os.path.join(workdir, 'pycache')
+        cold, stderr = launch(command, workdir, env, timeout)
+        warm_runs = [launch(command, workdir, env, timeout) for _ in range(runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    warm = {m: statistics.median(r[0][m] for r in warm_runs) for m in MILESTONES}
+    imports = {}
+    for _, run_stderr in warm_runs:
+        for name, ms in parse_importtime(run_stderr).items():
+            imports.setdefault(name, []).append(ms)
+    imports = {name: statistics.median(values) for name, values in imports.items()}
+
+    print(f"\n{label}")
+    for milestone in MILESTONES:
+        print(f"  {milestone:<14} cold {cold[milestone] * 1000:8.0f} ms   warm {warm[milestone] * 1000:8.0f} ms")
+    return {'cold': cold, 'warm': warm, 'imports': imports}
+
+
+def print_imports(imports, top):
+    if not imports:
+        return
+    print(f"\nSlowest imports by package (warm, top {top}):")
+    for name, ms in sorted(imports.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+def check_budgets(budget_file, results):
+    """Compare against startup_budget.cfg, return the list of exceeded budgets"""
+    config = configparser.ConfigParser()
+    config.optionxform = str  # module names are case sensitive
+    config.read(budget_file)
+    failures = []
+    for section in ('script', 'frozen'):
+        if section not in results or section not in config:
+            continue
+        for key, limit in config[section].items():
+            # keys look like first_window_warm_ms
+            milestone, kind = key.rsplit('_', 2)[0].replace('_', '-'), key.rsplit('_', 2)[1]
+            measured = results[section][kind][milestone] * 1000
+            if measured > float(limit):
+                failures.append(f"{section} {milestone} ({kind}): {measured:.0f} ms > {limit} ms")
+    if 'modules' in config and 'script' in results:
+        for name, limit in config['modules'].items():
+            measured = results['script']['imports'].get(name)
+            if measured is not None and measured > float(limit):
+                failures.append(f"import {name}: {measured:.0f} ms > {limit} ms")
+    return failures
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='warm runs per target (default 3)')
+    parser.add_argument('--exe', default=os.path.join(ROOT, 'output', 'RedToy.exe'),
+                        help='frozen build to measure, skipped if missing')
+    parser.add_argument('--budget-file', default=os.path.join(ROOT, 'tools', 'startup_budget.cfg'))
+    parser.add_argument('--top', type=int, default=15, help='number of packages to list')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args(argv)
+
+    results = {}
+    script = [sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py')]
+    results['script'] = benchmark('Script (python main.py)', script, args.runs, args.timeout, pycache=True)
+    if os.path.exists(args.exe):
+        results['frozen'] = benchmark(f'Frozen build ({args.exe})', [os.path.abspath(args.exe)],
+                                      args.runs, args.timeout)
+    else:
+        print(f"\nFrozen build not found at {args.exe}, run build.bat first to measure it")
+    print_imports(results['script']['imports'], args.top)
+
+    failures = check_budgets(args.budget_file, results)
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll startup budgets met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
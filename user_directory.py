@@ -0,0 +1,234 @@
+import time
+import hashlib
+from collections import OrderedDict
+
+import requests
+from PyQt5 import QtCore, QtGui
+from redminelib.exceptions import ForbiddenError, ResourceNotFoundError
+
+from redmine_api import RedmineApi
+from workers import run_in_background
+
+AVATAR_COLORS = ['#c0392b', '#d35400', '#27ae60', '#16a085', '#2980b9', '#8e44ad', '#2c3e50', '#7f8c8d']
+
+
+def fetch_users(api, user_ids):
+    """Login and mail of users, run on a worker.
+
+    Administrators get everybody from /users.json in a few pages; everyone
+    else falls back to /users/:id for the ids we asked about.
+    """
+    try:
+        return api.list_all('/users.json', 'users')
+    except (ForbiddenError, ResourceNotFoundError):
+        pass
+    users = []
+    for user_id in user_ids:
+        try:
+            users.append(api.get(f'/users/{user_id}.json')['user'])
+        except Exception as e:
+            print(f"Failed to fetch user #{user_id}: {e}")
+            users.append({'id': user_id})  # don't ask again before the TTL
+    return users
+
+
+def fetch_avatars(mails):
+    """Gravatar images for {user id: mail}, run on a worker; None where there is none"""
+    avatars = {}
+    for user_id, mail in mails.items():
+        digest = hashlib.md5(mail.strip().lower().encode('utf-8')).hexdigest()
+        try:
+            response = requests.get(f'https://www.gravatar.com/avatar/{digest}?s=64&d=404', timeout=10)
+            avatars[user_id] = response.content if response.status_code == 200 else None
+        except requests.RequestException as e:
+            print(f"Failed to fetch avatar of user #{user_id}: {e}")
+    return avatars
+
+
+class UserDirectory(QtCore.QObject):
+    """Names, logins and avatars of the people shown in journals and the picker.
+
+    Kept in the local store, so people show up without a network fetch; users
+    not refreshed for TTL seconds are fetched again in the background. Avatars
+    come from Gravatar when the user's mail is visible to us, otherwise their
+    initials are drawn locally. Images are decoded once per size and the
+    scaled pixmaps kept in an LRU.
+    """
+    updated = QtCore.pyqtSignal()
+
+    TTL = 86400
+    AVATAR_CACHE_SIZE = 300
+    REFRESH_BATCH = 50  # users fetched one by one per refresh, for non-admins
+
+    def __init__(self, redmine, store, gravatar=False, parent=None):
+        super().__init__(parent)
+        self.api = RedmineApi(redmine) if redmine else None
+        self.store = store
+        self.gravatar = gravatar
+        self.users = store.load_users() if store else {}
+        self.pixmaps = OrderedDict()  # (user id, size) -> QPixmap, least recently used first
+        self.refreshing = False
+        self.wanted_avatars = set()
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(3600 * 1000)
+        # New people are looked up shortly after they first appear, in one batch
+        self.refresh_soon = QtCore.QTimer(self)
+        self.refresh_soon.setSingleShot(True)
+        self.refresh_soon.setInterval(2000)
+        self.refresh_soon.timeout.connect(self.refresh)
+
+    def name(self, user_id, default=''):
+        user = self.users.get(user_id)
+        return user['name'] if user and user['name'] else default
+
+    def tooltip(self, user_id):
+        user = self.users.get(user_id)
+        if not user:
+            return ''
+        text = user['name']
+        if user.get('login'):
+            text += f" ({user['login']})"
+        if user.get('mail'):
+            text += f"\n{user['mail']}"
+        return text
+
+    def remember(self, users):
+        """Record {'id', 'name'} dicts seen in API responses, cheap for names we already know"""
+        changed = []
+        for user in users:
+            if not user or 'id' not in user:
+                continue
+            known = self.users.get(user['id'])
+            if known is None:
+                self.users[user['id']] = dict(id=user['id'], name=user.get('name', ''), login=None, mail=None,
+                                              fetched_on=None, avatar=None, avatar_checked_on=None)
+                changed.append(user)
+            elif user.get('name') and known['name'] != user['name']:
+                known['name'] = user['name']
+                changed.append(user)
+        if changed and self.store:
+            self.store.upsert_users(changed)
+        if changed:
+            self.refresh_soon.start()
+
+    def remember_records(self, records):
+        self.remember([{'id': r.assignee_id, 'name': r.assignee_name} for r in records if r.assignee_id] +
+                      [{'id': r.author_id, 'name': r.author_name} for r in records if r.author_id])
+
+    def remember_issue(self, issue):
+        self.remember([issue.get('author'), issue.get('assigned_to')] +
+                      [journal.get('user') for journal in issue.get('journals', [])] +
+                      [attachment.get('author') for attachment in issue.get('attachments', [])])
+
+    def stale_ids(self):
+        limit = time.time() - self.TTL
+        return [user_id for user_id, user in self.users.items() if (user['fetched_on'] or 0) < limit]
+
+    def refresh(self):
+        stale = self.stale_ids()
+        if self.refreshing or not self.api or not stale:
+            return
+        self.refreshing = True
+        run_in_background(fetch_users, self.api, stale[:self.REFRESH_BATCH],
+                          on_done=self.refreshed, on_error=self.refresh_failed)
+
+    def refreshed(self, users):
+        self.refreshing = False
+        now = time.time()
+        records = []
+        for user in users:
+            name = user.get('name') or f"{user.get('firstname', '')} {user.get('lastname', '')}".strip()
+            record = dict(id=user['id'], name=name or self.name(user['id']), login=user.get('login'),
+                          mail=user.get('mail'), fetched_on=now)
+            records.append(record)
+            known = self.users.setdefault(user['id'], dict(avatar=None, avatar_checked_on=None))
+            if record['mail'] != known.get('mail'):
+                known['avatar_checked_on'] = None  # a new mail can mean a new avatar
+            known.update({k: v for k, v in record.items() if v is not None})
+            known.setdefault('login', None)
+            known.setdefault('mail', None)
+        if self.store:
+            self.store.upsert_users(records)
+        self.forget_pixmaps({r['id'] for r in records})
+        self.updated.emit()
+
+    def refresh_failed(self, error):
+        self.refreshing = False
+        print(f"Failed to refresh users: {error}")
+
+    def avatar(self, user_id, size=24):
+        """Scaled avatar pixmap, the user's initials until (or unless) an image is available"""
+        key = (user_id, size)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        user = self.users.get(user_id) or {}
+        pixmap = None
+        if user.get('avatar'):
+            image = QtGui.QImage.fromData(user['avatar'])
+            if not image.isNull():
+                pixmap = QtGui.QPixmap.fromImage(image.scaled(
+                    size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+        elif self.gravatar and user.get('mail') and (user.get('avatar_checked_on') or 0) < time.time() - self.TTL:
+            self.want_avatar(user_id)
+        if pixmap is None:
+            pixmap = self.initials_pixmap(user_id, user.get('name') or '?', size)
+        self.pixmaps[key] = pixmap
+        while len(self.pixmaps) > self.AVATAR_CACHE_SIZE:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+    def icon(self, user_id, size=16):
+        return QtGui.QIcon(self.avatar(user_id, size))
+
+    @staticmethod
+    def initials_pixmap(user_id, name, size):
+        initials = ''.join(part[0] for part in name.split()[:2]).upper() or '?'
+        pixmap = QtGui.QPixmap(size, size)
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(QtGui.QColor(AVATAR_COLORS[(user_id or 0) % len(AVATAR_COLORS)]))
+        painter.drawEllipse(0, 0, size, size)
+        font = painter.font()
+        font.setPixelSize(max(6, int(size * 0.42)))
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QtCore.Qt.white)
+        painter.drawText(pixmap.rect(), QtCore.Qt.AlignCenter, initials)
+        painter.end()
+        return pixmap
+
+    def want_avatar(self, user_id):
+        # Collect the misses of one repaint and download them together
+        if not self.wanted_avatars:
+            QtCore.QTimer.singleShot(0, self.fetch_wanted_avatars)
+        self.wanted_avatars.add(user_id)
+
+    def fetch_wanted_avatars(self):
+        mails = {user_id: self.users[user_id]['mail'] for user_id in self.wanted_avatars}
+        self.wanted_avatars = set()
+        now = time.time()
+        for user_id in mails:
+            self.users[user_id]['avatar_checked_on'] = now  # one attempt per TTL
+        run_in_background(fetch_avatars, mails, on_done=self.avatars_fetched,
+                          on_error=lambda e: print(f"Failed to fetch avatars: {e}"))
+
+    def avatars_fetched(self, avatars):
+        now = time.time()
+        for user_id, data in avatars.items():
+            self.users[user_id]['avatar'] = data
+            if self.store:
+                self.store.set_avatar(user_id, data, now)
+        changed = {user_id for user_id, data in avatars.items() if data}
+        if changed:
+            self.forget_pixmaps(changed)
+            self.updated.emit()
+
+    def forget_pixmaps(self, user_ids):
+        for key in [k for k in self.pixmaps if k[0] in user_ids]:
+            del self.pixmaps[key]
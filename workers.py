@@ -0,0 +1,92 @@
+from PyQt5 import QtCore
+
+
+class WorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    released = QtCore.pyqtSignal()
+
+
+class Worker(QtCore.QRunnable):
+    """Run a blocking call (usually a Redmine request) on the global thread pool"""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        # A queued worker returns as soon as it starts; a running one finishes but its result is discarded
+        self.cancelled = True
+
+    def run(self):
+        try:
+            try:
+                if self.cancelled:
+                    return
+                try:
+                    result = self.fn(*self.args, **self.kwargs)
+                except Exception as e:
+                    if not self.cancelled:
+                        self.signals.failed.emit(str(e))
+                    return
+                if not self.cancelled:
+                    self.signals.finished.emit(result)
+            finally:
+                self.signals.released.emit()
+        except RuntimeError:
+            pass  # the application is shutting down and the signals object is gone
+
+
+class _Relay(QtCore.QObject):
+    """Hands a worker's result to its callbacks only while the owner widget still exists"""
+
+    def __init__(self, owner, on_done, on_error):
+        super().__init__(owner)
+        self.on_done = on_done
+        self.on_error = on_error
+
+    @QtCore.pyqtSlot(object)
+    def finished(self, result):
+        if self.on_done:
+            self.on_done(result)
+
+    @QtCore.pyqtSlot(str)
+    def failed(self, error):
+        if self.on_error:
+            self.on_error(error)
+
+
+# Workers mostly wait on the network, so don't limit them to the number of cores
+QtCore.QThreadPool.globalInstance().setMaxThreadCount(max(8, QtCore.QThread.idealThreadCount()))
+
+# Python must hold on to running workers, otherwise their signals object is collected mid-run
+_running_workers = set()
+
+
+def run_in_background(fn, *args, on_done=None, on_error=None, owner=None, **kwargs):
+    """Run fn(*args, **kwargs) on the thread pool.
+
+    With an owner, callbacks that aren't methods of a QObject (lambdas, other
+    objects' methods) are dropped once the owner is deleted, and a worker
+    that hasn't started yet is cancelled.
+    """
+    worker = Worker(fn, *args, **kwargs)
+    if owner is not None:
+        relay = _Relay(owner, on_done, on_error)
+        worker.signals.finished.connect(relay.finished)
+        worker.signals.failed.connect(relay.failed)
+        worker.signals.released.connect(relay.deleteLater)
+        relay.destroyed.connect(worker.cancel)  # with the owner, or harmlessly once released
+    else:
+        if on_done:
+            worker.signals.finished.connect(on_done)
+        if on_error:
+            worker.signals.failed.connect(on_error)
+    worker.signals.released.connect(lambda: _running_workers.discard(worker))
+    _running_workers.add(worker)
+    QtCore.QThreadPool.globalInstance().start(worker)
+    return worker